@@ -1,21 +1,71 @@
 ﻿import argparse
 
 from logos_pipe_ocr.core.model import load_model
+from logos_pipe_ocr.core.runner import MultiModelRunner
+from logos_pipe_ocr.util.file import configure_json
+
+SINGLE_MODEL_OPTIONS = ["resume", "retry_failed", "prefetch", "record", "replay", "dedup", "dedup_threshold",
+                        "fallback_model", "schema_path"] # not supported by MultiModelRunner
 
 def add_arguments(parser: argparse.ArgumentParser):
-    parser.add_argument("--image-path", type=str, required=True, help="Image path(directory or file)")
+    image_source = parser.add_mutually_exclusive_group(required=True)
+    image_source.add_argument("--image-path", type=str, help="Image path(directory or file)")
+    image_source.add_argument("--manifest-path", type=str, help="Manifest of the images to process (.txt, .csv or .jsonl of paths) instead of a directory walk")
     parser.add_argument("--prompt-file-path", type=str, required=True, help="Prompt file path")
-    parser.add_argument("--model-name", type=str, required=True, help="Model name")
+    parser.add_argument("--model-name", type=str, nargs="+", required=True, help="Model name, or several model names to compare on the same images")
     parser.add_argument("--model-config-path", type=str, required=False, help="Model config file path(optional)", default=None)
+    parser.add_argument("--fallback-model", type=str, required=False, help="Stronger model answering the images whose response does not match the schema(optional)", default=None)
+    parser.add_argument("--schema-path", type=str, required=False, help="JSON schema or example response file validating the responses of a cascade(optional)", default=None)
+    parser.add_argument("--max-concurrency", type=int, required=False, help="Maximum number of concurrent requests (default: 1)", default=1)
+    parser.add_argument("--adaptive-concurrency", action="store_true", help="Adapt the concurrent requests to the provider's latency and 429s, up to the max concurrency")
+    parser.add_argument("--prefetch", type=int, required=False, help="Number of images read and encoded ahead of the requests (default: max concurrency)", default=None)
+    parser.add_argument("--cache-dir", type=str, required=False, help="Response cache directory(optional)", default=None)
+    parser.add_argument("--cache-mode", type=str, required=False, choices=["use", "refresh", "bypass"], help="Response cache mode (default: use)", default="use")
+    parser.add_argument("--resume", type=str, nargs="?", const=True, required=False, help="Resume the latest run, or the given run directory(optional)", default=False)
+    parser.add_argument("--record", type=str, nargs="?", const=True, required=False, help="Record the raw responses in the run directory, or the given JSONL file(optional)", default=False)
+    parser.add_argument("--replay", type=str, required=False, help="Replay the responses of a recorded run directory or JSONL file without API calls(optional)", default=None)
+    parser.add_argument("--dedup", type=str, required=False, choices=["exact", "perceptual"], help="Send only one image of each group of duplicates(optional)", default=None)
+    parser.add_argument("--dedup-threshold", type=int, required=False, help="Maximum number of different dHash bits of perceptual duplicates (default: 5)", default=5)
+    parser.add_argument("--include", type=str, nargs="+", required=False, help="Glob patterns of the images to process, relative to the image path(optional)", default=None)
+    parser.add_argument("--exclude", type=str, nargs="+", required=False, help="Glob patterns of the images and directories to skip(optional)", default=None)
+    parser.add_argument("--compact-json", action="store_true", help="Save the JSON predictions on one line instead of indented")
+    parser.add_argument("--retry-failed", action="store_true", help="Process only the failed images of the resumed run")
+
+def main(image_path: str, prompt_file_path: str, model_name: str | list[str], model_config_path: str, max_concurrency: int = 1,
+         cache_dir: str = None, cache_mode: str = "use", resume: bool | str = False,
+         retry_failed: bool = False, prefetch: int = None, fallback_model: str = None, schema_path: str = None,
+         record: bool | str = False, replay: str = None, dedup: str = None, dedup_threshold: int = 5, adaptive_concurrency: bool = False,
+         include: list[str] = None, exclude: list[str] = None, compact_json: bool = False):
+    if compact_json:
+        configure_json(compact=True)
+    model_options = {"cache_dir": cache_dir}
+    if adaptive_concurrency: # max_concurrency becomes the upper bound of the adaptive limit
+        model_options.update(adaptive_concurrency=True, concurrency_max=max_concurrency)
+    if isinstance(model_name, list) and len(model_name) > 1: # read and encode each image once for every model
+        models = [load_model(name, model_config_path, **model_options) for name in model_name]
+        MultiModelRunner(models).run(prompt_file_path, image_path, max_concurrency=max_concurrency, cache_mode=cache_mode,
+                                     include=include, exclude=exclude)
+        return
+    if isinstance(model_name, list):
+        model_name = model_name[0]
 
-def main(image_path: str, prompt_file_path: str, model_name: str, model_config_path: str):
     # load the model and run the model
-    model = load_model(model_name, model_config_path)
-    model.run(prompt_file_path, image_path) # TODO: Need to move prompt_file_path to the load_model function? 
+    model = load_model(model_name, model_config_path, fallback_model=fallback_model, schema=schema_path, **model_options)
+    model.run(prompt_file_path, image_path, max_concurrency=max_concurrency, cache_mode=cache_mode, resume=resume, retry_failed=retry_failed,
+              prefetch=prefetch, record=record, replay=replay, dedup=dedup, dedup_threshold=dedup_threshold,
+              include=include, exclude=exclude) # TODO: Need to move prompt_file_path to the load_model function? 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="logos-pipe-ocr: Document Parsing CLI")
     add_arguments(parser)
     args = parser.parse_args()
-    main(args.image_path, args.prompt_file_path, args.model_name, args.model_config_path)
+    if len(args.model_name) > 1:
+        unsupported = [f"--{option.replace('_', '-')}" for option in SINGLE_MODEL_OPTIONS if getattr(args, option) != parser.get_default(option)]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with several --model-name")
+    image_path = args.image_path or args.manifest_path # ImageLoader iterates a manifest like a directory
+    main(image_path, args.prompt_file_path, args.model_name, args.model_config_path, args.max_concurrency,
+         args.cache_dir, args.cache_mode, args.resume, args.retry_failed, args.prefetch, args.fallback_model, args.schema_path,
+         args.record, args.replay, args.dedup, args.dedup_threshold, args.adaptive_concurrency,
+         args.include, args.exclude, args.compact_json)
 
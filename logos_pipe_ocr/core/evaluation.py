@@ -44,7 +44,7 @@ class Evaluation(Evaluator):
     
     def run(self) -> dict: 
         """ Run the evaluation. """
-        self.data_handler = EvalDataHandler(self.label_dir_path, self.output_dir_path)
+        self.data_handler = EvalDataHandler(self.label_dir_path, self.output_dir_path, stream=True) # read the pairs while they are evaluated
         self.validator = Validation(self.eval_metrics)
     
         for label_data, output_data in self.data_handler:
@@ -3,71 +3,724 @@ This module contains the core model classes for the Logos-pipe-ocr project.
 """
 import os
 import json
+import copy
+import math
+import time
+import random
+import threading
+import httpx
 from pathlib import Path
+from importlib.metadata import entry_points
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from abc import ABC, abstractmethod
-from openai import OpenAI
-import google.generativeai as genai
-from google.generativeai import GenerationConfig
-from logos_pipe_ocr.util.file import increment_path
+from PIL import Image
+from logos_pipe_ocr.util.file import increment_path, latest_path, append_jsonl_file, read_jsonl_file, write_jsonl_file, read_json_file
+from logos_pipe_ocr.util.ratelimit import RateLimiter, get_rate_limiter, estimate_text_tokens
+from logos_pipe_ocr.util.concurrency import AdaptiveConcurrencyLimiter, get_concurrency_limiter
+from logos_pipe_ocr.util.hedging import RequestHedger
+from logos_pipe_ocr.util.retry import RetryPolicy
+from logos_pipe_ocr.util.cache import ResponseCache
+from logos_pipe_ocr.util.clients import ClientPool, get_client_pool, configure_gemini
+from logos_pipe_ocr.util.metrics import RunMetrics, get_prices, estimate_cost
+from logos_pipe_ocr.util.recording import ResponseRecording, RECORDING_FILE
+from logos_pipe_ocr.util.dedup import ImageDeduplicator
 from logos_pipe_ocr.util.datahandlers import *
 from logos_pipe_ocr.util.dataloaders import ImageLoader, PromptLoader, ModelConfigLoader
+from logos_pipe_ocr.val.fidelity import validate_json_schema
+from logos_pipe_ocr.val.schema_generator import JsonSchemaGenerator
 
 FILE_DIR = Path(__file__).resolve()
 ROOT = FILE_DIR.parents[1]
+CACHE_MODES = ["use", "refresh", "bypass"] # use: read and write, refresh: write only, bypass: no cache
+FAILURE_MANIFEST = "failures.jsonl" # one line per failed image in the run directory
+PREVIOUS_FAILURE_MANIFEST = "failures.prev.jsonl" # failure manifest retried by a retry_failed run, kept until the run is done
+INVALID_FAILURE_MANIFEST = "failures.invalid.jsonl" # retried failure manifest with lines that could not be parsed, kept for inspection
+DUPLICATE_MANIFEST = "duplicates.jsonl" # one line per duplicate image of a run with dedup: its representative
+DUPLICATE_IMAGE = object() # encode stage result of a duplicate image, answered with the result of its representative (see _answer_duplicates)
+CASCADE_MANIFEST = "cascade.jsonl" # one line per image of a cascade run: the tier that answered it
+BATCH_REQUEST_FILE = "batch_requests.jsonl" # OpenAI Batch API input file in the run directory
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_MAX_REQUESTS = 50_000 # limits of a Batch API input file
+BATCH_MAX_BYTES = 200 * 1024 ** 2
+LOCAL_MODEL_PARAMETERS = ["template", "latency", "latency_std", "latency_distribution", "error_rate_429", "error_rate_500", "retry_after",
+                          "max_concurrent_requests", "max_rpm"]
+LATENCY_DISTRIBUTIONS = ["constant", "uniform", "normal", "lognormal"]
+LOCAL_ENDPOINT = "http://localhost/v1/chat/completions" # URL of the errors of LocalModel
+PROVIDER_ENTRY_POINT_GROUP = "logos_pipe_ocr.providers" # entry points of third-party providers, see register_provider
+CLIENT_POOL_PARAMETERS = ["max_connections", "max_keepalive_connections", "keepalive_expiry", "timeout", "connect_timeout", "http2"]
+GEMINI_CLIENT_PARAMETERS = ["timeout"] # sent as request_options, see GeminiModel._generate_response
 
 class Model(ABC): 
-    def __init__(self, api_key: str, model_name: str, image_processor: ImageProcessor, response_handler: ResponseHandler, model_config: dict) -> None:
+    def __init__(self, api_key: str, model_name: str, image_processor: ImageProcessor, response_handler: ResponseHandler, model_config: dict,
+                 rate_limiter: RateLimiter = None, retry_policy: RetryPolicy = None, cache: ResponseCache = None,
+                 client_pool: ClientPool = None, prices: dict = None, concurrency_limiter: AdaptiveConcurrencyLimiter = None,
+                 hedger: RequestHedger = None) -> None:
         self._model = model_name
         self._api_key = api_key
         self.response_handler = response_handler
         self.image_processor = image_processor
         self._kwargs = model_config
+        self.rate_limiter = rate_limiter # shared per <platform>::<model> (see get_rate_limiter)
+        self.retry_policy = retry_policy
+        self.cache = cache
+        self.client_pool = client_pool # shared per platform (see get_client_pool)
+        self.prices = prices or get_prices(model_name) # USD per 1M tokens (see PRICE_TABLE)
+        self.concurrency_limiter = concurrency_limiter # shared per <platform>::<model> (see get_concurrency_limiter)
+        self.hedger = hedger
+        self.metrics = RunMetrics()
+        self._recording = None # ResponseRecording written by a run with record
+        self._replay = None # ResponseRecording read by a run with replay
+        self._image_root = None # recordings are keyed by the image path relative to it
+        self._deduplicator = None # ImageDeduplicator of a run with dedup
+        self._image_loader = None # ImageLoader of the run: prediction paths and metadata of the manifest entries
+        self._retried_metadata = {} # image path -> metadata of its entry in the retried failure manifest
+        self._saved_paths = set() # prediction files written by the run, see _claim_prediction
+        self._save_lock = threading.Lock()
+        self._cache_mode = "use"
+        self._fail_fast = False
+        self._retried_manifest = None # PREVIOUS_FAILURE_MANIFEST of a retry_failed run
+        self._retried_manifest_invalid = False # whether some of its lines could not be parsed
+        self._failure_lock = threading.Lock()
+        self._failure_count = 0
         
-    def _initialize_run(self, prompt_path: str, image_path: str, name: str, save_path: str) -> tuple[ImageLoader, str, Path]:
-        image_loader = ImageLoader(image_path)
+    def _initialize_run(self, prompt_path: str, image_path: str, name: str, save_path: str, resume: bool | str = False,
+                        include: list[str] = None, exclude: list[str] = None) -> tuple[ImageLoader, str, Path]:
+        image_loader = ImageLoader(image_path, stream=True, include=include, exclude=exclude) # the run starts on the first image found
         prompt = PromptLoader(prompt_path).get_prompt()
+        return image_loader, prompt, self._get_save_dir(name, save_path, resume)
 
-        # Save directory
+    def _get_save_dir(self, name: str, save_path: str, resume: bool | str = False) -> Path:
         dir_name = f"{name}_{self._model}" # example: exp_result_gpt-4o
-        save_dir = increment_path(path=Path(save_path)/dir_name)  # increment run: exp_result_gpt-4o_1, exp_result_gpt-4o_2, ...
-        
-        return image_loader, prompt, save_dir
+        if isinstance(resume, (str, Path)): # reopen the given run directory
+            save_dir = Path(resume)
+            if not save_dir.exists():
+                raise FileNotFoundError(f"Directory not found, please check the file path. {save_dir}")
+        elif resume: # reopen the latest run directory, or start a new one if there is none
+            save_dir = latest_path(path=Path(save_path)/dir_name) or Path(save_path)/dir_name
+        else:
+            save_dir = increment_path(path=Path(save_path)/dir_name)  # increment run: exp_result_gpt-4o_1, exp_result_gpt-4o_2, ...
+        return save_dir
 
-    def _process_images(self, image_loader: ImageLoader, prompt: str, save_result: bool, save_dir: Path, save_format: str) -> dict:
-        response_dict = {}
+    def _process_images(self, image_loader: ImageLoader, prompt: str, save_result: bool, save_dir: Path, save_format: str, max_concurrency: int = 1,
+                        skip_processed: bool = False, prefetch: int = None) -> dict:
+        last_index, response_dict = -1, {} # response of the last image in loader order
+        for index, _, image_response_dict, _ in self._iter_results(image_loader, prompt, save_result, save_dir, save_format, max_concurrency,
+                                                                   skip_processed, prefetch):
+            if image_response_dict is not None and index > last_index: # None: the image failed and was recorded in the failure manifest
+                last_index, response_dict = index, image_response_dict
+        return response_dict
+
+    def _iter_results(self, image_loader: ImageLoader, prompt: str, save_result: bool, save_dir: Path, save_format: str, max_concurrency: int = 1,
+                      skip_processed: bool = False, prefetch: int = None):
+        """Yield (index, image_file_path, response_dict, timing) of each image as soon as it is done."""
+        if save_result: # the record of each image is written as soon as it is done
+            self.metrics.open(save_dir)
+        representatives = {} # representative -> (index, response_dict, number of duplicates answered)
+        for index, image_file_path, response_dict, timing in self._iter_images(image_loader, prompt, save_result, save_dir, save_format,
+                                                                               max_concurrency, skip_processed, prefetch):
+            self.metrics.record_timing(image_file_path, timing)
+            yield index, image_file_path, response_dict, timing
+            if self._deduplicator is not None:
+                representatives[image_file_path] = (index, response_dict, 0)
+                yield from self._answer_duplicates(representatives, image_file_path, save_result, save_dir, save_format)
+
+        for image_file_path in representatives: # duplicates found after their representative was done
+            yield from self._answer_duplicates(representatives, image_file_path, save_result, save_dir, save_format)
+
+    def _answer_duplicates(self, representatives: dict, image_file_path: str, save_result: bool, save_dir: Path, save_format: str):
+        # copy the result of the representative to its duplicates, each with its own file_name
+        index, response_dict, answered = representatives[image_file_path]
+        duplicates = self._deduplicator.get_duplicates(image_file_path)[answered:]
+        representatives[image_file_path] = (index, response_dict, answered + len(duplicates))
+        for duplicate_file_path in duplicates:
+            timing = {}
+            duplicate_response_dict = None
+            if response_dict is None:
+                self._handle_failure(duplicate_file_path, RuntimeError(f"Duplicate of a failed image. {image_file_path}"), None, save_result, save_dir)
+            else:
+                duplicate_response_dict = copy.deepcopy(response_dict)
+                self.response_handler.add_file_name(duplicate_response_dict, duplicate_file_path)
+                duplicate_response_dict = self._save_stage(duplicate_file_path, duplicate_response_dict, save_result, save_dir, save_format, timing)
+            self.metrics.record_timing(duplicate_file_path, timing)
+            yield index, duplicate_file_path, duplicate_response_dict, timing
+
+    def _iter_images(self, image_loader: ImageLoader, prompt: str, save_result: bool, save_dir: Path, save_format: str, max_concurrency: int,
+                     skip_processed: bool, prefetch: int):
+        if skip_processed:
+            image_loader = self._skip_processed_images(image_loader, save_dir, save_format)
+
+        if max_concurrency <= 1 and not prefetch:
+            for index, image_file_path in enumerate(image_loader):
+                result = self._process_image(image_file_path, prompt, save_result, save_dir, save_format)
+                if result is not None:
+                    yield (index, image_file_path, *result)
+            return
+
+        yield from self._iter_pipeline(enumerate(image_loader), prompt, save_result, save_dir, save_format, max(max_concurrency, 1),
+                                       prefetch or max_concurrency)
+
+    def _iter_pipeline(self, images, prompt: str, save_result: bool, save_dir: Path, save_format: str, max_concurrency: int, prefetch: int):
+        """Run the encode, request and save stages on their own thread pools, connected by bounded buffers.
+
+        At most prefetch encoded images wait for a request slot and at most max_concurrency requests are in flight,
+        so reading and encoding overlap the network latency while memory stays capped by the buffer depths.
+        """
+        encoding, requesting, saving = {}, {}, {} # future -> (index, image_file_path, timing) of each stage
+        encoded = deque() # (index, image_file_path, timing, encoded_image, image_bytes) waiting for a request slot
+        exhausted = False
+        encode_workers = max(1, min(prefetch, os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix="encode") as encode_executor, \
+             ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="request") as request_executor, \
+             ThreadPoolExecutor(max_workers=1, thread_name_prefix="save") as save_executor:
+            while True:
+                # read and encode ahead up to the prefetch depth
+                while not exhausted and len(encoding) + len(encoded) < prefetch:
+                    next_image = next(images, None)
+                    if next_image is None:
+                        exhausted = True
+                        break
+                    index, image_file_path = next_image
+                    timing = {}
+                    future = encode_executor.submit(self._encode_stage, image_file_path, save_result, save_dir, timing)
+                    encoding[future] = (index, image_file_path, timing)
+
+                # send the encoded images while request slots are free
+                while encoded and len(requesting) < max_concurrency:
+                    index, image_file_path, timing, encoded_image, image_bytes = encoded.popleft()
+                    future = request_executor.submit(self._request_stage, image_file_path, encoded_image, prompt, save_result, save_dir, timing,
+                                                     image_bytes)
+                    requesting[future] = (index, image_file_path, timing)
+
+                if not (encoding or requesting or saving):
+                    break
+
+                done, _ = wait([*encoding, *requesting, *saving], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in encoding:
+                        index, image_file_path, timing = encoding.pop(future)
+                        encoded_image = future.result() # re-raise the exception of the failed image (fail_fast)
+                        if encoded_image is DUPLICATE_IMAGE:
+                            continue
+                        if encoded_image is None:
+                            yield index, image_file_path, None, timing
+                        else:
+                            encoded.append((index, image_file_path, timing, *encoded_image)) # (encoded_image, image_bytes)
+                    elif future in requesting:
+                        index, image_file_path, timing = requesting.pop(future)
+                        response_dict = future.result()
+                        if response_dict is None:
+                            yield index, image_file_path, None, timing
+                        else:
+                            future = save_executor.submit(self._save_stage, image_file_path, response_dict, save_result, save_dir, save_format, timing)
+                            saving[future] = (index, image_file_path, timing)
+                    else:
+                        index, image_file_path, timing = saving.pop(future)
+                        response_dict = future.result()
+                        yield index, image_file_path, response_dict, timing
+
+    def _skip_processed_images(self, image_loader: ImageLoader, save_dir: Path, save_format: str):
+        skipped = 0
         for image_file_path in image_loader:
-            encoded_image = self.image_processor.process_image(image_file_path)
-            response = self._generate_response(encoded_image, prompt)
-            response_dict = self._handle_response(response, image_file_path)
+            if self._is_processed(image_file_path, save_dir, save_format):
+                skipped += 1
+                continue
+            yield image_file_path
+        print(f"Skipped {skipped} already processed images.")
+
+    def _is_processed(self, image_file_path: str, save_dir: Path, save_format: str) -> bool:
+        # a saved prediction means the image is done (predictions are written atomically)
+        save_file_path = self._get_save_file_path(image_file_path, save_dir) / f"{Path(image_file_path).stem}.{str(save_format).lower()}"
+        return save_file_path.exists() and save_file_path.stat().st_size > 0
+
+    def _get_save_file_path(self, image_file_path: str, save_dir: Path) -> Path:
+        # manifest entries keep their directories relative to the manifest, whose names may repeat (a/scan, b/scan)
+        manifest_path = self._image_loader.get_manifest_path(image_file_path) if self._image_loader is not None else None
+        if manifest_path is not None:
+            return save_dir / "preds" / Path(manifest_path).parent
+        return save_dir / "preds" / Path(image_file_path).parent.name
+
+    def _process_image(self, image_file_path: str, prompt: str, save_result: bool, save_dir: Path,
+                       save_format: str) -> tuple[dict | None, dict] | None:
+        timing = {}
+        response_dict = None
+        encoded = self._encode_stage(image_file_path, save_result, save_dir, timing)
+        if encoded is DUPLICATE_IMAGE:
+            return None
+        if encoded is not None:
+            encoded_image, image_bytes = encoded
+            response_dict = self._request_stage(image_file_path, encoded_image, prompt, save_result, save_dir, timing, image_bytes)
+        if response_dict is not None:
+            response_dict = self._save_stage(image_file_path, response_dict, save_result, save_dir, save_format, timing)
+        return response_dict, timing
+
+    # Each stage records its seconds in timing and returns None if the image failed (see _handle_failure)
+    def _encode_stage(self, image_file_path: str, save_result: bool, save_dir: Path, timing: dict) -> tuple[any, bytes] | None:
+        # the image bytes are passed on to the dedup hashes and the request stage, so the image is read once
+        start_time = time.perf_counter()
+        try:
+            with open(image_file_path, "rb") as image_file:
+                image_bytes = image_file.read()
+        except Exception as e:
+            self._handle_failure(image_file_path, e, None, save_result, save_dir)
+            return None
+        finally:
+            self._add_timing(timing, "read", start_time)
+
+        if self._deduplicator is not None: # send only the first image of each group of duplicates
+            start_time = time.perf_counter()
+            try:
+                if self._deduplicator.add(image_file_path, image_bytes) is not None:
+                    return DUPLICATE_IMAGE
+            finally:
+                self._add_timing(timing, "dedup", start_time)
+
+        start_time = time.perf_counter()
+        try:
+            return self.image_processor.process_image(image_file_path, image_bytes), image_bytes
+        except Exception as e:
+            self._handle_failure(image_file_path, e, None, save_result, save_dir)
+            return None
+        finally:
+            self._add_timing(timing, "encode", start_time)
+
+    def _request_stage(self, image_file_path: str, encoded_image, prompt: str, save_result: bool, save_dir: Path, timing: dict,
+                       image_bytes: bytes = None) -> dict | None:
+        start_time = time.perf_counter()
+        response = None
+        try:
+            response = self._request(encoded_image, prompt, image_file_path, image_bytes)
+            return self._handle_response(response, image_file_path)
+        except Exception as e:
+            self._handle_failure(image_file_path, e, response, save_result, save_dir)
+            return None
+        finally:
+            self._add_timing(timing, "request", start_time)
+
+    def _save_stage(self, image_file_path: str, response_dict: dict, save_result: bool, save_dir: Path, save_format: str, timing: dict) -> dict | None:
+        start_time = time.perf_counter()
+        try:
             self._save_response(response_dict, image_file_path, save_result, save_dir, save_format)
-        return response_dict
+            return response_dict
+        except Exception as e:
+            self._handle_failure(image_file_path, e, None, save_result, save_dir)
+            return None
+        finally:
+            self._add_timing(timing, "save", start_time)
+
+    def _add_timing(self, timing: dict, stage: str, start_time: float) -> None:
+        elapsed = time.perf_counter() - start_time
+        timing[stage] = elapsed
+        timing["total"] = timing.get("total", 0.0) + elapsed # time spent on the image, without the waits between stages
+
+    def _handle_failure(self, image_file_path: str, error: Exception, response, save_result: bool, save_dir: Path) -> None:
+        if self._fail_fast:
+            raise error
+        self._record_failure(image_file_path, error, response, save_result, save_dir) # one bad image must not stop the run
+
+    def _record_failure(self, image_file_path: str, error: Exception, response, save_result: bool, save_dir: Path) -> None:
+        raw_response = None
+        if response is not None:
+            try:
+                raw_response = self.response_handler.get_content(response)
+            except Exception:
+                raw_response = str(response)
+        failure = {
+            "image_path": str(image_file_path),
+            "error_class": type(error).__name__,
+            "error": str(error),
+            "raw_response": raw_response,
+        }
+        metadata = self._get_metadata(image_file_path)
+        if metadata: # kept for the retry, see _load_failed_images
+            failure["metadata"] = metadata
+        with self._failure_lock:
+            self._failure_count += 1
+            print(f"Warning: Failed to process {image_file_path} ({type(error).__name__}: {error})")
+            if save_result:
+                save_dir.mkdir(parents=True, exist_ok=True)
+                append_jsonl_file(failure, save_dir / FAILURE_MANIFEST)
+
+    def _get_metadata(self, image_file_path: str) -> dict:
+        # metadata of the manifest entry of the image (see ImageLoader.get_metadata), or of its retried failure
+        metadata = self._retried_metadata.get(str(image_file_path))
+        if metadata is None and self._image_loader is not None:
+            metadata = self._image_loader.get_metadata(image_file_path)
+        return metadata or {}
+
+    def _load_failed_images(self, save_dir: Path) -> list[str]:
+        # set the manifest aside until the run is done (see _finish_run); the images that fail again are recorded in a new one
+        manifest_path, previous_manifest_path = save_dir / FAILURE_MANIFEST, save_dir / PREVIOUS_FAILURE_MANIFEST
+        if previous_manifest_path.exists(): # an interrupted retry: retry every image again, its new manifest is partial
+            if manifest_path.exists():
+                os.remove(manifest_path)
+        elif manifest_path.exists():
+            os.replace(manifest_path, previous_manifest_path)
+        else:
+            return []
+        invalid_lines = []
+        entries = read_jsonl_file(previous_manifest_path, invalid_lines)
+        self._retried_manifest, self._retried_manifest_invalid = previous_manifest_path, bool(invalid_lines)
+        self._retried_metadata = {entry["image_path"]: entry["metadata"] for entry in entries if entry.get("metadata")}
+        return list(dict.fromkeys(entry["image_path"] for entry in entries))
     
+    def _request(self, encoded_image, prompt: str, image_file_path: str, image_bytes: bytes = None) -> any:
+        if self._replay is not None: # no network, no rate limit, no retry
+            recorded_response = self._replay.get(self._get_recording_key(image_file_path))
+            if recorded_response is None:
+                raise KeyError(f"No recorded response of the image in {self._replay.file_path}. {image_file_path}")
+            return self._deserialize_response(recorded_response)
+
+        response = self._fetch(encoded_image, prompt, image_file_path, image_bytes)
+        if self._recording is not None:
+            self._recording.record(self._get_recording_key(image_file_path), self._serialize_response(response), self._model)
+        return response
+
+    def _get_recording_key(self, image_file_path: str) -> str:
+        if self._image_root is None:
+            return Path(image_file_path).as_posix()
+        return Path(os.path.relpath(image_file_path, self._image_root)).as_posix()
+
+    def _fetch(self, encoded_image, prompt: str, image_file_path: str, image_bytes: bytes = None) -> any:
+        if self.cache is None or self._cache_mode == "bypass":
+            return self._call(encoded_image, prompt, image_file_path)
+
+        cache_key = self._get_cache_key(image_file_path, prompt, image_bytes)
+        if self._cache_mode == "use":
+            cached_response = self.cache.get(cache_key)
+            if cached_response is not None:
+                return self._deserialize_response(cached_response)
+        response = self._call(encoded_image, prompt, image_file_path)
+        self.cache.put(cache_key, self._serialize_response(response))
+        return response
+
+    def _get_cache_key(self, image_file_path: str, prompt: str, image_bytes: bytes = None) -> str:
+        if image_bytes is None: # not read by the caller
+            with open(image_file_path, "rb") as image_file:
+                image_bytes = image_file.read()
+        return ResponseCache.make_key(image_bytes, prompt, f"{type(self).__name__}::{self._model}", self._kwargs,
+                                      self.image_processor.preprocessor.get_config()) # the uploaded image depends on the preprocessing
+
+    def _call(self, encoded_image, prompt: str, image_file_path: str) -> any:
+        if self.retry_policy is None:
+            response = self._send_request(encoded_image, prompt, image_file_path)
+        else:
+            response = self.retry_policy.call(self._send_request, encoded_image, prompt, image_file_path) # retry transient errors (429, 5xx, timeouts)
+        self._record_usage(image_file_path, response) # cached responses cost nothing, so only the sent requests are counted
+        return response
+
+    def _record_usage(self, image_file_path: str, response) -> None:
+        usage = self._extract_usage(response)
+        self.metrics.record_usage(image_file_path, usage, estimate_cost(usage, self.prices))
+
+    def _send_request(self, encoded_image, prompt: str, image_file_path: str) -> any:
+        if self.rate_limiter is None:
+            return self._generate(encoded_image, prompt, image_file_path)
+
+        estimated_tokens = self._estimate_tokens(image_file_path, prompt)
+        self.rate_limiter.acquire(estimated_tokens) # wait until the request fits in the rpm/tpm budget
+        response = self._generate(encoded_image, prompt, image_file_path, estimated_tokens)
+        self.rate_limiter.reconcile(estimated_tokens, self._extract_usage(response).get("total_tokens"))
+        return response
+
+    def _generate(self, encoded_image, prompt, image_file_path: str, estimated_tokens: int = 0) -> any:
+        if self.concurrency_limiter is None:
+            return self._hedge(encoded_image, prompt, image_file_path, estimated_tokens)
+        with self.concurrency_limiter.slot(): # the slot is free while a retry backs off
+            return self._hedge(encoded_image, prompt, image_file_path, estimated_tokens)
+
+    def _hedge(self, encoded_image, prompt, image_file_path: str, estimated_tokens: int = 0) -> any:
+        if self.hedger is None:
+            return self._generate_response(encoded_image, prompt)
+        # only the provider call is timed and hedged, not the waits for the rate limit and the concurrency slot;
+        # the duplicate shares the slot of the request but is a request of its own for the rate limit: it is only sent
+        # if the budget has room for it now, and its reservation is reconciled like the one of the request (see _send_request)
+        def on_hedge() -> bool:
+            return self.rate_limiter is None or self.rate_limiter.try_acquire(estimated_tokens)
+
+        def on_discarded(response) -> None: # the losing response is still billed
+            self._record_usage(image_file_path, response)
+            if self.rate_limiter is not None:
+                self.rate_limiter.reconcile(estimated_tokens, self._extract_usage(response).get("total_tokens"))
+
+        def on_cancelled() -> None:
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(estimated_tokens)
+
+        return self.hedger.call(self._generate_response, encoded_image, prompt, on_hedge=on_hedge, on_discarded=on_discarded,
+                                on_cancelled=on_cancelled)
+
+    def _estimate_tokens(self, image_file_path: str, prompt: str) -> int:
+        # output tokens are counted against the quota up to max_tokens
+        return estimate_text_tokens(prompt) + self._estimate_image_tokens(image_file_path) + (self._kwargs.get("max_tokens") or 0)
+
     def _handle_response(self, response, image_file_path) -> dict:
         return self.response_handler.handle_response(response, image_file_path)
     
     def _save_response(self, response_dict, image_file_path, save_result, save_dir, save_format) -> None:
-        save_file_path = save_dir / "preds" / Path(image_file_path).parent.name
+        save_file_path = self._get_save_file_path(image_file_path, save_dir)
+        self._claim_prediction(save_file_path / f"{Path(image_file_path).stem}.{str(save_format).lower()}", image_file_path)
         self.response_handler.save_response(response_dict, save_file_path, Path(image_file_path).stem, save_result, save_format)
     
+    def _claim_prediction(self, prediction_path: Path, image_file_path: str) -> None:
+        # two images of the run saved to the same file (e.g., p1.png and p1.jpeg of one directory) would overwrite each other
+        with self._save_lock:
+            collision = prediction_path in self._saved_paths
+            self._saved_paths.add(prediction_path)
+        if collision:
+            raise ValueError(f"Another image of the run was saved to the same prediction file {prediction_path}. {image_file_path}")
+
+    @abstractmethod
+    def _initialize_client(self) -> None:
+        pass
+
     @abstractmethod
     def _generate_response(self, encoded_image, prompt) -> any:
         pass
 
+    @abstractmethod
+    def _estimate_image_tokens(self, image_file_path: str) -> int:
+        pass
+
+    @abstractmethod
+    def _extract_usage(self, response) -> dict:
+        pass
+
+    @abstractmethod
+    def _serialize_response(self, response) -> dict:
+        pass
+
+    @abstractmethod
+    def _deserialize_response(self, data: dict) -> any:
+        pass
+
+    def run(self, prompt_path: str, image_path: str, 
+            save_result: bool = True, 
+            save_path: str = f"{ROOT}/runs/", 
+            save_format: str = "json", # "json" or "txt"
+            name: str = f"exp_result",
+            max_concurrency: int = 1,
+            cache_mode: str = "use",
+            resume: bool | str = False,
+            retry_failed: bool = False,
+            fail_fast: bool = False,
+            prefetch: int = None,
+            record: bool | str = False,
+            replay: str = None,
+            dedup: str = None,
+            dedup_threshold: int = 5,
+            include: list[str] = None,
+            exclude: list[str] = None) -> dict:
+        """Run the model on every image in the image directory.
+
+        Args:
+            prompt_path (str): Path to the prompt file.
+            image_path (str): Path to the image directory, or to a manifest of image paths (.txt, .csv, .jsonl, see ImageLoader).
+            save_result (bool): Whether to save the responses under save_path.
+            save_path (str): Root directory of the run directories.
+            save_format (str): "json" or "txt".
+            name (str): Prefix of the run directory.
+            max_concurrency (int): Maximum number of requests in flight (1 = sequential).
+            cache_mode (str): "use" (read and write the response cache), "refresh" (write only) or "bypass".
+            resume (bool | str): Reopen the latest run directory (True) or the given run directory (str)
+                and process only the images without a saved prediction.
+            retry_failed (bool): Reopen the run directory like resume and process only the images of its failure manifest.
+            fail_fast (bool): Stop the run at the first failed image instead of recording it in the failure manifest.
+            prefetch (int): Number of images read and encoded ahead of the requests on a background pool
+                (default: max_concurrency; with max_concurrency=1 and no prefetch everything runs inline).
+            record (bool | str): Store the raw response of every image in responses.jsonl of the run directory (True)
+                or in the given JSONL file (str).
+            replay (str): Answer every image with the response stored by a recorded run (its run directory or JSONL file),
+                without any API call; images without a recorded response fail.
+            dedup (str): Send only one image of each group of duplicates and copy its result to the others:
+                "exact" (same file content) or "perceptual" (similar difference hash, see dedup_threshold). None = no dedup.
+            dedup_threshold (int): Maximum number of different dHash bits (of 64) between perceptual duplicates.
+            include (list[str]): Glob patterns of the images to process, relative to the image directory (e.g., "cat/*.png").
+            exclude (list[str]): Glob patterns of the images and directories to skip (e.g., "archive").
+
+        Returns:
+            dict: The response of the last image.
+        """
+        self._check_cache_mode(cache_mode)
+        try:
+            image_loader, prompt, save_dir, skip_processed = self._start_run(prompt_path, image_path, name, save_path, cache_mode, resume, retry_failed, fail_fast,
+                                                                             record, replay, dedup, dedup_threshold, include, exclude)
+            response_dict = self._process_images(image_loader, prompt, save_result, save_dir, save_format, max_concurrency, skip_processed, prefetch)
+            self._finish_run(save_result, save_dir, save_format)
+            return response_dict
+        
+        except json.JSONDecodeError as e:
+            raise Exception(f"JSON parsing error: {e}")  # Handle JSON parsing error
+        except Exception as e:
+            raise Exception(f"Error occurred: {e}")  # Handle other exceptions with more specific message
+
+    def run_iter(self, prompt_path: str, image_path: str, 
+                 save_result: bool = True, 
+                 save_path: str = f"{ROOT}/runs/", 
+                 save_format: str = "json", # "json" or "txt"
+                 name: str = f"exp_result",
+                 max_concurrency: int = 1,
+                 cache_mode: str = "use",
+                 resume: bool | str = False,
+                 retry_failed: bool = False,
+                 fail_fast: bool = False,
+                 prefetch: int = None,
+                 record: bool | str = False,
+                 replay: str = None,
+                 dedup: str = None,
+                 dedup_threshold: int = 5,
+                 include: list[str] = None,
+                 exclude: list[str] = None):
+        """Run the model like run, yielding the result of each image as soon as it is done.
+
+        Results are yielded in completion order, which differs from the loader order when max_concurrency > 1.
+        Only the images in flight are kept in memory. The arguments are the same as run.
+
+        Yields:
+            tuple[str, dict | None, dict]: (image_path, response_dict, timing) of each image.
+                response_dict is None if the image failed (see the failure manifest),
+                timing holds the seconds spent on each stage (encode, request, save) and their total.
+
+        Examples:
+        >>> for image_path, response_dict, timing in model.run_iter(prompt_path, image_path, max_concurrency=8):
+        ...     print(image_path, timing["total"])
+        """
+        image_loader, prompt, save_dir, skip_processed = self._start_run(prompt_path, image_path, name, save_path, cache_mode, resume, retry_failed, fail_fast,
+                                                                         record, replay, dedup, dedup_threshold, include, exclude)
+        for _, image_file_path, response_dict, timing in self._iter_results(image_loader, prompt, save_result, save_dir, save_format, max_concurrency,
+                                                                            skip_processed, prefetch):
+            yield image_file_path, response_dict, timing
+        self._finish_run(save_result, save_dir, save_format)
+
+    def _start_run(self, prompt_path: str, image_path: str, name: str, save_path: str, cache_mode: str,
+                   resume: bool | str, retry_failed: bool, fail_fast: bool, record: bool | str = False,
+                   replay: str = None, dedup: str = None, dedup_threshold: int = 5, include: list[str] = None,
+                   exclude: list[str] = None) -> tuple[ImageLoader | list[str], str, Path, bool]:
+        if record and replay:
+            raise ValueError("A run cannot record and replay the responses at the same time.")
+        deduplicator = ImageDeduplicator(dedup, dedup_threshold) if dedup is not None else None
+        self._reset_run(cache_mode, fail_fast, ResponseRecording(replay) if replay else None)
+        self._deduplicator = deduplicator
+        image_loader, prompt, save_dir = self._initialize_run(prompt_path, image_path, name, save_path, resume or retry_failed, include, exclude)
+        self._image_root = image_path if os.path.isdir(image_path) else os.path.dirname(image_path)
+        self._image_loader = image_loader # also keys the predictions of a retry_failed run
+        if record:
+            self._recording = ResponseRecording(save_dir / RECORDING_FILE if record is True else record)
+        if retry_failed:
+            image_loader = self._load_failed_images(save_dir)
+            resume = False # process the failed images even if a previous attempt saved something
+        return image_loader, prompt, save_dir, bool(resume)
+
+    def _reset_run(self, cache_mode: str, fail_fast: bool, replay: ResponseRecording = None) -> None:
+        self._check_cache_mode(cache_mode)
+        self._cache_mode = cache_mode
+        self._fail_fast = fail_fast
+        self._failure_count = 0
+        self._retried_manifest, self._retried_manifest_invalid = None, False
+        self.image_processor.preprocessor.reset_stats()
+        self.metrics.reset()
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.reset_stats()
+        if self.hedger is not None:
+            self.hedger.reset_stats()
+        self._recording, self._replay, self._image_root = None, replay, None
+        self._deduplicator = None
+        self._image_loader, self._retried_metadata, self._saved_paths = None, {}, set()
+        if replay is None: # a replay needs no client, nor an API key
+            self._initialize_client()
+
+    def _check_cache_mode(self, cache_mode: str) -> None:
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unsupported cache mode: {cache_mode}. Please use one of the following modes: {', '.join(CACHE_MODES)}")
+
+    def _finish_run(self, save_result: bool, save_dir: Path, save_format: str = "json") -> None:
+        if self._retried_manifest is not None:
+            if save_result and self._retried_manifest_invalid: # the images of the invalid lines are unknown, never drop them
+                os.replace(self._retried_manifest, save_dir / INVALID_FAILURE_MANIFEST)
+                print(f"Warning: The failure manifest had invalid lines, it is kept in {save_dir / INVALID_FAILURE_MANIFEST}")
+            elif save_result: # the failures of the retry are in the new manifest
+                os.remove(self._retried_manifest)
+            else: # nothing was recorded, keep the failures to retry
+                os.replace(self._retried_manifest, save_dir / FAILURE_MANIFEST)
+            self._retried_manifest = None
+        if save_result:
+            self._prune_failures(save_dir, save_format)
+        if save_result:
+            print(f"Results saved to {save_dir}")
+        if self._failure_count:
+            print(f"{self._failure_count} images failed. See {save_dir / FAILURE_MANIFEST}")
+        print(self.image_processor.preprocessor) # bytes saved by the image preprocessing
+        if self.retry_policy is not None:
+            print(self.retry_policy)
+        if self.cache is not None and self._cache_mode != "bypass":
+            print(self.cache)
+        if self.concurrency_limiter is not None:
+            print(self.concurrency_limiter) # limit learned from the latency and the throttling
+            self.metrics.record_stats("concurrency", self.concurrency_limiter.get_stats())
+        if self.hedger is not None:
+            print(self.hedger) # duplicate calls sent for the slow requests
+            self.metrics.record_stats("hedging", self.hedger.get_stats())
+            self.hedger.close()
+        print(self.metrics) # p50/p95/p99 of each stage, tokens and cost
+        if self._recording is not None:
+            print(f"Responses recorded to {self._recording.file_path}")
+        if self._deduplicator is not None:
+            print(self._deduplicator) # dedup ratio of the run
+            if save_result and self._deduplicator.duplicates:
+                self._save_duplicates(save_dir)
+        if save_result:
+            print(f"Metrics saved to {self.metrics.save(save_dir)}")
+
+    def _prune_failures(self, save_dir: Path, save_format: str) -> None:
+        # a resumed run sends the failed images again: keep the last failure of each image that still has no prediction
+        manifest_path = save_dir / FAILURE_MANIFEST
+        if not manifest_path.exists():
+            return
+        invalid_lines = []
+        entries = read_jsonl_file(manifest_path, invalid_lines)
+        if invalid_lines: # rewriting would drop them
+            return
+        failures = {}
+        for entry in entries:
+            failures.pop(entry["image_path"], None) # ordered by the last failure
+            failures[entry["image_path"]] = entry
+        # the failures of this run are the last lines; a prediction file of such an image belongs to another image (see _claim_prediction)
+        failed_now = {entry["image_path"] for entry in entries[max(0, len(entries) - self._failure_count):]}
+        failures = [entry for entry in failures.values()
+                    if entry["image_path"] in failed_now or not self._is_processed(entry["image_path"], save_dir, save_format)]
+        if not failures:
+            os.remove(manifest_path)
+        elif len(failures) < len(entries):
+            write_jsonl_file(failures, manifest_path)
+
+    def _save_duplicates(self, save_dir: Path) -> None:
+        # merge with the manifest of the previous runs in the directory (resume, retry_failed), one line per duplicate
+        manifest_path = save_dir / DUPLICATE_MANIFEST
+        entries = {entry["image_path"]: entry for entry in read_jsonl_file(manifest_path)} if manifest_path.exists() else {}
+        for image_file_path, duplicates in self._deduplicator.duplicates.items():
+            for duplicate_file_path in duplicates:
+                entries[str(duplicate_file_path)] = {"image_path": str(duplicate_file_path), "duplicate_of": str(image_file_path)}
+        save_dir.mkdir(parents=True, exist_ok=True)
+        write_jsonl_file(list(entries.values()), manifest_path)
+
 class ChatGPTModel(Model):
-    def __init__(self, api_key: str, model_name: str, image_processor: ImageProcessor, response_handler: ResponseHandler, model_config: dict) -> None:
-        super().__init__(api_key, model_name, image_processor, response_handler, model_config)
+    def __init__(self, api_key: str, model_name: str, image_processor: ImageProcessor, response_handler: ResponseHandler, model_config: dict, **kwargs) -> None:
+        super().__init__(api_key, model_name, image_processor, response_handler, model_config, **kwargs)
         self._client = None
 
     def _generate_response(self, encoded_image, prompt) -> any:
-        return self._client.chat.completions.create(
+        return self._client.chat.completions.create(**self._build_request_body(encoded_image, prompt))
+
+    def _build_request_body(self, encoded_image, prompt) -> dict:
+        return dict(
             model=self._model,
             messages=[
                 {
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded_image}"}}
+                        {"type": "image_url", "image_url": {"url": encoded_image}} # data URL with the image MIME type
                     ]
                 }
             ],
@@ -75,83 +728,495 @@ class ChatGPTModel(Model):
             **self._kwargs  
         )
 
-    def run(self, prompt_path: str, image_path: str, 
-            save_result: bool = True, 
-            save_path: str = f"{ROOT}/runs/", 
-            save_format: str = "json", # "json" or "txt"
-            name: str = f"exp_result") -> dict:
-        try:
-            if self._client is None:
-                self._client = OpenAI(api_key=self._api_key)
+    def create_batch_file(self, prompt_path: str, image_path: str,
+                          save_path: str = f"{ROOT}/runs/",
+                          name: str = f"exp_result") -> Path:
+        """Write one OpenAI Batch API request per image instead of calling the API.
 
-            image_loader, prompt, save_dir = self._initialize_run(prompt_path, image_path, name, save_path)
-            response_dict = self._process_images(image_loader, prompt, save_result, save_dir, save_format)
+        Upload the file with purpose="batch" and create a batch on the /v1/chat/completions endpoint,
+        then pass the downloaded output file to ingest_batch_output. The Batch API accepts
+        up to 50,000 requests and 200 MB per file; a larger batch raises a ValueError, split the images
+        with include/exclude or a manifest (see ImageLoader).
 
-            if save_result:
-                print(f"Results saved to {save_dir}")
+        Args:
+            prompt_path (str): Path to the prompt file.
+            image_path (str): Path to the image directory, or to a manifest of image paths (.txt, .csv, .jsonl, see ImageLoader).
+            save_path (str): Root directory of the run directories.
+            name (str): Prefix of the run directory.
 
-            return response_dict
-        
-        except json.JSONDecodeError as e:
-            raise Exception(f"JSON parsing error: {e}")  # Handle JSON parsing error
-        except Exception as e:
-            raise Exception(f"Error occurred: {e}")
+        Returns:
+            Path: Path to the batch request file in the new run directory.
+
+        Raises:
+            ValueError: If the requests exceed the limits of a Batch API input file.
+        """
+        image_loader, prompt, save_dir = self._initialize_run(prompt_path, image_path, name, save_path)
+        self._image_loader = image_loader
+        save_dir.mkdir(parents=True, exist_ok=True)
+        batch_file_path = save_dir / BATCH_REQUEST_FILE
+
+        request_count, byte_count = 0, 0
+        with open(batch_file_path, 'wb') as batch_file:
+            for image_file_path in image_loader:
+                try:
+                    encoded_image = self.image_processor.process_image(image_file_path)
+                except Exception as e:
+                    self._record_failure(image_file_path, e, None, True, save_dir)
+                    continue
+                batch_request = {
+                    "custom_id": str(image_file_path), # mapped back to the image by ingest_batch_output
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": self._build_request_body(encoded_image, prompt),
+                }
+                line = (json.dumps(batch_request, ensure_ascii=False) + "\n").encode("utf-8")
+                if request_count + 1 > BATCH_MAX_REQUESTS or byte_count + len(line) > BATCH_MAX_BYTES:
+                    batch_file.close()
+                    os.remove(batch_file_path) # the Batch API would reject the whole file
+                    raise ValueError(f"The batch exceeds the Batch API limits of {BATCH_MAX_REQUESTS} requests and {BATCH_MAX_BYTES // 1024 ** 2} MB "
+                                     f"at {image_file_path} ({request_count} requests, {byte_count / 1024 ** 2:.1f} MB). "
+                                     "Please split the images with include/exclude or a manifest.")
+                batch_file.write(line)
+                request_count += 1
+                byte_count += len(line)
+
+        print(f"{request_count} batch requests saved to {batch_file_path}")
+        return batch_file_path
+
+    def ingest_batch_output(self, batch_output_path: str, save_dir: str, save_format: str = "json") -> dict:
+        """Save the responses of an OpenAI Batch API output file like run does.
+
+        Args:
+            batch_output_path (str): Path to the batch output JSONL file.
+            save_dir (str): Run directory created by create_batch_file.
+            save_format (str): "json" or "txt".
+
+        Returns:
+            dict: The response of the last line.
+        """
+        if not os.path.exists(batch_output_path):
+            raise FileNotFoundError(f"File not found, please check the file path. {batch_output_path}")
+        save_dir = Path(save_dir)
+        self._failure_count = 0
+        self._saved_paths = set()
+
+        response_dict = {}
+        with open(batch_output_path, 'r', encoding='utf-8-sig') as batch_output_file:
+            for line_number, line in enumerate(batch_output_file, 1):
+                if not line.strip():
+                    continue
+                image_file_path = f"{batch_output_path}:{line_number}" # until the custom_id is read
+                response = None
+                try: # a truncated or malformed line fails alone
+                    batch_output = json.loads(line)
+                    image_file_path = batch_output["custom_id"]
+                    batch_response = batch_output.get("response") or {}
+                    if batch_output.get("error") or batch_response.get("status_code") != 200:
+                        raise RuntimeError(f"Batch request failed: {batch_output.get('error') or batch_response.get('body')}")
+                    response = self._deserialize_response(batch_response["body"])
+                    response_dict = self._handle_response(response, image_file_path)
+                    self._save_response(response_dict, image_file_path, True, save_dir, save_format)
+                except Exception as e:
+                    self._record_failure(image_file_path, e, response, True, save_dir)
+
+        print(f"Results saved to {save_dir}")
+        if self._failure_count:
+            print(f"{self._failure_count} images failed. See {save_dir / FAILURE_MANIFEST}")
+        return response_dict
+
+    def _initialize_client(self) -> None:
+        if self._client is None:
+            if self.client_pool is not None:
+                self._client = self.client_pool.get_openai_client(self._api_key)
+            else:
+                from openai import OpenAI # the SDKs are imported on first use, see register_provider
+                self._client = OpenAI(api_key=self._api_key, max_retries=0) # retried by RetryPolicy only
+
+    def _estimate_image_tokens(self, image_file_path: str) -> int:
+        # high detail: fit in 2048x2048, scale the shortest side to 768, then 170 tokens per 512px tile + 85 base tokens
+        with Image.open(image_file_path) as img:
+            width, height = img.size
+        max_side = self.image_processor.preprocessor.max_side
+        if max_side is not None: # downscaled before upload
+            scale = min(1.0, max_side / max(width, height))
+            width, height = width * scale, height * scale
+        scale = min(1.0, 2048 / max(width, height))
+        width, height = width * scale, height * scale
+        scale = min(1.0, 768 / min(width, height))
+        width, height = width * scale, height * scale
+        return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+    def _extract_usage(self, response) -> dict:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return {}
+        prompt_tokens_details = getattr(usage, "prompt_tokens_details", None) # prompt caching of repeated prompt prefixes
+        return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens, "total_tokens": usage.total_tokens,
+                "cached_tokens": getattr(prompt_tokens_details, "cached_tokens", None) or 0}
+
+    def _serialize_response(self, response) -> dict:
+        return response.model_dump(mode="json")
+
+    def _deserialize_response(self, data: dict) -> any:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
 
 class GeminiModel(Model):
-    def __init__(self, api_key: str, model_name: str, image_processor: ImageProcessor, response_handler: ResponseHandler, model_config: dict) -> None:
-        super().__init__(api_key, model_name, image_processor, response_handler, model_config)
+    def __init__(self, api_key: str, model_name: str, image_processor: ImageProcessor, response_handler: ResponseHandler, model_config: dict, **kwargs) -> None:
+        super().__init__(api_key, model_name, image_processor, response_handler, model_config, **kwargs)
         self._gemini = None
 
     def _generate_response(self, encoded_image, prompt) -> any:
+        from google.generativeai import GenerationConfig
+        request_options = {"timeout": self.client_pool.timeout.read} if self.client_pool is not None else None
         return self._gemini.generate_content(
             [encoded_image, prompt],
             generation_config=GenerationConfig(response_mime_type="application/json", **self._kwargs),
+            request_options=request_options,
         )
 
-    def run(self, prompt_path: str, image_path: str, 
-            save_result: bool = True, 
-            save_path: str = f"{ROOT}/runs/", 
-            save_format: str = "json", # "json" or "txt"
-            name: str = f"exp_result") -> dict:
+    def _initialize_client(self) -> None:
+        if self._gemini is None:
+            import google.generativeai as genai # the SDKs are imported on first use, see register_provider
+            configure_gemini(self._api_key) # genai.configure is process-global, configure it once per api key
+            self._gemini = genai.GenerativeModel(model_name=self._model)
+
+    def _estimate_image_tokens(self, image_file_path: str) -> int:
+        return 258 # fixed number of tokens per image
+
+    def _extract_usage(self, response) -> dict:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return {}
+        return {"prompt_tokens": usage.prompt_token_count, "completion_tokens": usage.candidates_token_count, "total_tokens": usage.total_token_count,
+                "cached_tokens": usage.cached_content_token_count}
+
+    def _serialize_response(self, response) -> dict:
+        return response.to_dict()
+
+    def _deserialize_response(self, data: dict) -> any:
+        from google.generativeai import protos
+        from google.generativeai.types import GenerateContentResponse
+        return GenerateContentResponse.from_response(protos.GenerateContentResponse(data))
+
+class LocalModel(ChatGPTModel):
+    """ LocalModel class for load testing the pipeline offline with an OpenAI-shaped stand-in model.
+
+    Every request returns the template as a ChatCompletion after a random latency, so the concurrency, retry,
+    rate limit and cache behavior can be measured without API keys or quota. Injected errors are real
+    openai.RateLimitError / InternalServerError instances with the same status codes and Retry-After headers.
+    With the seed model config the latencies and errors are reproducible for a sequential run.
+
+    Args:
+        template (dict | str): JSON response of every image, or the path to a JSON file (e.g., a label file).
+        latency (float): Mean seconds of a response.
+        latency_std (float): Standard deviation of the latency in seconds.
+        latency_distribution (str): "constant", "uniform", "normal" or "lognormal".
+        error_rate_429 (float): Ratio of the requests answered with 429 Too Many Requests.
+        error_rate_500 (float): Ratio of the requests answered with 500 Internal Server Error.
+        retry_after (float): Retry-After header of the 429 responses in seconds (None = no header).
+        max_concurrent_requests (int): Requests processed at once; the others get a 429 (None = unlimited).
+        max_rpm (int): Requests accepted per minute; the others get a 429 (None = unlimited).
+
+    Attributes:
+        request_count (int): Number of requests received.
+        error_counts (dict): Number of 429 and 500 errors returned.
+    """
+    def __init__(self, api_key: str, model_name: str, image_processor: ImageProcessor, response_handler: ResponseHandler, model_config: dict,
+                 template: dict | str = None, latency: float = 0.0, latency_std: float = 0.0, latency_distribution: str = "constant",
+                 error_rate_429: float = 0.0, error_rate_500: float = 0.0, retry_after: float = None,
+                 max_concurrent_requests: int = None, max_rpm: int = None, **kwargs) -> None:
+        super().__init__(api_key, model_name, image_processor, response_handler, model_config, **kwargs)
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unsupported latency distribution: {latency_distribution}. Please use one of the following distributions: {', '.join(LATENCY_DISTRIBUTIONS)}")
+        if isinstance(template, (str, Path)):
+            template_path = template
+            template = read_json_file(template_path)
+            if template is None:
+                raise FileNotFoundError(f"Template file not found or invalid, please check the file path. {template_path}")
+        self.template = template if template is not None else {"text": ""}
+        self.latency = latency
+        self.latency_std = latency_std
+        self.latency_distribution = latency_distribution
+        self.error_rate_429 = error_rate_429
+        self.error_rate_500 = error_rate_500
+        self.retry_after = retry_after
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_rpm = max_rpm
+        self._random = random.Random(model_config.get("seed"))
+        self._server_lock = threading.Lock()
+        self._in_flight = 0
+        self._request_times = deque() # accepted requests of the last minute
+        self.request_count = 0
+        self.error_counts = {429: 0, 500: 0}
+
+    def _initialize_client(self) -> None:
+        pass # no client, the responses are generated locally
+
+    def _generate_response(self, encoded_image, prompt) -> any:
+        with self._server_lock:
+            self.request_count += 1
+            request_id = self.request_count
+            error_draw, latency = self._random.random(), self._draw_latency()
+            now = time.monotonic()
+            while self._request_times and now - self._request_times[0] >= 60:
+                self._request_times.popleft()
+            if self.max_rpm is not None and len(self._request_times) >= self.max_rpm:
+                raise self._make_error(429, "Rate limit reached for requests per minute")
+            if self.max_concurrent_requests is not None and self._in_flight >= self.max_concurrent_requests:
+                raise self._make_error(429, "Too many concurrent requests")
+            if error_draw < self.error_rate_429:
+                raise self._make_error(429, "Injected rate limit error")
+            self._request_times.append(now)
+            self._in_flight += 1
+
         try:
-            if self._gemini is None:
-                genai.configure(api_key=self._api_key)
-                self._gemini = genai.GenerativeModel(model_name=self._model)
+            time.sleep(latency)
+        finally:
+            with self._server_lock:
+                self._in_flight -= 1
+        if error_draw < self.error_rate_429 + self.error_rate_500:
+            with self._server_lock:
+                raise self._make_error(500, "Injected server error")
 
-            image_loader, prompt, save_dir = self._initialize_run(prompt_path, image_path, name, save_path)
-            response_dict = self._process_images(image_loader, prompt, save_result, save_dir, save_format)
+        from openai.types.chat import ChatCompletion
+        content = json.dumps(self.template, ensure_ascii=False)
+        prompt_tokens = estimate_text_tokens(prompt) + estimate_text_tokens(encoded_image) // 100 # not billed, only sized like a request
+        completion_tokens = estimate_text_tokens(content)
+        return ChatCompletion.model_validate({
+            "id": f"local-{request_id}", "object": "chat.completion", "created": int(time.time()), "model": self._model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        })
 
-            if save_result:
-                print(f"Results saved to {save_dir}")
+    def _draw_latency(self) -> float:
+        if self.latency_distribution == "uniform": # mean +- sqrt(3) * std
+            spread = math.sqrt(3) * self.latency_std
+            latency = self._random.uniform(self.latency - spread, self.latency + spread)
+        elif self.latency_distribution == "normal":
+            latency = self._random.gauss(self.latency, self.latency_std)
+        elif self.latency_distribution == "lognormal" and self.latency > 0: # long tail with the given mean and std
+            sigma = math.sqrt(math.log(1 + (self.latency_std / self.latency) ** 2))
+            latency = self._random.lognormvariate(math.log(self.latency) - sigma ** 2 / 2, sigma)
+        else:
+            latency = self.latency
+        return max(0.0, latency)
+
+    def _make_error(self, status_code: int, message: str) -> Exception:
+        # called with the server lock held
+        self.error_counts[status_code] += 1
+        headers = {"retry-after": str(self.retry_after)} if status_code == 429 and self.retry_after is not None else {}
+        response = httpx.Response(status_code, headers=headers, request=httpx.Request("POST", LOCAL_ENDPOINT))
+        from openai import RateLimitError, InternalServerError
+        error_class = RateLimitError if status_code == 429 else InternalServerError
+        return error_class(message, response=response, body=None)
+
+class CascadeModel(Model):
+    """ CascadeModel class for answering with a cheap primary model and escalating the invalid responses to a stronger fallback model.
 
+    Each response of the primary model is validated against the schema (see validate_json_schema). Only the images whose
+    primary response misses required fields, is not valid JSON or failed are sent again to the fallback model.
+    The tier that answered each image is recorded in cascade.jsonl of the run directory.
+
+    Args:
+        primary (Model): Model answering every image first (e.g., gpt-4o-mini).
+        fallback (Model): Model answering the images the primary model got wrong (e.g., gpt-4o).
+        schema (dict): JSON schema the responses must satisfy.
+
+    Attributes:
+        tier_counts (dict): Number of images answered by each tier in the last run.
+    """
+    def __init__(self, primary: Model, fallback: Model, schema: dict) -> None:
+        super().__init__(primary._api_key, f"{primary._model}+{fallback._model}", primary.image_processor, primary.response_handler, primary._kwargs)
+        self.primary = primary
+        self.fallback = fallback
+        self.schema = schema
+        self._tier_lock = threading.Lock()
+        self.tier_counts = {"primary": 0, "fallback": 0}
+        primary.metrics = fallback.metrics = self.metrics # usage and cost of both tiers per image
+
+    def _request_stage(self, image_file_path: str, encoded_image, prompt: str, save_result: bool, save_dir: Path, timing: dict,
+                       image_bytes: bytes = None) -> dict | None:
+        start_time = time.perf_counter()
+        response = None
+        try:
+            tier, reason = "primary", None
+            try:
+                response = self.primary._request(encoded_image, prompt, image_file_path, image_bytes)
+                response_dict = self.primary._handle_response(response, image_file_path)
+                is_valid, missing_fields = validate_json_schema(response_dict, self.schema)
+                if not is_valid:
+                    reason = f"Missing fields: {missing_fields}"
+            except Exception as e: # a failed primary request is escalated like an invalid response
+                reason = f"{type(e).__name__}: {e}"
+
+            if reason is not None:
+                tier, response = "fallback", None
+                fallback_image = self._encode_fallback_image(image_file_path, encoded_image, image_bytes)
+                response = self.fallback._request(fallback_image, prompt, image_file_path, image_bytes)
+                response_dict = self.fallback._handle_response(response, image_file_path)
+            self._record_tier(image_file_path, tier, reason, save_result, save_dir)
             return response_dict
-        
-        except json.JSONDecodeError as e:
-            raise Exception(f"JSON parsing error: {e}")  # Handle JSON parsing error
         except Exception as e:
-            raise Exception(f"Error occurred: {e}")  # Handle other exceptions with more specific message
+            self._handle_failure(image_file_path, e, response, save_result, save_dir)
+            return None
+        finally:
+            self._add_timing(timing, "request", start_time)
+
+    def _encode_fallback_image(self, image_file_path: str, encoded_image, image_bytes: bytes = None) -> any:
+        # reuse the payload of the primary model if the fallback model would encode the image the same way
+        if type(self.fallback.image_processor) is type(self.primary.image_processor) and \
+           self.fallback.image_processor.preprocessor.get_config() == self.primary.image_processor.preprocessor.get_config():
+            return encoded_image
+        image_processor = self.fallback.image_processor
+        return image_processor.encode_image(*image_processor.preprocessor.prepare(image_file_path, image_bytes))
+
+    def _record_tier(self, image_file_path: str, tier: str, reason: str | None, save_result: bool, save_dir: Path) -> None:
+        with self._tier_lock:
+            self.tier_counts[tier] += 1
+            if save_result:
+                save_dir.mkdir(parents=True, exist_ok=True)
+                append_jsonl_file({
+                    "image_path": str(image_file_path),
+                    "tier": tier,
+                    "model": getattr(self, tier)._model,
+                    "reason": reason, # why the image was escalated
+                }, save_dir / CASCADE_MANIFEST)
+
+    def _start_run(self, prompt_path: str, image_path: str, name: str, save_path: str, cache_mode: str,
+                   resume: bool | str, retry_failed: bool, fail_fast: bool, record: bool | str = False,
+                   replay: str = None, dedup: str = None, dedup_threshold: int = 5, include: list[str] = None,
+                   exclude: list[str] = None) -> tuple[ImageLoader | list[str], str, Path, bool]:
+        if record or replay: # the tiers would share the recording keys
+            raise ValueError("A cascade cannot record or replay the responses, please record the primary and the fallback model separately.")
+        return super()._start_run(prompt_path, image_path, name, save_path, cache_mode, resume, retry_failed, fail_fast,
+                                  dedup=dedup, dedup_threshold=dedup_threshold, include=include, exclude=exclude)
+
+    def _reset_run(self, cache_mode: str, fail_fast: bool, replay: ResponseRecording = None) -> None:
+        for model in (self.primary, self.fallback):
+            model._reset_run(cache_mode, fail_fast)
+        super()._reset_run(cache_mode, fail_fast)
+        self.tier_counts = {"primary": 0, "fallback": 0}
+
+    def _finish_run(self, save_result: bool, save_dir: Path, save_format: str = "json") -> None:
+        super()._finish_run(save_result, save_dir, save_format)
+        print(f"Cascade: {self.tier_counts['primary']} images answered by {self.primary._model}, "
+              f"{self.tier_counts['fallback']} escalated to {self.fallback._model}")
+        for model in (self.primary, self.fallback):
+            if model.retry_policy is not None:
+                print(f"[{model._model}] {model.retry_policy}")
+            if model.cache is not None and model._cache_mode != "bypass":
+                print(f"[{model._model}] {model.cache}")
+            if model.concurrency_limiter is not None:
+                print(f"[{model._model}] {model.concurrency_limiter}")
+            if model.hedger is not None:
+                print(f"[{model._model}] {model.hedger}")
+                model.hedger.close()
+
+    # The tiers send their own requests (with their own rate limiter, retry policy and cache)
+    def _initialize_client(self) -> None:
+        self.primary._initialize_client()
+        self.fallback._initialize_client()
+
+    def _generate_response(self, encoded_image, prompt) -> any:
+        return self.primary._generate_response(encoded_image, prompt)
+
+    def _estimate_image_tokens(self, image_file_path: str) -> int:
+        return self.primary._estimate_image_tokens(image_file_path)
+
+    def _extract_usage(self, response) -> dict:
+        return self.primary._extract_usage(response)
+
+    def _serialize_response(self, response) -> dict:
+        return self.primary._serialize_response(response)
+
+    def _deserialize_response(self, data: dict) -> any:
+        return self.primary._deserialize_response(data)
 
 """
 Helper functions
 """
 
-def load_model(model_name: str, model_config_path: str = None, **kwargs) -> ChatGPTModel | GeminiModel:
+_providers = {} # platform -> (factory, parameters), see register_provider
+_providers_lock = threading.Lock()
+
+def load_model(model_name: str, model_config_path: str = None, fallback_model: str = None, schema: dict | str = None,
+               **kwargs) -> ChatGPTModel | GeminiModel | LocalModel | CascadeModel:
     """Load a model from the model registry.
 
     Args:
-        model_name: Name of the model to load (e.g., 'openai::gpt-4o-mini')
+        model_name: Name of the model to load (e.g., 'openai::gpt-4o-mini', or 'local::<any name>' for offline load tests)
+        fallback_model: Name of a stronger model answering the images whose response does not match the schema
+            (e.g., 'openai::gpt-4o'); returns a CascadeModel of both models with the same config
+        schema: JSON schema of the responses, a path to a JSON schema file, or an example response
+            (dict or JSON file path) to infer the schema from (required with fallback_model)
         **kwargs: Additional arguments to pass to the model constructor
             temperature: float = Controls randomness in the output
             top_p: float = Controls diversity via nucleus sampling
             top_k: int = Controls diversity via top-k sampling
             max_tokens: int = Maximum number of tokens to generate
             repeat_penalty: float = Penalty for repeating tokens
+            rpm: int = Requests per minute allowed for the model (shared by every instance of the same model)
+            tpm: int = Tokens per minute allowed for the model (shared by every instance of the same model)
+            max_retries: int = Maximum number of retries of a transient error (default: 5, 0 = no retry)
+            retry_base_delay: float = Delay of the first retry in seconds (default: 1.0)
+            retry_max_delay: float = Maximum backoff delay in seconds (default: 60.0)
+            adaptive_concurrency: bool = Adapt the number of requests in flight to the latency and the 429s of the provider
+                (AIMD, shared by every instance of the same model; run's max_concurrency still bounds the threads) (default: False)
+            concurrency_min: int = Lowest number of requests in flight of the adaptive concurrency (default: 1)
+            concurrency_max: int = Highest number of requests in flight of the adaptive concurrency (default: 64)
+            hedge_percentile: float = Send a request again if it has not returned after this percentile of the recent latencies
+                and take the first answer (default: None = no hedging)
+            hedge_budget: float = Maximum ratio of hedged requests to requests (default: 0.05)
+            cache_dir: str = Directory of the response cache (default: None = no cache)
+            cache_max_size: int = Maximum size of the response cache in bytes (default: None = unlimited)
+            cache_max_age: float = Maximum age of a cached response in seconds (default: None = unlimited)
+            max_image_side: int = Downscale images larger than this many pixels before upload (default: None)
+            image_format: str = Re-encode images as "JPEG", "WEBP" or "PNG" before upload (default: None = keep)
+            image_quality: int = JPEG/WEBP quality of the re-encoded images (default: 85)
+            grayscale: bool = Convert images to grayscale before upload (default: False)
+            max_connections: int = Maximum number of open connections shared by the models of the platform (default: 1000, OpenAI only)
+            max_keepalive_connections: int = Maximum number of idle connections kept alive (default: 100, OpenAI only)
+            keepalive_expiry: float = Seconds an idle connection is kept alive (default: 5.0, OpenAI only)
+            timeout: float = Timeout of a request in seconds (default: 600.0)
+            connect_timeout: float = Timeout of establishing a connection in seconds (default: 5.0, OpenAI only)
+            http2: bool = Use HTTP/2, requires the h2 package (default: False, OpenAI only)
+            input_price: float = USD per 1M prompt tokens (default: PRICE_TABLE of util.metrics)
+            cached_input_price: float = USD per 1M cached prompt tokens (default: PRICE_TABLE of util.metrics)
+            output_price: float = USD per 1M completion tokens (default: PRICE_TABLE of util.metrics)
+            template: dict | str = Response (or JSON file path) of a local model (default: {"text": ""})
+            latency: float = Mean response seconds of a local model (default: 0.0)
+            latency_std: float = Standard deviation of the latency of a local model (default: 0.0)
+            latency_distribution: str = "constant", "uniform", "normal" or "lognormal" (default: "constant")
+            error_rate_429: float = Ratio of 429 errors injected by a local model (default: 0.0)
+            error_rate_500: float = Ratio of 500 errors injected by a local model (default: 0.0)
+            retry_after: float = Retry-After seconds of the 429 errors of a local model (default: None)
+            max_concurrent_requests: int = Requests a local model processes at once, the others get a 429 (default: None)
+            max_rpm: int = Requests per minute a local model accepts, the others get a 429 (default: None)
 
     Examples:
     >>> model = load_model('openai::gpt-4o-mini', temperature=0.8)
     >>> model = load_model('google::gemini-1.5-pro', top_k=10, top_p=0.9)
     >>> model = load_model('openai::gpt-4o-mini', model_config_path='./config/openai/gpt-4o-mini.json(txt, yaml, csv)')
+    >>> model = load_model('openai::gpt-4o-mini', rpm=500, tpm=200000)
+    >>> model = load_model('openai::gpt-4o-mini', adaptive_concurrency=True, concurrency_max=32) # then run with max_concurrency=32
+    >>> model = load_model('openai::gpt-4o-mini', hedge_percentile=95, hedge_budget=0.05)
+    >>> model = load_model('openai::gpt-4o-mini', cache_dir='./.cache', cache_max_size=2 * 1024 ** 3)
+    >>> model = load_model('google::gemini-1.5-pro', max_image_side=2048, image_format='JPEG', image_quality=80)
+    >>> model = load_model('openai::gpt-4o', max_connections=200, max_keepalive_connections=100, timeout=120)
+    >>> model = load_model('openai::gpt-4o-mini', fallback_model='openai::gpt-4o', schema='./label/example.json')
+    >>> model = load_model('local::mock', template='./label/example.json', latency=0.8, latency_std=0.4, latency_distribution='lognormal',
+    ...                    error_rate_429=0.05, retry_after=1, seed=0)
     """
+    if fallback_model is not None:
+        if schema is None:
+            raise ValueError("A schema is required to validate the responses of the primary model.")
+        return CascadeModel(
+            primary=load_model(model_name, model_config_path, **kwargs),
+            fallback=load_model(fallback_model, model_config_path, **kwargs),
+            schema=load_schema(schema)
+        )
+
     load_dotenv()
     model_config = {}
 
@@ -160,25 +1225,147 @@ def load_model(model_name: str, model_config_path: str = None, **kwargs) -> Chat
         model_config = model_config_loader.get_config()
     
     model_config.update(**kwargs)
+    rpm = model_config.pop("rpm", None) # rate limits are not generation parameters
+    tpm = model_config.pop("tpm", None)
+    retry_policy = RetryPolicy(
+        max_retries=model_config.pop("max_retries", 5),
+        base_delay=model_config.pop("retry_base_delay", 1.0),
+        max_delay=model_config.pop("retry_max_delay", 60.0),
+    )
+    cache_dir = model_config.pop("cache_dir", None)
+    cache_max_size = model_config.pop("cache_max_size", None)
+    cache_max_age = model_config.pop("cache_max_age", None)
+    price_overrides = {key: model_config.pop(f"{key}_price") for key in ("input", "cached_input", "output") if f"{key}_price" in model_config}
+    cache = ResponseCache(cache_dir, max_size=cache_max_size, max_age=cache_max_age) if cache_dir is not None else None
+    preprocessor = ImagePreprocessor(
+        max_side=model_config.pop("max_image_side", None),
+        image_format=model_config.pop("image_format", None),
+        quality=model_config.pop("image_quality", 85),
+        grayscale=model_config.pop("grayscale", False),
+    )
+    client_settings = {key: model_config.pop(key) for key in CLIENT_POOL_PARAMETERS if key in model_config}
+    adaptive_concurrency = model_config.pop("adaptive_concurrency", False)
+    concurrency_bounds = (model_config.pop("concurrency_min", 1), model_config.pop("concurrency_max", 64))
+    hedge_percentile = model_config.pop("hedge_percentile", None)
+    hedge_budget = model_config.pop("hedge_budget", 0.05)
 
-    if "openai::" in model_name:
-        model_name = model_name.split("::")[1]
-        return ChatGPTModel(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            model_name=model_name,
-            image_processor=ChatGPTImageProcessor(),
-            response_handler=ChatGPTResponseHandler(),
-            model_config=model_config
-        )
+    platform, _, name = model_name.partition("::")
+    factory, parameters = get_provider(platform) if name else (None, [])
+    if factory is None:
+        raise ValueError(f"Model {model_name} not found.")
+    provider_settings = {key: model_config.pop(key) for key in get_provider_parameters() if key in model_config} # never sent to an API
+    return factory(
+        name,
+        model_config,
+        preprocessor,
+        client_settings,
+        rate_limiter=get_rate_limiter(model_name, rpm, tpm),
+        retry_policy=retry_policy,
+        cache=cache,
+        prices=get_model_prices(name, price_overrides),
+        concurrency_limiter=get_concurrency_limiter(model_name, *concurrency_bounds) if adaptive_concurrency else None,
+        hedger=RequestHedger(hedge_percentile, hedge_budget) if hedge_percentile else None,
+        **{key: value for key, value in provider_settings.items() if key in parameters}
+    )
 
-    if "google::" in model_name:
-        model_name = model_name.split("::")[1]
-        return GeminiModel(
-            api_key=os.getenv("GEMINI_API_KEY"),
-            model_name=model_name,
-            image_processor=GeminiImageProcessor(),
-            response_handler=GeminiResponseHandler(),
-            model_config=model_config
-        )
-    else:
-        raise ValueError(f"Model {model_name} not found.")
\ No newline at end of file
+def register_provider(platform: str, factory=None, parameters: list[str] = None):
+    """Register the model factory of the '<platform>::<model>' names; usable as a decorator.
+
+    The factory is called as factory(model_name, model_config, preprocessor, client_settings, **components) and returns a Model.
+    components holds rate_limiter, retry_policy, cache, prices, concurrency_limiter and hedger, plus the provider parameters found in the model config.
+    Packages can also register a factory under the 'logos_pipe_ocr.providers' entry point group (name = platform);
+    it is imported only when a model of the platform is loaded.
+
+    Args:
+        platform (str): Platform of the model names (e.g., 'openai').
+        factory (callable): Model factory (omit to use as a decorator).
+        parameters (list[str]): Provider-specific model config parameters (default: the factory's parameters attribute).
+    """
+    def register(factory):
+        with _providers_lock:
+            _providers[platform] = (factory, list(parameters if parameters is not None else getattr(factory, "parameters", [])))
+        return factory
+    return register(factory) if factory is not None else register
+
+def get_provider(platform: str) -> tuple[any, list[str]]:
+    """Return the (factory, parameters) of the platform, loading its entry point on first use, or (None, []) if unknown."""
+    with _providers_lock:
+        provider = _providers.get(platform)
+    if provider is not None:
+        return provider
+    for entry_point in entry_points(group=PROVIDER_ENTRY_POINT_GROUP):
+        if entry_point.name == platform:
+            factory = entry_point.load() # a factory, or a module registering itself with register_provider
+            with _providers_lock:
+                registered = platform in _providers
+            if not registered and callable(factory):
+                register_provider(platform, factory)
+            with _providers_lock:
+                return _providers.get(platform, (None, []))
+    return None, []
+
+def get_provider_parameters() -> set[str]:
+    """Return the provider-specific parameters of every registered provider."""
+    with _providers_lock:
+        return {parameter for _, parameters in _providers.values() for parameter in parameters}
+
+@register_provider("openai")
+def create_openai_model(model_name: str, model_config: dict, preprocessor: ImagePreprocessor, client_settings: dict, **components) -> ChatGPTModel:
+    return ChatGPTModel(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model_name=model_name,
+        image_processor=ChatGPTImageProcessor(preprocessor),
+        response_handler=ChatGPTResponseHandler(),
+        model_config=model_config,
+        client_pool=get_client_pool("openai", **client_settings),
+        **components
+    )
+
+@register_provider("google")
+def create_gemini_model(model_name: str, model_config: dict, preprocessor: ImagePreprocessor, client_settings: dict, **components) -> GeminiModel:
+    ignored_settings = [key for key in client_settings if key not in GEMINI_CLIENT_PARAMETERS]
+    if ignored_settings: # the Gemini SDK manages its own connections
+        print(f"Warning: {', '.join(ignored_settings)} not supported by the Gemini SDK, only {', '.join(GEMINI_CLIENT_PARAMETERS)} is applied.")
+    client_settings = {key: value for key, value in client_settings.items() if key in GEMINI_CLIENT_PARAMETERS}
+    return GeminiModel(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        model_name=model_name,
+        image_processor=GeminiImageProcessor(preprocessor),
+        response_handler=GeminiResponseHandler(),
+        model_config=model_config,
+        client_pool=get_client_pool("google", **client_settings),
+        **components
+    )
+
+@register_provider("local", parameters=LOCAL_MODEL_PARAMETERS)
+def create_local_model(model_name: str, model_config: dict, preprocessor: ImagePreprocessor, client_settings: dict, **components) -> LocalModel:
+    components["prices"] = components.get("prices") or {"input": 0.0, "cached_input": 0.0, "output": 0.0} # no API, no cost
+    return LocalModel(
+        api_key=None,
+        model_name=model_name,
+        image_processor=ChatGPTImageProcessor(preprocessor),
+        response_handler=ChatGPTResponseHandler(),
+        model_config=model_config,
+        **components
+    )
+
+def load_schema(schema: dict | str) -> dict:
+    """Return the JSON schema given as a dict or a file path, or infer it (JsonSchemaGenerator) from an example response."""
+    if isinstance(schema, (str, Path)):
+        schema_path = schema
+        schema = read_json_file(schema_path)
+        if schema is None:
+            raise FileNotFoundError(f"Schema file not found or invalid, please check the file path. {schema_path}")
+    if schema.get("type") == "object" and isinstance(schema.get("properties"), dict): # already a JSON schema
+        return schema
+    return JsonSchemaGenerator(schema).schema
+
+def get_model_prices(model_name: str, price_overrides: dict) -> dict | None:
+    """Return the prices of the model with the configured prices applied."""
+    if not price_overrides:
+        return get_prices(model_name)
+    prices = {**(get_prices(model_name) or {}), **price_overrides}
+    prices.setdefault("input", 0.0)
+    prices.setdefault("cached_input", prices["input"])
+    prices.setdefault("output", 0.0)
+    return prices
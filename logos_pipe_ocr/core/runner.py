@@ -0,0 +1,153 @@
+﻿"""
+This module contains the multi-model runner class for the Logos-pipe-ocr project.
+"""
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logos_pipe_ocr.core.model import Model, ROOT
+from logos_pipe_ocr.util.dataloaders import ImageLoader, PromptLoader
+
+class MultiModelRunner:
+    """ MultiModelRunner class for running several models on the same images in one pass.
+
+    Each image is read once, prepared once per distinct preprocessing config and encoded once per payload type,
+    then the payloads are sent to every model concurrently. Each model saves to its own run directory
+    (e.g., runs/exp_result_gpt-4o/preds, runs/exp_result_gemini-1.5-pro/preds).
+
+    Args:
+        models (list[Model]): Models to compare (see load_model).
+
+    Examples:
+    >>> runner = MultiModelRunner([load_model('openai::gpt-4o-mini'), load_model('google::gemini-1.5-pro')])
+    >>> responses = runner.run(prompt_path, image_path, max_concurrency=8)
+    """
+    def __init__(self, models: list[Model]) -> None:
+        if not models:
+            raise ValueError("At least one model is required.")
+        model_names = [model._model for model in models]
+        if len(set(model_names)) != len(model_names):
+            raise ValueError(f"Duplicate model names: {model_names}") # the run directories are named after the models
+        self.models = models
+
+    def __str__(self) -> str:
+        return f"MultiModelRunner({', '.join(model._model for model in self.models)})"
+
+    def run(self, prompt_path: str, image_path: str,
+            save_result: bool = True,
+            save_path: str = f"{ROOT}/runs/",
+            save_format: str = "json", # "json" or "txt"
+            name: str = f"exp_result",
+            max_concurrency: int = 1,
+            cache_mode: str = "use",
+            fail_fast: bool = False,
+            include: list[str] = None,
+            exclude: list[str] = None) -> dict[str, dict]:
+        """Run every model on every image in the image directory.
+
+        Args:
+            prompt_path (str): Path to the prompt file.
+            image_path (str): Path to the image directory, or to a manifest of image paths (.txt, .csv, .jsonl, see ImageLoader).
+            save_result (bool): Whether to save the responses under save_path.
+            save_path (str): Root directory of the run directories.
+            save_format (str): "json" or "txt".
+            name (str): Prefix of the run directories.
+            max_concurrency (int): Maximum number of images in flight; each of them has one request in flight per model.
+            cache_mode (str): "use" (read and write the response cache), "refresh" (write only) or "bypass".
+            fail_fast (bool): Stop the run at the first failed image instead of recording it in the failure manifests.
+            include (list[str]): Glob patterns of the images to process, relative to the image directory.
+            exclude (list[str]): Glob patterns of the images and directories to skip.
+
+        Returns:
+            dict[str, dict]: The response of the last image of each model, keyed by the model name.
+        """
+        try:
+            image_loader = ImageLoader(image_path, stream=True, include=include, exclude=exclude)
+            prompt = PromptLoader(prompt_path).get_prompt()
+            save_dirs = {}
+            for model in self.models:
+                model._reset_run(cache_mode, fail_fast)
+                model._image_loader = image_loader # prediction paths and metadata of the manifest entries
+                save_dirs[model._model] = model._get_save_dir(name, save_path)
+                if save_result:
+                    model.metrics.open(save_dirs[model._model])
+
+            responses = self._process_images(image_loader, prompt, save_result, save_dirs, save_format, max(max_concurrency, 1))
+            for model in self.models:
+                print(f"[{model._model}]")
+                model._finish_run(save_result, save_dirs[model._model], save_format)
+            return responses
+
+        except json.JSONDecodeError as e:
+            raise Exception(f"JSON parsing error: {e}")  # Handle JSON parsing error
+        except Exception as e:
+            raise Exception(f"Error occurred: {e}")  # Handle other exceptions with more specific message
+
+    def _process_images(self, image_loader: ImageLoader, prompt: str, save_result: bool, save_dirs: dict[str, Path], save_format: str,
+                        max_concurrency: int) -> dict[str, dict]:
+        last_indexes = {model._model: -1 for model in self.models}
+        responses = {model._model: {} for model in self.models} # response of the last image in loader order
+
+        def collect(futures):
+            for future in futures:
+                index, image_responses = future.result() # re-raise the exception of the failed image (fail_fast)
+                for model_name, response_dict in image_responses.items():
+                    if response_dict is not None and index > last_indexes[model_name]:
+                        last_indexes[model_name], responses[model_name] = index, response_dict
+
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="image") as image_executor, \
+             ThreadPoolExecutor(max_workers=max_concurrency * len(self.models), thread_name_prefix="request") as request_executor:
+            in_flight = set()
+            for index, image_file_path in enumerate(image_loader):
+                if len(in_flight) >= max_concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(image_executor.submit(self._process_image, request_executor, index, image_file_path, prompt,
+                                                    save_result, save_dirs, save_format))
+            collect(wait(in_flight).done)
+        return responses
+
+    def _process_image(self, request_executor: ThreadPoolExecutor, index: int, image_file_path: str, prompt: str, save_result: bool,
+                       save_dirs: dict[str, Path], save_format: str) -> tuple[int, dict[str, dict | None]]:
+        image_bytes = None
+        try:
+            with open(image_file_path, "rb") as image_file:
+                image_bytes = image_file.read() # the only read of the image
+        except Exception as e:
+            for model in self.models:
+                model._handle_failure(image_file_path, e, None, save_result, save_dirs[model._model])
+            return index, {model._model: None for model in self.models}
+
+        futures = {}
+        for model, encoded_image in zip(self.models, self._encode_image(image_file_path, image_bytes, save_result, save_dirs)):
+            if encoded_image is None:
+                continue
+            futures[model._model] = request_executor.submit(self._request_image, model, image_file_path, image_bytes, encoded_image,
+                                                            prompt, save_result, save_dirs[model._model], save_format)
+        return index, {model._model: futures[model._model].result() if model._model in futures else None for model in self.models}
+
+    def _encode_image(self, image_file_path: str, image_bytes: bytes, save_result: bool, save_dirs: dict[str, Path]) -> list:
+        """Return the payload of each model, sharing the preparation and the encoding between models with the same config."""
+        prepared_images, encoded_images, payloads = {}, {}, []
+        for model in self.models:
+            preprocessor = model.image_processor.preprocessor
+            prepare_key = json.dumps(preprocessor.get_config(), sort_keys=True)
+            encode_key = (type(model.image_processor), prepare_key)
+            try:
+                if encode_key not in encoded_images:
+                    if prepare_key not in prepared_images:
+                        prepared_images[prepare_key] = preprocessor.prepare(image_file_path, image_bytes)
+                    encoded_images[encode_key] = model.image_processor.encode_image(*prepared_images[prepare_key])
+                payloads.append(encoded_images[encode_key])
+            except Exception as e:
+                model._handle_failure(image_file_path, Exception(f"Image processing error: {e}"), None, save_result, save_dirs[model._model])
+                payloads.append(None)
+        return payloads
+
+    def _request_image(self, model: Model, image_file_path: str, image_bytes: bytes, encoded_image, prompt: str, save_result: bool,
+                       save_dir: Path, save_format: str) -> dict | None:
+        timing = {}
+        response_dict = model._request_stage(image_file_path, encoded_image, prompt, save_result, save_dir, timing, image_bytes)
+        if response_dict is not None:
+            response_dict = model._save_stage(image_file_path, response_dict, save_result, save_dir, save_format, timing)
+        model.metrics.record_timing(image_file_path, timing) # the shared read and encode are not counted per model
+        return response_dict
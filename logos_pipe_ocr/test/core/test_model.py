@@ -1,12 +1,25 @@
 import unittest
 from unittest.mock import MagicMock, patch
 from openai import OpenAI
+from openai.types.chat import ChatCompletion
 import google.generativeai as genai
-from logos_pipe_ocr.core.model import load_model, ChatGPTModel, GeminiModel
+from logos_pipe_ocr.core.model import load_model, load_schema, register_provider, ChatGPTModel, GeminiModel, LocalModel, CascadeModel
 from logos_pipe_ocr.util.datahandlers import ChatGPTImageProcessor, ChatGPTResponseHandler, GeminiImageProcessor, GeminiResponseHandler
 from logos_pipe_ocr.util.dataloaders import ImageLoader
+from logos_pipe_ocr.util.retry import RetryPolicy, get_retry_after
+from logos_pipe_ocr.util.cache import ResponseCache
+from logos_pipe_ocr.util.dedup import ImageDeduplicator
+from logos_pipe_ocr.util.file import read_jsonl_file
 from pathlib import Path
 import os
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 class TestModelLoading(unittest.TestCase):
@@ -43,6 +56,57 @@ class TestModelLoading(unittest.TestCase):
         self.assertEqual(config['repeat_penalty'], 1.2)
         self.assertIsInstance(model, GeminiModel)
 
+    def test_lazy_sdk_imports(self):
+        # 모델 모듈을 import해도 SDK는 로드되지 않아야 함
+        code = ("import sys, logos_pipe_ocr.core.model; "
+                "print([name for name in sys.modules if name.split('.')[0] == 'openai' or name.startswith('google.generativeai')])")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+    def test_register_provider(self):
+        calls = []
+
+        @register_provider("custom", parameters=["endpoint"])
+        def create_custom_model(model_name, model_config, preprocessor, client_settings, **components):
+            calls.append((model_name, dict(model_config), components))
+            return LocalModel(None, model_name, ChatGPTImageProcessor(preprocessor), ChatGPTResponseHandler(), model_config,
+                              prices=components["prices"])
+
+        model = load_model('custom::my-model', endpoint="http://localhost:8000", template={"text": "ok"}, temperature=0.5)
+        self.assertIsInstance(model, LocalModel)
+        model_name, model_config, components = calls[0]
+        self.assertEqual(model_name, "my-model")
+        self.assertEqual(model_config, {"temperature": 0.5}) # 다른 provider의 파라미터(template)도 제거됨
+        self.assertEqual(components["endpoint"], "http://localhost:8000")
+        self.assertIn("rate_limiter", components)
+
+    def test_price_config(self):
+        model = load_model('openai::gpt-4o-mini', input_price=1.0, output_price=2.0)
+        self.assertNotIn('input_price', model._kwargs) # 생성 파라미터로 전달되지 않아야 함
+        self.assertEqual(model.prices, {"input": 1.0, "cached_input": 0.075, "output": 2.0})
+        self.assertEqual(load_model('openai::gpt-4o-mini-2024-07-18').prices["input"], 0.15) # 가격표에서 조회
+
+    def test_rate_limit_config(self):
+        model = load_model('openai::gpt-4o-mini', rpm=500, tpm=200000, temperature=0.5)
+        self.assertNotIn('rpm', model._kwargs) # 생성 파라미터로 전달되지 않아야 함
+        self.assertNotIn('tpm', model._kwargs)
+        self.assertEqual((model.rate_limiter.rpm, model.rate_limiter.tpm), (500, 200000))
+        self.assertIs(load_model('openai::gpt-4o-mini').rate_limiter, model.rate_limiter) # 같은 모델은 예산 공유
+
+    def test_client_pool_config(self):
+        model = load_model('openai::gpt-4o-mini', max_connections=50, timeout=30.0)
+        self.assertNotIn('max_connections', model._kwargs) # 생성 파라미터로 전달되지 않아야 함
+        self.assertNotIn('timeout', model._kwargs)
+        self.assertEqual(model.client_pool.limits.max_connections, 50)
+        other_model = load_model('openai::gpt-4o', max_connections=50, timeout=30.0)
+        self.assertIs(other_model.client_pool, model.client_pool) # 같은 플랫폼은 커넥션 공유
+
+    def test_gemini_client_settings(self):
+        with patch("builtins.print") as mock_print:
+            model = load_model('google::gemini-1.5-pro', max_connections=50, http2=False, timeout=30.0)
+        self.assertIn("max_connections, http2", mock_print.call_args[0][0]) # 적용되지 않는 설정 경고
+        self.assertEqual(model.client_pool.timeout.read, 30.0)
+
 class TestChatGPTModel(unittest.TestCase):
     def setUp(self):
         # 초기화 코드
@@ -120,5 +184,570 @@ class TestGeminiModel(unittest.TestCase):
         # 응답 검증
         self.assertIsNotNone(response)
 
+def mock_chatgpt_response(content: str, usage: dict = None) -> ChatCompletion: # API 호출 없이 만든 ChatCompletion 응답
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": usage,
+    })
+
+class TestConcurrentProcessing(unittest.TestCase):
+    def setUp(self):
+        self.model = ChatGPTModel(None, "gpt-4o-mini", ChatGPTImageProcessor(), ChatGPTResponseHandler(), {})
+        self.model._client = MagicMock() # 모의 클라이언트 설정 (API 호출 없음)
+        self.model._client.chat.completions.create.return_value = mock_chatgpt_response('{"answer": "animal"}')
+        self.prompt_path = "./data/prompt/prompt.txt"
+        self.image_path = "./data/image"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_run_concurrent(self):
+        response_dict = self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=4)
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4) # 이미지 4개 모두 요청
+        self.assertEqual(response_dict["answer"], "animal")
+        for sub_dir, stem in [("cat", "cat001"), ("cat", "cat002"), ("dog", "dog001"), ("dog", "dog002")]:
+            self.assertTrue(os.path.exists(save_dir / "preds" / sub_dir / f"{stem}.json")) # 순차 실행과 동일한 저장 경로
+
+    def test_run_concurrent_returns_last_image_response(self):
+        image_loader = ImageLoader(self.image_path)
+        last_image = image_loader.get_file_path()[-1]
+        response_dict = self.model._process_images(image_loader, "prompt", save_result=False, save_dir=Path(self.tmp_dir.name), save_format="json", max_concurrency=3)
+        self.assertEqual(response_dict["file_name"], os.path.basename(last_image))
+
+    def test_run_iter(self):
+        results = list(self.model.run_iter(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2))
+        self.assertEqual(len(results), 4)
+        self.assertEqual(sorted(image_path for image_path, _, _ in results), sorted(ImageLoader(self.image_path).get_file_path()))
+        for image_path, response_dict, timing in results:
+            self.assertEqual(response_dict["file_name"], os.path.basename(image_path)) # 이미지별 결과
+            self.assertGreaterEqual(timing["total"], 0.0)
+        self.assertTrue(os.path.exists(Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini" / "preds" / "dog" / "dog002.json"))
+
+    def test_run_iter_failed_image(self):
+        self.model._client.chat.completions.create.side_effect = RuntimeError("server error")
+        results = list(self.model.run_iter(self.prompt_path, self.image_path, save_path=self.tmp_dir.name))
+        self.assertEqual([response_dict for _, response_dict, _ in results], [None] * 4) # 실패한 이미지는 None
+
+    def test_run_prefetch_pipeline(self):
+        encode_threads = []
+        process_image = self.model.image_processor.process_image
+        def record_thread(image_file_path, *args):
+            encode_threads.append(threading.current_thread().name)
+            return process_image(image_file_path, *args)
+        self.model.image_processor.process_image = record_thread
+
+        results = list(self.model.run_iter(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2, prefetch=3))
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(name.startswith("encode") for name in encode_threads)) # 인코딩은 별도 스레드 풀에서 수행
+        for _, response_dict, timing in results:
+            self.assertIsNotNone(response_dict)
+            self.assertEqual(set(timing), {"read", "encode", "request", "save", "total"}) # 단계별 시간 기록
+        self.assertEqual(len(list((Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini" / "preds").rglob("*.json"))), 4)
+
+    def test_run_prefetch_bounded(self):
+        in_flight, max_in_flight, lock = [0], [0], threading.Lock()
+        process_image = self.model.image_processor.process_image
+        def track(*args): # 인코딩 후 저장 전까지의 이미지 수 추적
+            with lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            return process_image(*args)
+        save_response = self.model._save_response
+        def untrack(*args):
+            save_response(*args)
+            with lock:
+                in_flight[0] -= 1
+        self.model.image_processor.process_image = track
+        self.model._save_response = untrack
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=1, prefetch=1)
+        self.assertEqual(self.model._failure_count, 0)
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4)
+        self.assertGreaterEqual(max_in_flight[0], 1)
+        self.assertLessEqual(max_in_flight[0], 3) # 인코딩 1 + 요청 1 + 저장 1 이하로 메모리 제한
+
+    def test_run_with_rate_limiter(self):
+        self.model.rate_limiter = MagicMock()
+        self.model._client.chat.completions.create.return_value.usage = MagicMock(prompt_tokens=900, completion_tokens=100, total_tokens=1000, prompt_tokens_details=None)
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2)
+        self.assertEqual(self.model.rate_limiter.acquire.call_count, 4) # 요청마다 예산 확보
+        estimated_tokens, actual_tokens = self.model.rate_limiter.reconcile.call_args[0]
+        self.assertGreater(estimated_tokens, 85) # 텍스트 + 이미지 토큰 추정
+        self.assertEqual(actual_tokens, 1000)
+
+    def test_run_metrics(self):
+        self.model._client.chat.completions.create.return_value = mock_chatgpt_response('{"answer": "animal"}', usage={
+            "prompt_tokens": 1000, "completion_tokens": 100, "total_tokens": 1100, "prompt_tokens_details": {"cached_tokens": 400}})
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2)
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        with open(save_dir / "metrics.json", encoding="utf-8-sig") as file:
+            metrics = json.load(file)
+        records = read_jsonl_file(save_dir / "metrics.jsonl") # 이미지별 기록은 처리 즉시 추가
+        self.assertEqual(len(records), 4)
+        self.assertEqual(set(records[0]["timing"]), {"read", "encode", "request", "save", "total"})
+        self.assertEqual(metrics["summary"]["tokens"]["cached_tokens"], 1600)
+        self.assertEqual(set(metrics["summary"]["timing"]["request"]), {"p50", "p95", "p99", "mean", "total"})
+        expected_cost = 4 * (600 * 0.15 + 400 * 0.075 + 100 * 0.60) / 1_000_000 # gpt-4o-mini 가격표 기준
+        self.assertAlmostEqual(metrics["summary"]["cost"], expected_cost)
+
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, resume=True) # 처리할 이미지 없음
+        with open(save_dir / "metrics.json", encoding="utf-8-sig") as file:
+            self.assertEqual(json.load(file)["summary"]["images"], 4) # 이전 실행의 기록을 덮어쓰지 않음
+        with open(save_dir / "metrics.2.json", encoding="utf-8-sig") as file:
+            self.assertEqual(json.load(file)["summary"]["images"], 0)
+
+    def test_run_dedup(self):
+        image_dir = Path(self.tmp_dir.name) / "image"
+        shutil.copytree(self.image_path, image_dir)
+        shutil.copy(image_dir / "cat" / "cat001.jpeg", image_dir / "cat" / "cat001_copy.jpeg") # 중복 이미지
+        shutil.copy(image_dir / "cat" / "cat001.jpeg", image_dir / "dog" / "cat001_again.jpeg")
+        results = list(self.model.run_iter(self.prompt_path, str(image_dir), save_path=self.tmp_dir.name, max_concurrency=2, dedup="exact"))
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4) # 대표 이미지만 전송
+        self.assertEqual(len(results), 6)
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        with open(save_dir / "preds" / "dog" / "cat001_again.json", encoding="utf-8-sig") as file:
+            self.assertEqual(json.load(file), {"answer": "animal", "file_name": "cat001_again.jpeg"}) # 자신의 file_name으로 복사
+        duplicates = read_jsonl_file(save_dir / "duplicates.jsonl") # 대표 이미지는 탐색 순서에 따라 결정
+        self.assertEqual(len(duplicates), 2)
+        self.assertEqual(len({entry["duplicate_of"] for entry in duplicates}), 1)
+        self.assertEqual({Path(entry["image_path"]).name for entry in duplicates} | {Path(duplicates[0]["duplicate_of"]).name},
+                         {"cat001.jpeg", "cat001_copy.jpeg", "cat001_again.jpeg"})
+
+        shutil.rmtree(save_dir / "preds")
+        self.model.run(self.prompt_path, str(image_dir), save_path=self.tmp_dir.name, resume=True, dedup="exact") # 같은 디렉토리에서 재실행
+        self.assertEqual(len(read_jsonl_file(save_dir / "duplicates.jsonl")), 2) # 중복 항목이 다시 추가되지 않음
+
+    def test_run_dedup_hashes_in_encode_pool(self):
+        calls = []
+        original_add = ImageDeduplicator.add
+        def add(deduplicator, image_file_path, image_bytes=None):
+            calls.append((threading.current_thread().name, image_bytes is not None))
+            return original_add(deduplicator, image_file_path, image_bytes)
+        with patch.object(ImageDeduplicator, "add", add):
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2, dedup="perceptual")
+        self.assertEqual(len(calls), 4)
+        self.assertTrue(all(name.startswith("encode") for name, _ in calls)) # 디스패처 스레드에서 해시를 계산하지 않음
+        self.assertTrue(all(has_bytes for _, has_bytes in calls)) # 이미 읽은 바이트를 재사용
+
+    def test_run_with_retry(self):
+        self.model.retry_policy = RetryPolicy(max_retries=2, base_delay=0)
+        self.model._client.chat.completions.create.side_effect = [TimeoutError("timeout"), mock_chatgpt_response('{"answer": "animal"}')] * 4
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.assertEqual(self.model.retry_policy.retries, 4) # 이미지마다 한 번씩 재시도 후 성공
+        self.assertEqual(self.model.retry_policy.give_ups, 0)
+
+    def test_run_with_cache(self):
+        self.model.cache = ResponseCache(os.path.join(self.tmp_dir.name, "cache"))
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name) # 동일 입력 재실행
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4) # 두 번째 실행은 API 호출 없음
+        self.assertEqual(self.model.cache.hits, 4)
+        self.assertTrue(os.path.exists(Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini2" / "preds" / "cat" / "cat001.json"))
+
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, cache_mode="refresh")
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 8) # refresh 모드는 캐시를 읽지 않음
+        self.model._kwargs = {"temperature": 0.1}
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 12) # 모델 설정이 다르면 다른 키
+
+    def test_cache_key_reuses_image_bytes(self):
+        self.model.cache = ResponseCache(os.path.join(self.tmp_dir.name, "cache"))
+        with patch.object(self.model, "_get_cache_key", wraps=self.model._get_cache_key) as get_cache_key:
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2)
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.assertEqual(get_cache_key.call_count, 8)
+        self.assertTrue(all(isinstance(call.args[2], bytes) for call in get_cache_key.call_args_list)) # 이미지를 다시 읽지 않음
+
+    def test_run_resume(self):
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        self.model._client.chat.completions.create.side_effect = [mock_chatgpt_response('{"answer": "animal"}')] * 2 + [RuntimeError("outage")]
+        with self.assertRaises(Exception):
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, fail_fast=True) # 세 번째 이미지에서 중단
+
+        self.model._client.chat.completions.create.side_effect = None
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, resume=True)
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 3 + 2) # 남은 이미지 2개만 요청
+        self.assertFalse(os.path.exists(Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini2")) # 새 실행 디렉토리를 만들지 않음
+        self.assertEqual(len(list((save_dir / "preds").rglob("*.json"))), 4)
+
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, resume=str(save_dir)) # 디렉토리 지정
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 5) # 모두 처리되어 요청 없음
+
+    def test_run_resume_prunes_failures(self):
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        self.model._client.chat.completions.create.side_effect = RuntimeError("outage")
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.model._client.chat.completions.create.side_effect = [RuntimeError("outage")] + [mock_chatgpt_response('{"answer": "animal"}')] * 3
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, resume=True)
+        failures = read_jsonl_file(save_dir / "failures.jsonl")
+        self.assertEqual(len(failures), 1) # 성공한 이미지와 중복 항목은 매니페스트에서 제거
+
+        self.model._client.chat.completions.create.side_effect = None
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, retry_failed=True)
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4 + 4 + 1) # 남은 실패 이미지만 재요청
+        self.assertFalse(os.path.exists(save_dir / "failures.jsonl"))
+
+    def test_run_resume_invalid_dir(self):
+        with self.assertRaises(Exception):
+            self.model.run(self.prompt_path, self.image_path, resume=os.path.join(self.tmp_dir.name, "missing"))
+
+    def test_run_invalid_cache_mode(self):
+        with self.assertRaises(ValueError):
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, cache_mode="invalid")
+
+    def test_run_concurrent_error(self):
+        self.model._client.chat.completions.create.side_effect = RuntimeError("connection lost")
+        with self.assertRaises(Exception):
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2, fail_fast=True)
+
+    def test_run_failure_isolation(self):
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        responses = {"cat001.jpeg": "not a json", "dog001.jpeg": '{"answer": "dog"}'} # cat001은 잘못된 JSON 응답
+        def create(**kwargs):
+            image_url = kwargs["messages"][0]["content"][1]["image_url"]["url"]
+            for file_name, content in responses.items():
+                if self._encoded[file_name] in image_url:
+                    return mock_chatgpt_response(content)
+            raise RuntimeError("server error")
+        self._encoded = {name: ChatGPTImageProcessor().process_image(os.path.join(self.image_path, name[:3], name)) for name in responses}
+        self.model._client.chat.completions.create.side_effect = create
+
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2)
+        self.assertTrue(os.path.exists(save_dir / "preds" / "dog" / "dog001.json")) # 실패와 무관하게 계속 처리
+        failures = read_jsonl_file(save_dir / "failures.jsonl")
+        self.assertEqual(len(failures), 3)
+        failure = next(f for f in failures if f["image_path"].endswith("cat001.jpeg"))
+        self.assertEqual(failure["error_class"], "JSONDecodeError")
+        self.assertEqual(failure["raw_response"], "not a json") # 원본 응답 기록
+
+        self.model._client.chat.completions.create.side_effect = None
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, retry_failed=True)
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4 + 3) # 실패한 이미지만 재요청
+        self.assertFalse(os.path.exists(save_dir / "failures.jsonl")) # 모두 성공하면 매니페스트 없음
+        self.assertEqual(len(list((save_dir / "preds").rglob("*.json"))), 4)
+
+    def test_retry_failed_keeps_manifest(self):
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        self.model._client.chat.completions.create.side_effect = RuntimeError("outage")
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.assertEqual(len(read_jsonl_file(save_dir / "failures.jsonl")), 4)
+
+        self.model._client.chat.completions.create.side_effect = KeyboardInterrupt # 재시도 도중 중단
+        with self.assertRaises(KeyboardInterrupt):
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, retry_failed=True)
+        self.assertEqual(len(read_jsonl_file(save_dir / "failures.prev.jsonl")), 4) # 실패 목록 유지
+
+        self.model._client.chat.completions.create.side_effect = None
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, retry_failed=True, save_result=False)
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4 + 1 + 4)
+        self.assertEqual(len(read_jsonl_file(save_dir / "failures.jsonl")), 4) # 저장하지 않은 실행은 매니페스트를 바꾸지 않음
+        self.assertFalse(os.path.exists(save_dir / "failures.prev.jsonl"))
+
+    def test_retry_failed_invalid_manifest(self):
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        self.model._client.chat.completions.create.side_effect = RuntimeError("outage")
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        with open(save_dir / "failures.jsonl", "a", encoding="utf-8") as file:
+            file.write('{"image_path": "./data/ima') # 기록 도중 중단된 줄
+
+        self.model._client.chat.completions.create.side_effect = None
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, retry_failed=True)
+        self.assertEqual(self.model._client.chat.completions.create.call_count, 4 + 4) # 나머지 줄의 이미지는 재시도
+        self.assertTrue(os.path.exists(save_dir / "failures.invalid.jsonl")) # 읽지 못한 매니페스트는 삭제하지 않음
+
+class TestChatGPTBatch(unittest.TestCase):
+    def setUp(self):
+        self.model = ChatGPTModel(None, "gpt-4o-mini", ChatGPTImageProcessor(), ChatGPTResponseHandler(), {"temperature": 0.0})
+        self.prompt_path = "./data/prompt/prompt.txt"
+        self.image_path = "./data/image"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_create_batch_file(self):
+        batch_file_path = self.model.create_batch_file(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        batch_requests = read_jsonl_file(batch_file_path)
+        self.assertEqual(len(batch_requests), 4)
+        custom_ids = [request["custom_id"] for request in batch_requests]
+        self.assertEqual(custom_ids, ImageLoader(self.image_path).get_file_path()) # custom_id는 이미지 경로
+        request = batch_requests[0]
+        self.assertEqual((request["method"], request["url"]), ("POST", "/v1/chat/completions"))
+        self.assertEqual(request["body"]["model"], "gpt-4o-mini")
+        self.assertEqual(request["body"]["temperature"], 0.0)
+        self.assertEqual(request["body"]["response_format"], {"type": "json_object"})
+
+    def test_ingest_batch_output(self):
+        batch_file_path = self.model.create_batch_file(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        save_dir = batch_file_path.parent
+        batch_output_path = os.path.join(self.tmp_dir.name, "batch_output.jsonl")
+        with open(batch_output_path, "w", encoding="utf-8") as f:
+            for i, request in enumerate(read_jsonl_file(batch_file_path)):
+                if i == 0: # 실패한 요청
+                    output = {"id": f"batch_req_{i}", "custom_id": request["custom_id"], "response": None, "error": {"code": "server_error", "message": "failed"}}
+                else:
+                    body = mock_chatgpt_response('{"answer": "동물"}').model_dump(mode="json")
+                    output = {"id": f"batch_req_{i}", "custom_id": request["custom_id"], "response": {"status_code": 200, "request_id": "req", "body": body}, "error": None}
+                f.write(json.dumps(output, ensure_ascii=False) + "\n")
+            f.write('{"id": "batch_req_4", "custom_id": "trunc\n') # 잘린 줄
+
+        response_dict = self.model.ingest_batch_output(batch_output_path, save_dir)
+        self.assertEqual(response_dict["answer"], "동물")
+        self.assertEqual(len(list((save_dir / "preds").rglob("*.json"))), 3) # run과 같은 preds 구조
+        failures = read_jsonl_file(save_dir / "failures.jsonl")
+        self.assertEqual(failures[0]["image_path"], ImageLoader(self.image_path).get_file_path()[0])
+        self.assertEqual(failures[1]["image_path"], f"{batch_output_path}:5") # 잘못된 줄도 기록하고 계속 처리
+        self.assertEqual(failures[1]["error_class"], "JSONDecodeError")
+
+    def test_create_batch_file_limit(self):
+        with patch("logos_pipe_ocr.core.model.BATCH_MAX_REQUESTS", 3):
+            with self.assertRaises(ValueError):
+                self.model.create_batch_file(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.assertFalse(os.path.exists(Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini" / "batch_requests.jsonl")) # 거부될 파일은 남기지 않음
+
+    def test_ingest_batch_output_file_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            self.model.ingest_batch_output(os.path.join(self.tmp_dir.name, "missing.jsonl"), self.tmp_dir.name)
+
+class TestLocalModel(unittest.TestCase):
+    def setUp(self):
+        self.prompt_path = "./data/prompt/prompt.txt"
+        self.image_path = "./data/image"
+        self.template = "./data/label/cat/cat001.json" # 라벨 파일을 응답 템플릿으로 사용
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_run(self):
+        model = load_model('local::mock', template=self.template, max_retries=0)
+        self.assertIsInstance(model, LocalModel)
+        model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=4)
+        with open(self.template, encoding="utf-8-sig") as file:
+            template = json.load(file)
+        with open(Path(self.tmp_dir.name) / "exp_result_mock" / "preds" / "dog" / "dog001.json", encoding="utf-8-sig") as file:
+            response_dict = json.load(file)
+        self.assertEqual(response_dict, {**template, "file_name": "dog001.jpeg"}) # API 키 없이 템플릿 응답
+        self.assertEqual(model.request_count, 4)
+        self.assertEqual(model.metrics.get_summary()["cost"], 0.0)
+
+    def test_run_manifest(self):
+        manifest_path = Path(self.tmp_dir.name) / "images.txt"
+        manifest_path.write_text(f"{os.path.abspath(self.image_path)}/cat/cat002.jpeg\n", encoding="utf-8")
+        model = load_model('local::manifest', max_retries=0)
+        model.run(self.prompt_path, str(manifest_path), save_path=self.tmp_dir.name)
+        self.assertEqual(model.request_count, 1) # 매니페스트의 이미지만 처리
+        self.assertTrue((Path(self.tmp_dir.name) / "exp_result_manifest" / "preds" / "cat" / "cat002.json").exists())
+
+    def test_run_manifest_prediction_paths(self):
+        for image_path in ["a/scan/p1.jpeg", "b/scan/p1.jpeg", "b/scan/p1.png"]:
+            os.makedirs(Path(self.tmp_dir.name) / Path(image_path).parent, exist_ok=True)
+            shutil.copy(Path(self.image_path) / "cat" / "cat001.jpeg", Path(self.tmp_dir.name) / image_path)
+        manifest_path = Path(self.tmp_dir.name) / "images.jsonl"
+        manifest_path.write_text('{"path": "a/scan/p1.jpeg", "doc": 1}\n{"path": "b/scan/p1.jpeg", "doc": 2}\n'
+                                 '{"path": "b/scan/p1.png", "doc": 3}\n{"path": "c/missing.jpeg", "doc": 4}\n', encoding="utf-8")
+        model = load_model('local::manifest', max_retries=0)
+        model.run(self.prompt_path, str(manifest_path), save_path=self.tmp_dir.name)
+        save_dir = Path(self.tmp_dir.name) / "exp_result_manifest"
+        self.assertTrue((save_dir / "preds" / "a" / "scan" / "p1.json").exists()) # 매니페스트 기준 상대 경로로 저장
+        self.assertTrue((save_dir / "preds" / "b" / "scan" / "p1.json").exists())
+        failures = {Path(entry["image_path"]).name: entry for entry in read_jsonl_file(save_dir / "failures.jsonl")}
+        self.assertEqual(failures["p1.png"]["error_class"], "ValueError") # 같은 예측 파일에 덮어쓰지 않음
+        self.assertEqual(failures["p1.png"]["metadata"], {"doc": 3}) # 매니페스트 메타데이터 기록
+        self.assertEqual(failures["missing.jpeg"]["metadata"], {"doc": 4})
+
+        model.run(self.prompt_path, str(manifest_path), save_path=self.tmp_dir.name, retry_failed=True)
+        failures = {Path(entry["image_path"]).name: entry for entry in read_jsonl_file(save_dir / "failures.jsonl")}
+        self.assertEqual(failures["missing.jpeg"]["metadata"], {"doc": 4}) # 재시도 후에도 메타데이터 유지
+
+    def test_error_injection_with_retry(self):
+        model = load_model('local::mock', error_rate_429=0.3, error_rate_500=0.3, retry_after=0, retry_base_delay=0, max_retries=20, seed=1)
+        model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2)
+        self.assertEqual(model._failure_count, 0) # 재시도로 모두 성공
+        self.assertGreater(model.retry_policy.retries, 0)
+        self.assertEqual(model.retry_policy.retries, sum(model.error_counts.values()))
+        self.assertEqual(model.request_count, 4 + model.retry_policy.retries)
+
+    def test_reproducible(self):
+        error_counts = []
+        for _ in range(2):
+            model = load_model('local::mock', error_rate_500=0.5, retry_base_delay=0, max_retries=20, seed=7)
+            model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+            error_counts.append(model.error_counts)
+        self.assertEqual(error_counts[0], error_counts[1]) # 같은 시드는 같은 결과
+
+    def test_concurrency_limit(self):
+        model = load_model('local::mock', latency=0.1, max_concurrent_requests=1, max_retries=0)
+        model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=4)
+        self.assertGreater(model.error_counts[429], 0) # 서버 동시 처리 한도 초과 시 429
+        self.assertEqual(model._failure_count, model.error_counts[429])
+
+    def test_adaptive_concurrency(self):
+        # 서버가 동시에 4개만 처리할 때 한도가 4 근처로 수렴해야 함
+        model = load_model('local::adaptive', latency=0.02, max_concurrent_requests=4, max_retries=20, retry_base_delay=0.01,
+                           adaptive_concurrency=True, concurrency_max=16)
+        limiter = model.concurrency_limiter
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: model._call("data:image/jpeg;base64,", "prompt", "image.jpg"), range(200)))
+        self.assertGreater(limiter.decreases, 0)
+        self.assertGreater(limiter.peak_limit, 4)
+        self.assertLessEqual(limiter.limit, 8)
+        self.assertLess(model.error_counts[429], 100) # 고정 동시성 16보다 429가 적음
+
+    def test_hedging(self):
+        model = load_model('local::hedge', hedge_percentile=90, hedge_budget=1.0, max_retries=0)
+        generate_response = model._generate_response
+        stall_next, released = [False], threading.Event()
+        def stall(encoded_image, prompt):
+            if stall_next[0]: # 첫 요청만 중복 요청이 응답할 때까지 지연
+                stall_next[0] = False
+                released.wait(5)
+            return generate_response(encoded_image, prompt)
+        model._generate_response = stall
+        for index in range(40):
+            released = threading.Event()
+            stall_next[0] = index >= 20 and index % 10 == 9 # 지연 기준이 정해진 후 10번째 요청마다 지연
+            model._call("data:image/jpeg;base64,", "prompt", f"image{index}.jpg")
+            released.set()
+        self.assertGreaterEqual(model.hedger.hedge_wins, 2) # 지연된 요청은 모두 중복 요청이 응답
+        self.assertLessEqual(model.hedger.hedge_wins, model.hedger.hedges)
+        model.hedger.close()
+
+    def test_hedging_excludes_throttling(self):
+        model = load_model('local::hedge', hedge_percentile=99, hedge_budget=1.0, max_retries=0, latency=0.01)
+        model.rate_limiter = MagicMock()
+        model._estimate_tokens = MagicMock(return_value=1000)
+        for index in range(20):
+            model._call("data:image/jpeg;base64,", "prompt", f"image{index}.jpg")
+        model.rate_limiter.acquire.side_effect = lambda tokens: time.sleep(0.1) # 로컬 대기는 응답 지연이 아님
+        for index in range(5):
+            model._call("data:image/jpeg;base64,", "prompt", f"image{index}.jpg")
+        self.assertLess(model.hedger.get_delay(), 0.1) # 지연 기준에 대기 시간이 포함되지 않음
+        model.hedger.close()
+
+    def test_hedging_reserves_rate_limit(self):
+        model = load_model('local::hedge', hedge_percentile=50, hedge_budget=1.0, max_retries=0, latency=0.01)
+        model.rate_limiter = MagicMock()
+        model.rate_limiter.try_acquire.return_value = False
+        model._estimate_tokens = MagicMock(return_value=1000)
+        for index in range(20):
+            model._call("data:image/jpeg;base64,", "prompt", f"image{index}.jpg")
+        generate_response = model._generate_response
+        def stall(encoded_image, prompt):
+            time.sleep(0.1)
+            return generate_response(encoded_image, prompt)
+        model._generate_response = stall
+        model._call("data:image/jpeg;base64,", "prompt", "image.jpg")
+        model.rate_limiter.try_acquire.assert_called_with(1000) # 중복 요청도 요청 한도를 예약
+        self.assertEqual((model.hedger.hedges, model.hedger.budget_skips), (0, 1)) # 한도에 여유가 없으면 보내지 않음
+        model.hedger.close()
+
+    def test_retry_after_header(self):
+        model = load_model('local::mock', error_rate_429=1.0, retry_after=2)
+        with self.assertRaises(Exception) as context:
+            model._generate_response("data:image/jpeg;base64,", "prompt")
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(get_retry_after(context.exception), 2.0) # 실제 API와 같은 Retry-After 헤더
+
+    def test_latency_distribution(self):
+        model = load_model('local::mock', latency=1.0, latency_std=0.5, latency_distribution='lognormal', seed=0)
+        latencies = [model._draw_latency() for _ in range(2000)]
+        self.assertAlmostEqual(sum(latencies) / len(latencies), 1.0, delta=0.1)
+        with self.assertRaises(ValueError):
+            load_model('local::mock', latency_distribution='pareto')
+
+class TestRecordReplay(unittest.TestCase):
+    def setUp(self):
+        self.model = ChatGPTModel(None, "gpt-4o-mini", ChatGPTImageProcessor(), ChatGPTResponseHandler(), {})
+        self.model._client = MagicMock() # 모의 클라이언트 설정 (API 호출 없음)
+        self.model._client.chat.completions.create.return_value = mock_chatgpt_response('{"answer": "animal"}')
+        self.prompt_path = "./data/prompt/prompt.txt"
+        self.image_path = "./data/image"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_record_and_replay(self):
+        self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2, record=True)
+        record_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini"
+        recording = read_jsonl_file(record_dir / "responses.jsonl")
+        self.assertEqual(sorted(entry["key"] for entry in recording), ["cat/cat001.jpeg", "cat/cat002.jpeg", "dog/dog001.jpeg", "dog/dog002.jpeg"])
+
+        replay_model = ChatGPTModel(None, "gpt-4o-mini", ChatGPTImageProcessor(), ChatGPTResponseHandler(), {}) # API 키 없음
+        replay_model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, replay=str(record_dir))
+        self.assertIsNone(replay_model._client) # 클라이언트 생성 없이 재생
+        replay_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini2"
+        for sub_dir, stem in [("cat", "cat001"), ("dog", "dog002")]:
+            with open(record_dir / "preds" / sub_dir / f"{stem}.json", encoding="utf-8-sig") as recorded, \
+                 open(replay_dir / "preds" / sub_dir / f"{stem}.json", encoding="utf-8-sig") as replayed:
+                self.assertEqual(json.load(recorded), json.load(replayed)) # 같은 결과
+
+    def test_replay_missing_response(self):
+        recording_path = Path(self.tmp_dir.name) / "partial.jsonl"
+        self.model.run(self.prompt_path, "./data/image/cat", save_path=self.tmp_dir.name, record=str(recording_path))
+        replay_model = ChatGPTModel(None, "gpt-4o-mini", ChatGPTImageProcessor(), ChatGPTResponseHandler(), {})
+        replay_model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, replay=str(recording_path))
+        self.assertEqual(replay_model._failure_count, 4) # cat 디렉토리 기준 키이므로 모두 누락
+
+    def test_record_and_replay_together(self):
+        with self.assertRaises(Exception):
+            self.model.run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, record=True, replay=self.tmp_dir.name)
+
+class TestCascadeModel(unittest.TestCase):
+    def setUp(self):
+        self.primary = ChatGPTModel(None, "gpt-4o-mini", ChatGPTImageProcessor(), ChatGPTResponseHandler(), {})
+        self.fallback = ChatGPTModel(None, "gpt-4o", ChatGPTImageProcessor(), ChatGPTResponseHandler(), {})
+        for model in (self.primary, self.fallback):
+            model._client = MagicMock() # 모의 클라이언트 설정 (API 호출 없음)
+        self.fallback._client.chat.completions.create.return_value = mock_chatgpt_response('{"answer": "animal", "count": 1}')
+        self.schema = load_schema({"answer": "animal", "count": 1}) # 예시 응답으로부터 스키마 추론
+        self.model = CascadeModel(self.primary, self.fallback, self.schema)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_escalate_invalid_responses(self):
+        self.primary._client.chat.completions.create.side_effect = [ # 2개는 필드 누락, 1개는 JSON 오류
+            mock_chatgpt_response('{"answer": "animal", "count": 2}'),
+            mock_chatgpt_response('{"answer": "animal"}'),
+            mock_chatgpt_response('not json'),
+            mock_chatgpt_response('{"answer": "animal", "count": 3}'),
+        ]
+        self.model.run("./data/prompt/prompt.txt", "./data/image", save_path=self.tmp_dir.name)
+        self.assertEqual(self.primary._client.chat.completions.create.call_count, 4)
+        self.assertEqual(self.fallback._client.chat.completions.create.call_count, 2) # 실패한 항목만 재요청
+        self.assertEqual(self.model.tier_counts, {"primary": 2, "fallback": 2})
+
+        save_dir = Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini+gpt-4o"
+        tiers = read_jsonl_file(save_dir / "cascade.jsonl")
+        self.assertEqual([entry["tier"] for entry in tiers], ["primary", "fallback", "fallback", "primary"])
+        self.assertEqual(tiers[1]["model"], "gpt-4o")
+        self.assertIn("count", tiers[1]["reason"])
+        self.assertEqual(len(os.listdir(save_dir / "preds" / "cat")) + len(os.listdir(save_dir / "preds" / "dog")), 4)
+
+    def test_fallback_failure(self):
+        self.primary._client.chat.completions.create.return_value = mock_chatgpt_response('{}')
+        self.fallback._client.chat.completions.create.side_effect = RuntimeError("server error")
+        self.model.run("./data/prompt/prompt.txt", "./data/image", save_path=self.tmp_dir.name)
+        failures = read_jsonl_file(Path(self.tmp_dir.name) / "exp_result_gpt-4o-mini+gpt-4o" / "failures.jsonl")
+        self.assertEqual(len(failures), 4) # 두 모델 모두 실패한 경우 실패 목록에 기록
+
+    def test_load_cascade_model(self):
+        model = load_model('openai::gpt-4o-mini', fallback_model='google::gemini-1.5-pro', schema=self.schema, temperature=0.5)
+        self.assertIsInstance(model, CascadeModel)
+        self.assertIsInstance(model.fallback, GeminiModel)
+        self.assertEqual(model.fallback._kwargs["temperature"], 0.5) # 같은 설정 사용
+        with self.assertRaises(ValueError):
+            load_model('openai::gpt-4o-mini', fallback_model='openai::gpt-4o')
+
+    def test_load_schema(self):
+        self.assertEqual(load_schema(self.schema), self.schema) # 스키마는 그대로 사용
+        self.assertEqual(self.schema["required"], ["answer", "count"])
+        self.assertEqual(self.schema["properties"]["count"], {"type": "integer"})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from openai.types.chat import ChatCompletion
+from logos_pipe_ocr.core.model import ChatGPTModel
+from logos_pipe_ocr.core.runner import MultiModelRunner
+from logos_pipe_ocr.util.datahandlers import ChatGPTImageProcessor, ChatGPTResponseHandler, ImagePreprocessor
+from logos_pipe_ocr.util.file import read_jsonl_file
+from pathlib import Path
+import os
+import tempfile
+
+def mock_chatgpt_model(model_name: str, preprocessor: ImagePreprocessor = None) -> ChatGPTModel: # API 호출 없는 모델
+    model = ChatGPTModel(None, model_name, ChatGPTImageProcessor(preprocessor), ChatGPTResponseHandler(), {})
+    model._client = MagicMock()
+    model._client.chat.completions.create.return_value = ChatCompletion.model_validate({
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": model_name,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f'{{"model": "{model_name}"}}'}}],
+    })
+    return model
+
+class TestMultiModelRunner(unittest.TestCase):
+    def setUp(self):
+        self.prompt_path = "./data/prompt/prompt.txt"
+        self.image_path = "./data/image"
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_run(self):
+        models = [mock_chatgpt_model("gpt-4o-mini"), mock_chatgpt_model("gpt-4o")]
+        responses = MultiModelRunner(models).run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name, max_concurrency=2)
+        self.assertEqual(responses["gpt-4o-mini"]["model"], "gpt-4o-mini")
+        self.assertEqual(responses["gpt-4o"]["model"], "gpt-4o")
+        for model in models:
+            self.assertEqual(model._client.chat.completions.create.call_count, 4) # 모든 모델에 이미지 4개 요청
+            save_dir = Path(self.tmp_dir.name) / f"exp_result_{model._model}" / "preds" # 모델별 저장 경로
+            self.assertTrue(os.path.exists(save_dir / "cat" / "cat001.json"))
+            self.assertTrue(os.path.exists(save_dir / "dog" / "dog002.json"))
+
+    def test_prepare_once_per_config(self):
+        models = [mock_chatgpt_model("gpt-4o-mini"), mock_chatgpt_model("gpt-4o"), mock_chatgpt_model("gpt-4-turbo", ImagePreprocessor(max_side=64))]
+        with patch.object(ImagePreprocessor, "prepare", autospec=True, side_effect=ImagePreprocessor.prepare) as prepare, \
+             patch.object(ChatGPTImageProcessor, "encode_image", autospec=True, side_effect=ChatGPTImageProcessor.encode_image) as encode_image:
+            MultiModelRunner(models).run(self.prompt_path, self.image_path, save_result=False, save_path=self.tmp_dir.name)
+        self.assertEqual(prepare.call_count, 8) # 이미지 4개 x 전처리 설정 2개
+        self.assertEqual(encode_image.call_count, 8)
+        self.assertTrue(all(call.args[2] is not None for call in prepare.call_args_list)) # 읽은 바이트 재사용
+        sent_image = lambda model: model._client.chat.completions.create.call_args.kwargs["messages"][0]["content"][1]["image_url"]["url"]
+        self.assertEqual(sent_image(models[0]), sent_image(models[1]))
+        self.assertNotEqual(sent_image(models[0]), sent_image(models[2])) # 축소된 이미지
+
+    def test_failed_model(self):
+        models = [mock_chatgpt_model("gpt-4o-mini"), mock_chatgpt_model("gpt-4o")]
+        models[1]._client.chat.completions.create.side_effect = RuntimeError("server error")
+        responses = MultiModelRunner(models).run(self.prompt_path, self.image_path, save_path=self.tmp_dir.name)
+        self.assertEqual(responses["gpt-4o-mini"]["model"], "gpt-4o-mini") # 다른 모델은 영향 없음
+        self.assertEqual(responses["gpt-4o"], {})
+        failures = read_jsonl_file(Path(self.tmp_dir.name) / "exp_result_gpt-4o" / "failures.jsonl")
+        self.assertEqual(len(failures), 4)
+
+    def test_duplicate_models(self):
+        with self.assertRaises(ValueError):
+            MultiModelRunner([mock_chatgpt_model("gpt-4o"), mock_chatgpt_model("gpt-4o")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import unittest.mock
+import os
+import time
+import tempfile
+from logos_pipe_ocr.util.cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_make_key(self):
+        key = ResponseCache.make_key(b"image", "prompt", "gpt-4o-mini", {"temperature": 0.1, "seed": 1})
+        self.assertEqual(key, ResponseCache.make_key(b"image", "prompt", "gpt-4o-mini", {"seed": 1, "temperature": 0.1}))  # 설정 순서 무관
+        self.assertNotEqual(key, ResponseCache.make_key(b"image", "prompt", "gpt-4o-mini", {"temperature": 0.2, "seed": 1}))
+        self.assertNotEqual(key, ResponseCache.make_key(b"image2", "prompt", "gpt-4o-mini", {"temperature": 0.1, "seed": 1}))
+
+    def test_put_and_get(self):
+        key = ResponseCache.make_key(b"image", "prompt")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, {"answer": "고양이"})
+        self.assertEqual(self.cache.get(key), {"answer": "고양이"})
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_max_age(self):
+        cache = ResponseCache(self.tmp_dir.name, max_age=60)
+        key = ResponseCache.make_key(b"image")
+        cache.put(key, {"answer": "cat"})
+        entry_path = cache._get_entry_path(key)
+        with open(entry_path, 'w', encoding='utf-8') as f:  # 오래된 항목으로 변경
+            f.write('{"created": %f, "data": {"answer": "cat"}}' % (time.time() - 120))
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(os.path.exists(entry_path))  # 만료된 항목 삭제
+
+    def test_max_age_of_used_entry(self):
+        cache = ResponseCache(self.tmp_dir.name, max_age=60)
+        key = ResponseCache.make_key(b"image")
+        cache.put(key, {"answer": "cat"})
+        entry_path = cache._get_entry_path(key)
+        with open(entry_path, 'w', encoding='utf-8') as f:  # 50초 전에 생성된 항목
+            f.write('{"created": %f, "data": {"answer": "cat"}}' % (time.time() - 50))
+        self.assertIsNotNone(cache.get(key))  # 최근에 사용된 항목
+        cache.max_age = 30
+        cache.evict()
+        self.assertFalse(os.path.exists(entry_path))  # evict도 get과 같은 생성 시각으로 만료 판단
+
+    def test_get_evicted_entry(self):
+        key = ResponseCache.make_key(b"image")
+        self.cache.put(key, {"answer": "cat"})
+        with unittest.mock.patch("os.utime", side_effect=FileNotFoundError):  # 다른 스레드가 get 도중 삭제
+            self.assertIsNone(self.cache.get(key))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+    def test_max_size_eviction(self):
+        cache = ResponseCache(self.tmp_dir.name, max_size=300)
+        keys = [ResponseCache.make_key(str(i)) for i in range(5)]
+        for i, key in enumerate(keys):
+            cache.put(key, {"answer": "x" * 50})
+            os.utime(cache._get_entry_path(key), (i, i))  # 사용 시간 순서 고정
+        self.assertLessEqual(cache._size, 300)
+        self.assertIsNotNone(cache.get(keys[-1]))  # 최근 항목은 유지
+        self.assertIsNone(cache.get(keys[0]))  # 오래된 항목부터 삭제
+
+    def test_eviction_amortized(self):
+        cache = ResponseCache(self.tmp_dir.name, max_size=10000)
+        with unittest.mock.patch.object(cache, "evict", wraps=cache.evict) as evict:
+            for i in range(300):
+                cache.put(ResponseCache.make_key(str(i)), {"answer": "x" * 50})
+        self.assertLessEqual(cache._size, 10000)
+        self.assertLess(evict.call_count, 30)  # 한도의 90%까지 비워 매 put마다 전체 탐색하지 않음
+
+    def test_clear(self):
+        self.cache.put(ResponseCache.make_key("a"), {"answer": "cat"})
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import importlib.util
+import httpx
+from logos_pipe_ocr.util.clients import ClientPool, get_client_pool
+from logos_pipe_ocr.util.retry import RetryPolicy
+
+class TestClientPool(unittest.TestCase):
+    def test_settings(self):
+        pool = ClientPool(max_connections=8, max_keepalive_connections=4, keepalive_expiry=30.0, timeout=20.0, connect_timeout=2.0)
+        http_client = pool.get_http_client()
+        self.assertEqual(pool.limits.max_connections, 8)
+        self.assertEqual(pool.limits.max_keepalive_connections, 4)
+        self.assertEqual((http_client.timeout.read, http_client.timeout.connect), (20.0, 2.0))
+        pool.close()
+
+    def test_default_limits(self):
+        from openai._constants import DEFAULT_CONNECTION_LIMITS
+        pool = ClientPool()
+        self.assertEqual(pool.limits.max_connections, DEFAULT_CONNECTION_LIMITS.max_connections) # OpenAI SDK 기본값과 동일
+        self.assertEqual(pool.limits.max_keepalive_connections, DEFAULT_CONNECTION_LIMITS.max_keepalive_connections)
+
+    def test_shared_clients(self):
+        pool = ClientPool()
+        client = pool.get_openai_client("test-key")
+        self.assertIs(pool.get_openai_client("test-key"), client) # 같은 키는 클라이언트 공유
+        self.assertIsNot(pool.get_openai_client("other-key"), client)
+        self.assertIs(client._client, pool.get_http_client()) # 같은 커넥션 풀 사용
+        pool.close()
+        self.assertIsNot(pool.get_openai_client("test-key"), client) # close 후 다시 생성
+
+    def test_no_sdk_retries(self):
+        requests = []
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(429, json={"error": {"message": "rate limited"}})
+        pool = ClientPool()
+        pool._http_client = httpx.Client(transport=httpx.MockTransport(handler))
+        client = pool.get_openai_client("test-key")
+        policy = RetryPolicy(max_retries=1, base_delay=0)
+        with self.assertRaises(Exception):
+            policy.call(client.chat.completions.create, model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}])
+        self.assertEqual(len(requests), 2) # SDK 재시도 없이 RetryPolicy의 시도만 전송
+        self.assertEqual(policy.retries, 1)
+        pool.close()
+
+    def test_get_client_pool(self):
+        pool = get_client_pool("openai", max_connections=16)
+        self.assertIs(get_client_pool("openai", max_connections=16), pool)
+        self.assertIsNot(get_client_pool("openai", max_connections=32), pool)
+        self.assertIsNot(get_client_pool("google", max_connections=16), pool)
+
+    @unittest.skipIf(importlib.util.find_spec("h2") is not None, "h2 is installed")
+    def test_http2_without_h2(self):
+        with self.assertRaises(ImportError):
+            ClientPool(http2=True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import threading
+import httpx
+from openai import RateLimitError
+from logos_pipe_ocr.util.concurrency import AdaptiveConcurrencyLimiter, get_concurrency_limiter, is_overload
+
+def make_rate_limit_error():
+    response = httpx.Response(429, request=httpx.Request("POST", "http://localhost"))
+    return RateLimitError("rate limited", response=response, body=None)
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+    def fill(self, limiter):
+        # 한도까지 요청을 보내고 시작 시각을 반환
+        return [limiter.acquire() for _ in range(limiter.limit)]
+
+    def test_additive_increase(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=4, window=1000)
+        for _ in range(20):
+            for start_time in self.fill(limiter):
+                limiter.release(start_time)
+        self.assertEqual(limiter.limit, 4) # 최대 한도에서 멈춤
+        self.assertEqual(limiter.peak_limit, 4)
+
+    def test_no_increase_when_unused(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=8, initial_limit=4, window=1000)
+        for _ in range(50):
+            limiter.release(limiter.acquire()) # 한 번에 하나만 사용
+        self.assertEqual(limiter.limit, 4)
+
+    def test_multiplicative_decrease(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=2, max_limit=16, initial_limit=16)
+        start_times = self.fill(limiter)
+        for start_time in start_times: # 같은 시점에 보낸 요청들의 429는 한 번만 반영
+            limiter.release(start_time, make_rate_limit_error())
+        self.assertEqual(limiter.limit, 8)
+        self.assertEqual(limiter.throttles, 16)
+        self.assertEqual(limiter.decreases, 1)
+        for _ in range(5):
+            limiter.release(limiter.acquire(), make_rate_limit_error())
+        self.assertEqual(limiter.limit, 2) # 최소 한도 아래로는 줄지 않음
+
+    def test_other_errors_keep_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8)
+        limiter.release(limiter.acquire(), ValueError("invalid response"))
+        self.assertEqual(limiter.limit, 8)
+
+    def test_rising_latency(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=16, initial_limit=16, window=10)
+        for _ in range(10):
+            limiter.release(limiter.acquire() - 0.1) # 기준 p95 = 0.1초
+        for _ in range(10):
+            limiter.release(limiter.acquire() - 1.0) # p95가 10배로 증가
+        self.assertEqual(limiter.latency_backoffs, 1)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_blocks_at_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=1)
+        start_time = limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.1)) # 한도에 도달하면 대기
+        limiter.release(start_time)
+        self.assertTrue(acquired.wait(1.0))
+        thread.join()
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_slot(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+        with self.assertRaises(RateLimitError):
+            with limiter.slot():
+                raise make_rate_limit_error()
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.get_stats()["throttles"], 1)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            AdaptiveConcurrencyLimiter(min_limit=8, max_limit=4)
+        with self.assertRaises(ValueError):
+            AdaptiveConcurrencyLimiter(backoff=1.0)
+
+    def test_is_overload(self):
+        self.assertTrue(is_overload(make_rate_limit_error()))
+        self.assertTrue(is_overload(TimeoutError()))
+        self.assertFalse(is_overload(ValueError()))
+
+    def test_shared_limiter(self):
+        limiter = get_concurrency_limiter("test::shared", 1, 8)
+        self.assertIs(get_concurrency_limiter("test::shared", 1, 8), limiter)
+        self.assertIsNot(get_concurrency_limiter("test::shared", 1, 16), limiter) # 한도가 바뀌면 새로 생성
+
+if __name__ == '__main__':
+    unittest.main()
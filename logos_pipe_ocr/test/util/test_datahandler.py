@@ -1,8 +1,12 @@
 import unittest
 import os
+import io
 import json
+import base64
+import tempfile
+from PIL import Image
 
-from logos_pipe_ocr.util.datahandlers import EvalDataHandler
+from logos_pipe_ocr.util.datahandlers import EvalDataHandler, ImagePreprocessor, ChatGPTImageProcessor, GeminiImageProcessor
 
 class TestEvalDataHandler(unittest.TestCase):
     def setUp(self):
@@ -59,6 +63,79 @@ class TestEvalDataHandler(unittest.TestCase):
         outputs = self.handler.get_output_data()
         self.assertIsInstance(outputs, list)
         self.assertEqual(outputs, ["This is a test output.", {"key": "output_value"}])
+    def test_stream(self):
+        # 스트리밍 모드는 eval_data 없이 같은 순서로 쌍을 반환
+        handler = EvalDataHandler(self.label_dir, self.output_dir, stream=True, max_workers=2)
+        self.handler()
+        self.assertEqual(list(handler), list(zip(self.handler.get_label_data(), self.handler.get_output_data())))
+        self.assertIsNone(handler.eval_data)
+        self.assertEqual(len(handler), 2)
+
+    def test_stream_read_ahead(self):
+        for index in range(20):
+            with open(os.path.join(self.label_dir, f'page{index:02d}.json'), 'w') as f:
+                json.dump({"index": index}, f)
+            with open(os.path.join(self.output_dir, f'page{index:02d}.json'), 'w') as f:
+                json.dump({"index": index}, f)
+        handler = EvalDataHandler(self.label_dir, self.output_dir, stream=True, max_workers=2, read_ahead=3)
+        submitted = []
+        read_pair = handler._read_pair
+        handler._read_pair = lambda label, output: submitted.append(label) or read_pair(label, output)
+        pairs = iter(handler)
+        next(pairs)
+        self.assertLessEqual(len(submitted), 3) # 미리 읽는 쌍의 수 제한
+        pairs.close()
+
+class TestImagePreprocessor(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.png_path = os.path.join(self.tmp_dir.name, 'scan.png')
+        Image.effect_noise((1600, 1200), 64).convert("RGB").save(self.png_path)  # 스캔 이미지를 흉내낸 큰 PNG
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_passthrough(self):
+        preprocessor = ImagePreprocessor()
+        image_bytes, mime_type = preprocessor.prepare(self.png_path)
+        with open(self.png_path, 'rb') as f:
+            self.assertEqual(image_bytes, f.read())  # 옵션이 없으면 원본 그대로
+        self.assertEqual(mime_type, "image/png")  # 확장자에 맞는 MIME 타입
+        self.assertEqual(preprocessor.bytes_saved, 0)
+
+    def test_resize_and_reencode(self):
+        preprocessor = ImagePreprocessor(max_side=800, image_format="jpeg", quality=70)
+        image_bytes, mime_type = preprocessor.prepare(self.png_path)
+        self.assertEqual(mime_type, "image/jpeg")
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            self.assertEqual(img.format, "JPEG")
+            self.assertEqual(img.size, (800, 600))  # 비율 유지
+        self.assertGreater(preprocessor.bytes_saved, 0)
+        self.assertEqual(preprocessor.bytes_out, len(image_bytes))
+
+    def test_grayscale(self):
+        image_bytes, mime_type = ImagePreprocessor(grayscale=True).prepare(self.png_path)
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            self.assertEqual(img.mode, "L")
+        self.assertEqual(mime_type, "image/png")  # 형식은 유지
+
+    def test_small_image_not_reencoded(self):
+        image_bytes, _ = ImagePreprocessor(max_side=4096).prepare(self.png_path)
+        with open(self.png_path, 'rb') as f:
+            self.assertEqual(image_bytes, f.read())
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            ImagePreprocessor(image_format="bmp")
+
+    def test_image_processors(self):
+        preprocessor = ImagePreprocessor(max_side=800, image_format="WEBP")
+        data_url = ChatGPTImageProcessor(preprocessor).process_image(self.png_path)
+        self.assertTrue(data_url.startswith("data:image/webp;base64,"))
+        base64.b64decode(data_url.split(",", 1)[1])  # 유효한 base64
+        blob = GeminiImageProcessor(preprocessor).process_image(self.png_path)
+        self.assertEqual(blob["mime_type"], "image/webp")
+        self.assertIsInstance(blob["data"], bytes)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
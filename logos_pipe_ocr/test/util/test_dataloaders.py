@@ -1,5 +1,6 @@
 import unittest
 import os
+import tempfile
 from logos_pipe_ocr.util.dataloaders import ImageLoader, PromptLoader, EvalDataLoader, ModelConfigLoader
 
 class TestImageLoader(unittest.TestCase):
@@ -40,6 +41,79 @@ class TestImageLoader(unittest.TestCase):
             ImageLoader(self.empty_image_path)
         os.remove(os.path.join(self.empty_image_path, 'empty_image.png'))  # 빈 이미지 파일 삭제
 
+    def test_stream(self):
+        # 스트리밍 모드는 전체 목록을 미리 만들지 않고 같은 순서로 반환
+        image_loader = ImageLoader(self.valid_image_path, stream=True)
+        self.assertEqual(image_loader._image_file_paths, [])
+        self.assertEqual(list(image_loader), ImageLoader(self.valid_image_path).get_file_path())
+        self.assertEqual(len(image_loader), 4) # 개수는 별도로 계산
+
+    def test_stream_walk_order(self):
+        expected = [os.path.join(root, file) for root, _, files in os.walk(self.valid_image_path) for file in files]
+        self.assertEqual(list(ImageLoader(self.valid_image_path, stream=True)), expected) # os.walk와 같은 순서
+
+    def test_stream_empty_directory(self):
+        image_loader = ImageLoader(self.empty_dir_path, stream=True)
+        with self.assertRaises(FileNotFoundError):
+            list(image_loader)
+
+    def test_include_exclude(self):
+        image_loader = ImageLoader(self.valid_image_path, include=["*001.jpeg"])
+        self.assertEqual(sorted(os.path.basename(path) for path in image_loader), ["cat001.jpeg", "dog001.jpeg"])
+        image_loader = ImageLoader(self.valid_image_path, stream=True, exclude=["dog"]) # 디렉토리 제외
+        self.assertEqual(sorted(os.path.basename(path) for path in image_loader), ["cat001.jpeg", "cat002.jpeg"])
+        image_loader = ImageLoader(self.valid_image_path, include=["cat/*"], exclude=["*002.jpeg"])
+        self.assertEqual([os.path.basename(path) for path in image_loader], ["cat001.jpeg"])
+
+
+class TestManifestImageLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.image_dir = os.path.abspath('./data/image')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_manifest(self, file_name, text):
+        manifest_path = os.path.join(self.tmp_dir.name, file_name)
+        with open(manifest_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return manifest_path
+
+    def test_txt(self):
+        manifest_path = self.write_manifest('images.txt', f"# 처리할 이미지\n{self.image_dir}/dog/dog002.jpeg\n\n{self.image_dir}/cat/cat001.jpeg\n")
+        image_loader = ImageLoader(manifest_path)
+        self.assertEqual(image_loader.get_file_path(), [f"{self.image_dir}/dog/dog002.jpeg", f"{self.image_dir}/cat/cat001.jpeg"]) # 목록 순서 유지
+
+    def test_csv_metadata(self):
+        manifest_path = self.write_manifest('images.csv', f"page,image_path\n3,{self.image_dir}/cat/cat002.jpeg\n")
+        image_loader = ImageLoader(manifest_path, stream=True)
+        self.assertEqual(list(image_loader), [f"{self.image_dir}/cat/cat002.jpeg"])
+        self.assertEqual(image_loader.get_metadata(f"{self.image_dir}/cat/cat002.jpeg"), {"page": "3"})
+
+    def test_jsonl_relative_paths(self):
+        os.makedirs(os.path.join(self.tmp_dir.name, 'pages'))
+        manifest_path = self.write_manifest('images.jsonl', '{"path": "pages/a.png", "doc_id": 7}\n"pages/b.png"\n')
+        image_loader = ImageLoader(manifest_path, exclude=["*/b.png"])
+        image_file_path = os.path.join(self.tmp_dir.name, 'pages/a.png') # 매니페스트 기준 상대 경로
+        self.assertEqual(image_loader.get_file_path(), [image_file_path]) # 존재 여부는 확인하지 않음
+        self.assertEqual(image_loader.get_metadata(image_file_path), {"doc_id": 7})
+
+    def test_manifest_path(self):
+        manifest_path = self.write_manifest('images.txt', f"a/scan/p1.png\n{self.image_dir}/cat/cat001.jpeg\n")
+        image_loader = ImageLoader(manifest_path)
+        self.assertEqual(image_loader.get_manifest_path(os.path.join(self.tmp_dir.name, 'a/scan/p1.png')), os.path.join('a', 'scan', 'p1.png'))
+        self.assertIsNone(image_loader.get_manifest_path(f"{self.image_dir}/cat/cat001.jpeg")) # 매니페스트 디렉토리 밖의 경로
+        self.assertIsNone(ImageLoader(self.image_dir).get_manifest_path(f"{self.image_dir}/cat/cat001.jpeg"))
+
+    def test_invalid_manifest(self):
+        with self.assertRaises(FileNotFoundError):
+            ImageLoader(self.write_manifest('empty.txt', ''))
+        with self.assertRaises(FileNotFoundError):
+            ImageLoader(self.write_manifest('comments.txt', '# 없음\n'))
+        with self.assertRaises(ValueError):
+            ImageLoader(self.write_manifest('images.jsonl', '{"doc_id": 7}\n'))
+
 
 class TestPromptLoader(unittest.TestCase):
     def setUp(self):
@@ -119,6 +193,53 @@ class TestEvalDataLoader(unittest.TestCase):
         self.assertEqual(len(label_paths), len(output_paths))  # 레이블 파일과 출력 파일이 쌍으로 존재해야 함
         self.assertIn(os.path.join(self.label_dir, 'label1.json'), label_paths)
         self.assertIn(os.path.join(self.output_dir, 'label1.json'), output_paths)
+    def test_unmatched(self):
+        loader = EvalDataLoader(self.label_dir, self.output_dir)
+        self.assertEqual(loader.get_unmatched(), {"labels": [os.path.join(self.label_dir, 'label2.json')], "outputs": []})
+
+class TestEvalDataLoaderPairing(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.label_dir = os.path.join(self.tmp_dir.name, 'label')
+        self.output_dir = os.path.join(self.tmp_dir.name, 'preds')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_files(self, dir_path, relative_paths):
+        for relative_path in relative_paths:
+            os.makedirs(os.path.dirname(os.path.join(dir_path, relative_path)), exist_ok=True)
+            with open(os.path.join(dir_path, relative_path), 'w') as f:
+                f.write('{}')
+
+    def test_same_name_in_subdirectories(self):
+        # 하위 디렉토리가 다르면 파일 이름이 같아도 상대 경로로 짝지음
+        self.create_files(self.label_dir, ['cat/001.json', 'dog/001.json'])
+        self.create_files(self.output_dir, ['dog/001.json', 'cat/001.json'])
+        loader = EvalDataLoader(self.label_dir, self.output_dir)
+        for label_path, output_path in loader:
+            self.assertEqual(os.path.relpath(label_path, self.label_dir), os.path.relpath(output_path, self.output_dir))
+        self.assertEqual(len(loader), 2)
+
+    def test_basename_fallback(self):
+        self.create_files(self.label_dir, ['cat/cat001.json', 'dog/dog001.json', 'a/001.json', 'b/001.json'])
+        self.create_files(self.output_dir, ['cat001.json', 'dog001.json', '001.json', 'extra.json'])
+        loader = EvalDataLoader(self.label_dir, self.output_dir)
+        pairs = {os.path.basename(label_path): output_path for label_path, output_path in loader}
+        self.assertEqual(pairs, {'cat001.json': os.path.join(self.output_dir, 'cat001.json'),
+                                 'dog001.json': os.path.join(self.output_dir, 'dog001.json')})
+        unmatched = loader.get_unmatched()
+        self.assertEqual(sorted(unmatched["labels"]), sorted([os.path.join(self.label_dir, 'a/001.json'), os.path.join(self.label_dir, 'b/001.json')])) # 모호한 이름은 짝짓지 않음
+        self.assertEqual(sorted(unmatched["outputs"]), sorted([os.path.join(self.output_dir, '001.json'), os.path.join(self.output_dir, 'extra.json')]))
+
+    def test_label_order(self):
+        self.create_files(self.label_dir, [f'{index:03d}.json' for index in range(50)])
+        self.create_files(self.output_dir, [f'{index:03d}.json' for index in range(50)])
+        loader = EvalDataLoader(self.label_dir, self.output_dir)
+        expected = [os.path.join(root, f) for root, _, files in os.walk(self.label_dir) for f in files]
+        self.assertEqual(loader.get_label_file_paths(), expected) # 레이블 순서 유지
+        self.assertEqual([os.path.basename(path) for path in loader.get_output_file_paths()], [os.path.basename(path) for path in expected])
+
 
 class TestModelConfigLoader(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,49 @@
+import unittest
+import os
+import shutil
+import tempfile
+from PIL import Image
+from logos_pipe_ocr.util.dedup import ImageDeduplicator, get_dhash
+
+class TestImageDeduplicator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cat = os.path.join(self.tmp_dir.name, "cat001.jpeg")
+        self.cat_copy = os.path.join(self.tmp_dir.name, "cat001_copy.jpeg")
+        self.cat_rescan = os.path.join(self.tmp_dir.name, "cat001_rescan.jpeg")
+        self.dog = os.path.join(self.tmp_dir.name, "dog001.jpeg")
+        shutil.copy("./data/image/cat/cat001.jpeg", self.cat)
+        shutil.copy("./data/image/cat/cat001.jpeg", self.cat_copy) # 재업로드
+        shutil.copy("./data/image/dog/dog001.jpeg", self.dog)
+        with Image.open(self.cat) as img: # 같은 페이지를 다시 스캔한 경우 (크기, 압축률 변경)
+            img.resize((img.width // 2, img.height // 2)).save(self.cat_rescan, quality=60)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_exact(self):
+        deduplicator = ImageDeduplicator("exact")
+        representatives = list(deduplicator.filter([self.cat, self.cat_copy, self.cat_rescan, self.dog]))
+        self.assertEqual(representatives, [self.cat, self.cat_rescan, self.dog]) # 내용이 다르면 별도 전송
+        self.assertEqual(deduplicator.duplicates, {self.cat: [self.cat_copy]})
+        self.assertEqual(deduplicator.ratio, 0.25)
+
+    def test_perceptual(self):
+        deduplicator = ImageDeduplicator("perceptual", threshold=5)
+        representatives = list(deduplicator.filter([self.cat, self.cat_copy, self.cat_rescan, self.dog]))
+        self.assertEqual(representatives, [self.cat, self.dog])
+        self.assertEqual(deduplicator.get_duplicates(self.cat), [self.cat_copy, self.cat_rescan])
+        self.assertIn("2 of 4 images", str(deduplicator))
+
+    def test_dhash(self):
+        self.assertLessEqual(bin(get_dhash(self.cat) ^ get_dhash(self.cat_rescan)).count("1"), 5)
+        self.assertGreater(bin(get_dhash(self.cat) ^ get_dhash(self.dog)).count("1"), 5)
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            ImageDeduplicator("fuzzy")
+        with self.assertRaises(ValueError):
+            ImageDeduplicator("perceptual", threshold=64)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,11 @@
 ﻿import unittest
-from logos_pipe_ocr.util.file import create_txt_file, create_json_file, read_json_file, read_txt_file, increment_path
+from logos_pipe_ocr.util.file import create_txt_file, create_json_file, read_json_file, read_txt_file, increment_path, latest_path
+from logos_pipe_ocr.util.file import append_jsonl_file, read_jsonl_file
+from logos_pipe_ocr.util.file import JSON_BACKENDS, configure_json, json_dumps, json_loads
 import os
 import json
+import math
+import importlib.util
 
 class TestFileFunctions(unittest.TestCase):
 
@@ -49,9 +53,83 @@ class TestFileFunctions(unittest.TestCase):
         result_list = read_txt_file(os.path.join(self.test_dir, "dict_list_test.txt"))
         self.assertEqual(result_list, str(dict_list))
 
+    def test_read_jsonl_file_invalid_line(self):
+        file_path = os.path.join(self.test_dir, "test.jsonl")
+        append_jsonl_file({"key": 1}, file_path)
+        with open(file_path, 'a', encoding='utf-8') as f:
+            f.write('{"key": 2, "val\n')  # 쓰는 도중 중단된 줄
+        append_jsonl_file({"key": 3}, file_path)
+        invalid_lines = []
+        self.assertEqual(read_jsonl_file(file_path, invalid_lines), [{"key": 1}, {"key": 3}])  # 잘못된 줄만 건너뜀
+        self.assertEqual([line_number for line_number, _ in invalid_lines], [2])
+
     def test_increment_path(self):
         path = increment_path(os.path.join(self.test_dir, "test.txt"))
         self.assertTrue(path.name.startswith("test.txt"))
 
+    def test_latest_path(self):
+        self.assertIsNone(latest_path(os.path.join(self.test_dir, "exp")))  # 실행 디렉토리가 없는 경우
+        for name in ["exp", "exp2", "exp3"]:
+            open(os.path.join(self.test_dir, name), 'w').close()
+        self.assertEqual(latest_path(os.path.join(self.test_dir, "exp")).name, "exp3")
+
+    def test_create_json_file_no_temp_file(self):
+        create_json_file({"key": "값"}, self.test_dir, "test")
+        self.assertEqual(os.listdir(self.test_dir), ["test.json"])  # 임시 파일이 남지 않아야 함
+
+class TestJsonCodec(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = 'test_json_dir'
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.data = {"file_name": "cat001.jpeg", "text": "안녕하세요 / 세계", "score": 0.5, "items": [1, None, True]}
+
+    def tearDown(self):
+        configure_json(compact=False)
+        configure_json()
+        for file in os.listdir(self.test_dir):
+            os.remove(os.path.join(self.test_dir, file))
+        os.rmdir(self.test_dir)
+
+    def installed_backends(self):
+        return [backend for backend in JSON_BACKENDS if importlib.util.find_spec(backend) is not None]
+
+    def test_indented_output_identical(self):
+        # 어떤 백엔드를 써도 기존과 같은 바이트로 저장
+        expected = b'\xef\xbb\xbf' + json.dumps(self.data, ensure_ascii=False, indent=4).encode('utf-8')
+        for backend in self.installed_backends():
+            configure_json(backend)
+            create_json_file(self.data, self.test_dir, "test")
+            with open(os.path.join(self.test_dir, "test.json"), 'rb') as f:
+                self.assertEqual(f.read(), expected, backend)
+
+    def test_compact_roundtrip(self):
+        for backend in self.installed_backends():
+            configure_json(backend)
+            create_json_file(self.data, self.test_dir, "test", compact=True)
+            with open(os.path.join(self.test_dir, "test.json"), 'r', encoding='utf-8-sig') as f:
+                content = f.read()
+            self.assertNotIn("\n", content)
+            self.assertIn("안녕하세요", content) # 한글은 이스케이프하지 않음
+            self.assertEqual(read_json_file(os.path.join(self.test_dir, "test.json")), self.data, backend)
+
+    def test_compact_default(self):
+        configure_json(compact=True)
+        create_json_file(self.data, self.test_dir, "test")
+        with open(os.path.join(self.test_dir, "test.json"), 'r', encoding='utf-8-sig') as f:
+            self.assertEqual(f.read().count("\n"), 0)
+
+    def test_stdlib_fallback(self):
+        for backend in self.installed_backends():
+            configure_json(backend)
+            self.assertTrue(math.isnan(json_loads('{"score": NaN}')["score"])) # 표준 라이브러리만 지원하는 값
+            self.assertEqual(json_loads(b'\xef\xbb\xbf{"key": 1}'), {"key": 1}) # BOM 제거
+            self.assertEqual(json_dumps({1: "a"}, compact=True), '{"1":"a"}')
+            with self.assertRaises(json.JSONDecodeError):
+                json_loads("{invalid")
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            configure_json("simplejson")
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,112 @@
+import unittest
+import threading
+import time
+from logos_pipe_ocr.util.hedging import RequestHedger
+
+class TestRequestHedger(unittest.TestCase):
+    def warm_up(self, hedger, latency=0.01):
+        for _ in range(hedger.min_samples):
+            hedger.call(time.sleep, latency)
+        hedger.reset_stats()
+
+    def test_no_hedge_while_warming_up(self):
+        hedger = RequestHedger(percentile=50, budget=1.0, min_samples=5)
+        self.assertIsNone(hedger.get_delay())
+        self.assertEqual(hedger.call(lambda value: value, 1), 1)
+        self.assertEqual(hedger.hedges, 0)
+
+    def test_hedge_wins(self):
+        hedger = RequestHedger(percentile=95, budget=1.0, min_samples=5)
+        self.warm_up(hedger)
+        attempts = []
+        def stall_first(value):
+            attempts.append(value)
+            if len(attempts) == 1:
+                time.sleep(0.5) # 첫 호출만 지연
+                return "slow"
+            return "fast"
+        start_time = time.monotonic()
+        self.assertEqual(hedger.call(stall_first, 1), "fast")
+        self.assertLess(time.monotonic() - start_time, 0.4) # 지연된 호출을 기다리지 않음
+        self.assertEqual((hedger.hedges, hedger.hedge_wins), (1, 1))
+
+    def test_discarded_response(self):
+        hedger = RequestHedger(percentile=95, budget=1.0, min_samples=5)
+        self.warm_up(hedger)
+        discarded = threading.Event()
+        attempts = []
+        def stall_first():
+            attempts.append(None)
+            if len(attempts) == 1:
+                time.sleep(0.2)
+                return "slow"
+            return "fast"
+        hedger.call(stall_first, on_discarded=lambda response: response == "slow" and discarded.set())
+        self.assertTrue(discarded.wait(1.0)) # 버려진 응답도 전달됨 (비용 집계용)
+
+    def test_budget(self):
+        hedger = RequestHedger(percentile=50, budget=0.0, min_samples=5)
+        self.warm_up(hedger)
+        self.assertEqual(hedger.call(time.sleep, 0.1), None)
+        self.assertEqual((hedger.hedges, hedger.budget_skips), (0, 1))
+
+    def test_no_free_thread(self):
+        hedger = RequestHedger(percentile=50, budget=1.0, min_samples=5, max_workers=1)
+        self.warm_up(hedger)
+        hedger.call(time.sleep, 0.1) # 중복 요청이 대기열에서 기다리게 되면 보내지 않음
+        self.assertEqual((hedger.hedges, hedger.budget_skips), (0, 1))
+
+    def test_delay_from_start(self):
+        hedger = RequestHedger(percentile=50, budget=1.0, min_samples=5, max_workers=1)
+        self.warm_up(hedger)
+        hedger._get_executor().submit(time.sleep, 0.2) # 스레드를 점유
+        self.assertEqual(hedger.call(lambda: "fast"), "fast")
+        self.assertEqual((hedger.hedges, hedger.budget_skips), (0, 0)) # 대기열에서 기다린 시간은 지연이 아님
+
+    def test_on_hedge_refused(self):
+        hedger = RequestHedger(percentile=50, budget=1.0, min_samples=5)
+        self.warm_up(hedger)
+        hedger.call(time.sleep, 0.1, on_hedge=lambda: False) # 예: 요청 한도에 여유가 없음
+        self.assertEqual((hedger.hedges, hedger.budget_skips), (0, 1))
+
+    def test_first_error_waits_for_other(self):
+        hedger = RequestHedger(percentile=95, budget=1.0, min_samples=5)
+        self.warm_up(hedger)
+        attempts = []
+        def fail_hedge():
+            attempts.append(None)
+            if len(attempts) == 1:
+                time.sleep(0.2)
+                return "primary"
+            raise ConnectionError("reset")
+        self.assertEqual(hedger.call(fail_hedge), "primary") # 중복 요청이 실패하면 원래 요청의 응답 사용
+
+    def test_both_fail(self):
+        hedger = RequestHedger(percentile=95, budget=1.0, min_samples=5)
+        self.warm_up(hedger)
+        def fail_slowly():
+            time.sleep(0.1)
+            raise ConnectionError("reset")
+        with self.assertRaises(ConnectionError):
+            hedger.call(fail_slowly)
+        self.assertEqual(hedger.hedges, 1)
+
+    def test_close(self):
+        hedger = RequestHedger(percentile=95, budget=1.0, min_samples=5)
+        self.warm_up(hedger)
+        hedger.call(time.sleep, 0.01) # 스레드 풀 생성
+        executor = hedger._executor
+        hedger.close()
+        self.assertIsNone(hedger._executor)
+        self.assertTrue(executor._shutdown)
+        self.assertEqual(hedger.call(lambda value: value, 1), 1) # close 후에도 다시 사용 가능
+        hedger.close()
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            RequestHedger(percentile=100)
+        with self.assertRaises(ValueError):
+            RequestHedger(budget=-0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import json
+import tempfile
+from logos_pipe_ocr.util.metrics import RunMetrics, get_percentile, get_prices, estimate_cost
+from logos_pipe_ocr.util.file import read_jsonl_file
+
+class TestRunMetrics(unittest.TestCase):
+    def test_summary(self):
+        metrics = RunMetrics()
+        for index in range(100):
+            metrics.record_timing(f"image{index}.png", {"request": index + 1.0, "total": index + 1.0})
+        summary = metrics.get_summary()
+        self.assertEqual(summary["images"], 100)
+        self.assertAlmostEqual(summary["timing"]["request"]["p50"], 50.5)
+        self.assertAlmostEqual(summary["timing"]["request"]["p99"], 99.01)
+        self.assertNotIn("read", summary["timing"]) # 기록되지 않은 단계는 제외
+
+    def test_usage_and_cost(self):
+        metrics = RunMetrics()
+        metrics.record_usage("image.png", {"prompt_tokens": 100, "completion_tokens": 10}, 0.5)
+        metrics.record_usage("image.png", {"prompt_tokens": 200, "completion_tokens": 20}, 1.0) # cascade: 같은 이미지의 두 번째 요청
+        summary = metrics.get_summary()
+        self.assertEqual(summary["tokens"]["prompt_tokens"], 300)
+        self.assertEqual(summary["cost"], 1.5)
+        metrics.record_usage("other.png", {"prompt_tokens": 100}, None)
+        self.assertIsNone(metrics.get_summary()["cost"]) # 가격을 모르는 요청이 있으면 비용 미상
+
+    def test_save(self):
+        metrics = RunMetrics()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metrics.open(tmp_dir)
+            metrics.record_timing("image.png", {"read": 0.1, "total": 0.1})
+            records = read_jsonl_file(metrics.records_path) # 완료된 이미지는 바로 기록
+            metrics.record_usage("late.png", {"prompt_tokens": 10}, 0.1) # 완료 후 도착한 응답
+            metrics_path = metrics.save(tmp_dir)
+            with open(metrics_path, encoding="utf-8-sig") as file:
+                data = json.load(file)
+            self.assertEqual(len(read_jsonl_file(metrics.records_path)), 2)
+            metrics.reset()
+            self.assertEqual(metrics.save(tmp_dir).name, "metrics.2.json") # 같은 디렉토리의 다음 실행
+        self.assertEqual(metrics_path.name, "metrics.json")
+        self.assertEqual(records[0]["image_path"], "image.png")
+        self.assertEqual(data["summary"]["images"], 1)
+        self.assertEqual(data["summary"]["tokens"]["prompt_tokens"], 10)
+
+class TestPrices(unittest.TestCase):
+    def test_get_percentile(self):
+        self.assertEqual(get_percentile([1.0], 95), 1.0)
+        self.assertEqual(get_percentile([1.0, 2.0, 3.0], 50), 2.0)
+
+    def test_get_prices(self):
+        self.assertEqual(get_prices("gpt-4o-mini-2024-07-18")["input"], 0.15) # 가장 긴 접두사
+        self.assertEqual(get_prices("gpt-4o-2024-08-06")["input"], 2.50)
+        self.assertIsNone(get_prices("unknown-model"))
+
+    def test_estimate_cost(self):
+        prices = {"input": 1.0, "cached_input": 0.5, "output": 2.0}
+        usage = {"prompt_tokens": 1_000_000, "cached_tokens": 500_000, "completion_tokens": 1_000_000}
+        self.assertAlmostEqual(estimate_cost(usage, prices), 0.5 + 0.25 + 2.0)
+        self.assertIsNone(estimate_cost(usage, None))
+
+if __name__ == "__main__":
+    unittest.main()
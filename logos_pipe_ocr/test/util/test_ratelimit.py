@@ -0,0 +1,58 @@
+import unittest
+from logos_pipe_ocr.util.ratelimit import TokenBucket, RateLimiter, get_rate_limiter, estimate_text_tokens
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve_within_capacity(self):
+        bucket = TokenBucket(60, capacity=2)  # 초당 1개 충전
+        now = bucket._updated
+        self.assertEqual(bucket.reserve(1, now), 0.0)
+        self.assertEqual(bucket.reserve(1, now), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1, now), 1.0)  # 용량 초과 시 1초 대기
+
+    def test_refill(self):
+        bucket = TokenBucket(60, capacity=1)
+        now = bucket._updated
+        bucket.reserve(1, now)
+        self.assertEqual(bucket.reserve(1, now + 1.0), 0.0)  # 1초 후 다시 사용 가능
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+class TestRateLimiter(unittest.TestCase):
+    def test_reserve_tokens(self):
+        limiter = RateLimiter(rpm=1000, tpm=600)  # 초당 10 토큰
+        self.assertEqual(limiter.reserve(600), 0.0)
+        self.assertAlmostEqual(limiter.reserve(10), 1.0, places=1)  # 토큰 한도 초과 시 대기
+
+    def test_reconcile(self):
+        limiter = RateLimiter(tpm=600)
+        limiter.reserve(600)
+        limiter.reconcile(estimated_tokens=600, actual_tokens=100)  # 실제 사용량만큼 예산 반환
+        self.assertEqual(limiter.reserve(400), 0.0)
+
+    def test_try_acquire(self):
+        limiter = RateLimiter(rpm=1, tpm=600)
+        self.assertTrue(limiter.try_acquire(100))
+        self.assertFalse(limiter.try_acquire(100)) # 대기 없이 예약할 수 없으면 예산을 건드리지 않음
+        limiter.release(100) # 보내지 않은 요청의 예약 반환
+        self.assertTrue(limiter.try_acquire(500))
+
+    def test_unlimited(self):
+        limiter = RateLimiter()
+        self.assertEqual(limiter.reserve(10 ** 9), 0.0)
+
+class TestGetRateLimiter(unittest.TestCase):
+    def test_shared_per_key(self):
+        limiter = get_rate_limiter("test::shared-model", rpm=100)
+        self.assertIs(get_rate_limiter("test::shared-model"), limiter)  # 같은 모델은 같은 예산 공유
+        self.assertIsNot(get_rate_limiter("test::other-model", rpm=100), limiter)
+
+    def test_no_quota(self):
+        self.assertIsNone(get_rate_limiter("test::no-quota-model"))
+
+    def test_estimate_text_tokens(self):
+        self.assertGreater(estimate_text_tokens("문서의 내용을 JSON으로 추출하세요."), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import MagicMock
+from logos_pipe_ocr.util.retry import RetryPolicy, is_retryable, get_retry_after
+
+class StatusError(Exception):  # status_code를 가진 provider 에러 모의 객체
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = MagicMock(headers=headers or {})
+
+class APITimeoutError(Exception):
+    pass
+
+class TestErrorClassification(unittest.TestCase):
+    def test_retryable_errors(self):
+        self.assertTrue(is_retryable(StatusError(429)))
+        self.assertTrue(is_retryable(StatusError(503)))
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertTrue(is_retryable(APITimeoutError()))
+
+    def test_fatal_errors(self):
+        self.assertFalse(is_retryable(StatusError(400)))
+        self.assertFalse(is_retryable(StatusError(401)))
+        self.assertFalse(is_retryable(ValueError("invalid json")))
+
+    def test_retry_after(self):
+        self.assertEqual(get_retry_after(StatusError(429, {"retry-after": "3"})), 3.0)
+        self.assertEqual(get_retry_after(StatusError(429, {"retry-after-ms": "1500"})), 1.5)
+        self.assertIsNone(get_retry_after(StatusError(429)))
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_retry_until_success(self):
+        policy = RetryPolicy(max_retries=3, base_delay=0)
+        func = MagicMock(side_effect=[StatusError(503), StatusError(429), "ok"])
+        self.assertEqual(policy.call(func), "ok")
+        self.assertEqual(policy.retries, 2)
+        self.assertEqual(policy.give_ups, 0)
+
+    def test_give_up(self):
+        policy = RetryPolicy(max_retries=2, base_delay=0)
+        func = MagicMock(side_effect=StatusError(500))
+        with self.assertRaises(StatusError):
+            policy.call(func)
+        self.assertEqual(func.call_count, 3)  # 최초 1회 + 재시도 2회
+        self.assertEqual(policy.give_ups, 1)
+
+    def test_fatal_error_not_retried(self):
+        policy = RetryPolicy(max_retries=5, base_delay=0)
+        func = MagicMock(side_effect=StatusError(400))
+        with self.assertRaises(StatusError):
+            policy.call(func)
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(policy.fatal_errors, 1)
+
+    def test_backoff_delay(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=10.0, jitter=False)
+        self.assertEqual([policy.get_delay(attempt) for attempt in range(5)], [1.0, 2.0, 4.0, 8.0, 10.0])  # 최대 지연 제한
+        jitter_policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+        self.assertLessEqual(jitter_policy.get_delay(3), 8.0)
+        self.assertEqual(policy.get_delay(0, StatusError(429, {"retry-after": "7"})), 7.0)  # Retry-After 우선
+        self.assertEqual(policy.get_delay(0, StatusError(429, {"retry-after": "86400"})), 10.0)  # Retry-After도 max_delay로 제한
+
+if __name__ == '__main__':
+    unittest.main()
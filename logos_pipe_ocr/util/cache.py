@@ -0,0 +1,151 @@
+﻿"""
+This module contains the response cache class for the Logos-pipe-ocr project.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from logos_pipe_ocr.util.file import json_dumps, json_loads
+
+CACHE_EXTENSION = ".json"
+EVICTION_TARGET = 0.9 # share of max_size an eviction frees the cache down to, so the full scans are amortized over many puts
+ENCODING_FORMAT = "utf-8"
+
+class ResponseCache:
+    """ ResponseCache class for storing serialized provider responses on disk, keyed by content hash.
+
+    Args:
+        cache_dir (str): Directory of the cache entries.
+        max_size (int): Maximum total size of the entries in bytes (None = unlimited).
+            The least recently used entries are evicted first, down to 90% of max_size.
+        max_age (float): Maximum age of an entry in seconds (None = unlimited).
+            The modification time of an entry file is its creation time and its access time the last use.
+
+    Attributes:
+        hits (int): Number of cache hits.
+        misses (int): Number of cache misses.
+    """
+    def __init__(self, cache_dir: str, max_size: int = None, max_age: float = None) -> None:
+        self._cache_dir = Path(cache_dir)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._size = sum(entry.stat().st_size for entry in self._iter_entries())
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self) -> str:
+        return f"Cache hits: {self.hits}, misses: {self.misses}"
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._iter_entries())
+
+    @staticmethod
+    def make_key(*parts: bytes | str | dict) -> str:
+        """Return the sha256 hex digest of the given parts (bytes, text or JSON-serializable config)."""
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, dict):
+                part = json.dumps(part, sort_keys=True, ensure_ascii=False, default=str)
+            if isinstance(part, str):
+                part = part.encode(ENCODING_FORMAT)
+            digest.update(hashlib.sha256(part).digest()) # hash each part first, so part boundaries are unambiguous
+        return digest.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached data of the key, or None if there is no fresh entry."""
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, 'rb') as file:
+                entry = json_loads(file.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._count_miss()
+            return None
+
+        if self.max_age is not None and time.time() - entry["created"] > self.max_age:
+            self._remove(entry_path)
+            self._count_miss()
+            return None
+
+        try:
+            os.utime(entry_path, (time.time(), entry["created"])) # mark as recently used, keep the age
+        except FileNotFoundError: # evicted by another thread
+            self._count_miss()
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry["data"]
+
+    def put(self, key: str, data: dict) -> None:
+        """Store the data under the key and evict old entries if the cache is too large."""
+        entry_path = self._get_entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        created = time.time()
+        content = json_dumps({"created": created, "data": data}, compact=True).encode(ENCODING_FORMAT)
+
+        temp_path = entry_path.with_name(f"{entry_path.name}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'wb') as file:
+            file.write(content)
+        os.utime(temp_path, (created, created))
+        previous_size = entry_path.stat().st_size if entry_path.exists() else 0
+        os.replace(temp_path, entry_path) # atomic, concurrent readers never see a partial entry
+
+        with self._lock:
+            self._size += len(content) - previous_size
+        if self.max_size is not None and self._size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove expired entries, then the least recently used entries until the cache fits in 90% of max_size."""
+        with self._lock:
+            entries = []
+            for entry in self._iter_entries():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_mtime, stat.st_size, entry.path))
+            entries.sort() # least recently used first
+            self._size = sum(size for _, _, size, _ in entries)
+            target_size = self.max_size * EVICTION_TARGET if self.max_size is not None else None
+            now = time.time()
+            for _, created, size, path in entries:
+                expired = self.max_age is not None and now - created > self.max_age
+                if not expired and (target_size is None or self._size <= target_size):
+                    continue # an expired entry may have been used more recently
+                try:
+                    os.remove(path)
+                    self._size -= size
+                except FileNotFoundError:
+                    pass
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for entry in self._iter_entries():
+                os.remove(entry.path)
+            self._size = 0
+
+    def _get_entry_path(self, key: str) -> Path:
+        return self._cache_dir / key[:2] / f"{key}{CACHE_EXTENSION}" # shard by the first 2 hex digits
+
+    def _iter_entries(self):
+        for shard in os.scandir(self._cache_dir):
+            if shard.is_dir():
+                yield from (entry for entry in os.scandir(shard.path) if entry.name.endswith(CACHE_EXTENSION))
+
+    def _remove(self, entry_path: Path) -> None:
+        try:
+            size = entry_path.stat().st_size
+            os.remove(entry_path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def _count_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
@@ -0,0 +1,115 @@
+﻿"""
+This module contains the shared HTTP client pool class for the Logos-pipe-ocr project.
+"""
+import importlib.util
+import threading
+import httpx
+
+DEFAULT_MAX_CONNECTIONS = 1000 # OpenAI SDK defaults (openai._constants.DEFAULT_CONNECTION_LIMITS)
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 100
+DEFAULT_KEEPALIVE_EXPIRY = 5.0
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+class ClientPool:
+    """ ClientPool class for sharing keep-alive connections between every model of the same provider.
+
+    The HTTP and SDK clients are created lazily on first use and are thread-safe.
+
+    Args:
+        max_connections (int): Maximum number of open connections.
+        max_keepalive_connections (int): Maximum number of idle connections kept alive.
+        keepalive_expiry (float): Seconds an idle connection is kept alive.
+        timeout (float): Read, write and pool timeout of a request in seconds.
+        connect_timeout (float): Timeout of establishing a connection in seconds.
+        http2 (bool): Whether to use HTTP/2 (requires the h2 package).
+    """
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS, max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY, timeout: float = DEFAULT_TIMEOUT,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, http2: bool = False) -> None:
+        if http2 and importlib.util.find_spec("h2") is None:
+            raise ImportError("http2 requires the h2 package, please install it with `pip install httpx[http2]`.")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2
+        self._lock = threading.Lock()
+        self._http_client = None
+        self._sdk_clients = {} # (name, api_key) -> SDK client
+
+    def __str__(self) -> str:
+        return f"ClientPool(max_connections={self.limits.max_connections}, http2={self.http2})"
+
+    def get_http_client(self) -> httpx.Client:
+        """Return the shared httpx client."""
+        with self._lock:
+            if self._http_client is None or self._http_client.is_closed:
+                self._http_client = httpx.Client(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            return self._http_client
+
+    def get_openai_client(self, api_key: str):
+        """Return the OpenAI client of the api key, sending its requests over the shared connections."""
+        from openai import OpenAI # imported on first use, like the providers of load_model
+        # max_retries=0: RetryPolicy is the only retry layer, so every attempt goes through the rate limiter and is counted
+        return self._get_sdk_client("openai", api_key, lambda: OpenAI(api_key=api_key, http_client=self.get_http_client(), timeout=self.timeout,
+                                                                      max_retries=0))
+
+    def close(self) -> None:
+        """Close the connections and forget the SDK clients."""
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._http_client = None
+            self._sdk_clients.clear()
+
+    def _get_sdk_client(self, name: str, api_key: str, create_client) -> any:
+        key = (name, api_key)
+        client = self._sdk_clients.get(key)
+        if client is None:
+            client = create_client() # outside of the lock, since it calls get_http_client
+            with self._lock:
+                client = self._sdk_clients.setdefault(key, client)
+        return client
+
+"""
+Helper functions
+"""
+
+_client_pools = {}
+_client_pools_lock = threading.Lock()
+_gemini_api_key = None
+_gemini_lock = threading.Lock()
+
+def get_client_pool(key: str, **settings) -> ClientPool:
+    """Return the client pool shared by every model with the same key (e.g., 'openai') and settings.
+
+    Args:
+        key (str): Provider of the models.
+        **settings: Arguments of ClientPool.
+    """
+    pool_key = (key, tuple(sorted(settings.items())))
+    with _client_pools_lock:
+        client_pool = _client_pools.get(pool_key)
+        if client_pool is None:
+            client_pool = ClientPool(**settings)
+            _client_pools[pool_key] = client_pool
+        return client_pool
+
+def close_client_pools() -> None:
+    """Close every shared client pool."""
+    with _client_pools_lock:
+        for client_pool in _client_pools.values():
+            client_pool.close()
+        _client_pools.clear()
+
+def configure_gemini(api_key: str) -> None:
+    """Configure the process-global Gemini client once per api key, so models do not rebuild it concurrently."""
+    global _gemini_api_key
+    with _gemini_lock:
+        if _gemini_api_key != api_key:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            _gemini_api_key = api_key
@@ -0,0 +1,161 @@
+﻿"""
+This module contains the adaptive concurrency limiter class for the Logos-pipe-ocr project.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from logos_pipe_ocr.util.metrics import get_percentile
+from logos_pipe_ocr.util.retry import get_status_code
+
+OVERLOAD_STATUS_CODES = {429, 503} # the provider asks to slow down
+TIMEOUT_ERROR_NAMES = {"APITimeoutError", "TimeoutException", "ReadTimeout", "DeadlineExceeded"}
+BASELINE_DRIFT = 0.1 # share of a slower window p95 the baseline moves towards, so a lasting slowdown is accepted
+
+class AdaptiveConcurrencyLimiter:
+    """ AdaptiveConcurrencyLimiter class for finding the number of requests in flight the provider can actually serve.
+
+    The limit grows additively (about +1 per limit completed requests) while the requests succeed and their latency
+    stays flat, and is cut multiplicatively on a 429/503, a timeout, or a window p95 above latency_tolerance times
+    the baseline p95 (AIMD). Only requests sent after the last cut can cut it again, so a burst of errors from the
+    same wave counts once.
+
+    Args:
+        min_limit (int): Lowest limit.
+        max_limit (int): Highest limit.
+        initial_limit (int): Limit of the first requests (default: min_limit).
+        backoff (float): Factor applied to the limit on a cut (0-1).
+        latency_tolerance (float): Ratio of the window p95 to the baseline p95 considered as a rising latency.
+        window (int): Number of successful requests per p95 sample.
+
+    Attributes:
+        peak_limit (int): Highest limit reached.
+        decreases (int): Number of cuts.
+        throttles (int): Number of requests that failed with a 429/503 or a timeout.
+        latency_backoffs (int): Number of cuts caused by a rising p95.
+    """
+    def __init__(self, min_limit: int = 1, max_limit: int = 64, initial_limit: int = None, backoff: float = 0.5,
+                 latency_tolerance: float = 2.0, window: int = 20) -> None:
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f"The limits must satisfy 1 <= min_limit <= max_limit. {min_limit}, {max_limit}")
+        if not 0 < backoff < 1:
+            raise ValueError(f"backoff must be between 0 and 1. {backoff}")
+        if latency_tolerance <= 1:
+            raise ValueError(f"latency_tolerance must be greater than 1. {latency_tolerance}")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.window = window
+        self._condition = threading.Condition()
+        self._limit = float(min(max(initial_limit or min_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._latencies = [] # latencies of the current window
+        self._baseline = None # p95 of the unloaded provider
+        self._last_decrease = float("-inf")
+        self.reset_stats()
+
+    def __str__(self) -> str:
+        return (f"Concurrency: limit {self.limit} ({self.min_limit}-{self.max_limit}, peak {self.peak_limit}), "
+                f"{self.decreases} decreases ({self.throttles} throttled requests, {self.latency_backoffs} latency backoffs)")
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def reset_stats(self) -> None:
+        """Reset the counters of a run; the learned limit is kept."""
+        with self._condition:
+            self.peak_limit = self.limit
+            self.decreases = 0
+            self.throttles = 0
+            self.latency_backoffs = 0
+
+    def acquire(self) -> float:
+        """Block until a request fits in the limit and return its start time (see release)."""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(self, start_time: float, error: Exception = None) -> None:
+        """Free the slot of a request and adjust the limit with its outcome."""
+        now = time.monotonic()
+        with self._condition:
+            saturated = self._in_flight >= self.limit # grow only a limit that is actually used
+            self._in_flight -= 1
+            if error is None:
+                self._on_success(now - start_time, now, saturated)
+            elif is_overload(error):
+                self.throttles += 1
+                if start_time >= self._last_decrease:
+                    self._decrease(now)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot while the block runs, timing it and classifying its error."""
+        start_time = self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            self.release(start_time, e)
+            raise
+        self.release(start_time)
+
+    def get_stats(self) -> dict:
+        with self._condition:
+            return {"limit": self.limit, "min_limit": self.min_limit, "max_limit": self.max_limit, "peak_limit": self.peak_limit,
+                    "in_flight": self._in_flight, "decreases": self.decreases, "throttles": self.throttles,
+                    "latency_backoffs": self.latency_backoffs, "baseline_p95": self._baseline}
+
+    def _on_success(self, latency: float, now: float, saturated: bool) -> None:
+        self._latencies.append(latency)
+        if len(self._latencies) >= self.window:
+            p95 = get_percentile(sorted(self._latencies), 95)
+            self._latencies = []
+            rising = self._baseline is not None and p95 > self._baseline * self.latency_tolerance
+            self._baseline = p95 if self._baseline is None else min(p95, self._baseline + (p95 - self._baseline) * BASELINE_DRIFT)
+            if rising:
+                self.latency_backoffs += 1
+                self._decrease(now)
+                return
+        if saturated:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+            self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self, now: float) -> None:
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+        self._last_decrease = now
+        self.decreases += 1
+
+"""
+Helper functions
+"""
+
+_concurrency_limiters = {}
+_concurrency_limiters_lock = threading.Lock()
+
+def get_concurrency_limiter(key: str, min_limit: int = 1, max_limit: int = 64) -> AdaptiveConcurrencyLimiter:
+    """Return the concurrency limiter shared by every model with the same key (e.g., 'openai::gpt-4o-mini').
+
+    The learned limit is kept across runs; a call with different bounds replaces the limiter.
+    """
+    with _concurrency_limiters_lock:
+        limiter = _concurrency_limiters.get(key)
+        if limiter is None or (limiter.min_limit, limiter.max_limit) != (min_limit, max_limit):
+            limiter = AdaptiveConcurrencyLimiter(min_limit=min_limit, max_limit=max_limit)
+            _concurrency_limiters[key] = limiter
+        return limiter
+
+def is_overload(error: BaseException) -> bool:
+    """Return True for the errors of an overloaded provider: 429, 503 and timeouts."""
+    if get_status_code(error) in OVERLOAD_STATUS_CODES:
+        return True
+    if isinstance(error, TimeoutError):
+        return True
+    return any(cls.__name__ in TIMEOUT_ERROR_NAMES for cls in type(error).__mro__)
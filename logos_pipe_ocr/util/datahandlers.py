@@ -2,33 +2,126 @@
 This module contains the data handler classes for the Logos-pipe-ocr project.
 """
 import os
+import io
 import base64
 import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 from abc import ABC, abstractmethod
 from logos_pipe_ocr.util.dataloaders import EvalDataLoader
 from logos_pipe_ocr.util.file import read_json_file, read_txt_file, save
 
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpeg": "image/jpeg",
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+}
+IMAGE_FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"} # re-encoding formats
+
+class ImagePreprocessor:
+    """ ImagePreprocessor class for shrinking images before upload.
+
+    Without any option the file bytes are sent as they are, labeled with the MIME type of the file extension.
+
+    Args:
+        max_side (int): Maximum width/height in pixels; larger images are downscaled (None = keep the size).
+        image_format (str): "JPEG", "WEBP" or "PNG" to re-encode the image (None = keep the format).
+        quality (int): JPEG/WEBP quality (1-100).
+        grayscale (bool): Whether to convert the image to grayscale.
+
+    Attributes:
+        bytes_in (int): Total size of the original images.
+        bytes_out (int): Total size of the prepared images.
+    """
+    def __init__(self, max_side: int = None, image_format: str = None, quality: int = 85, grayscale: bool = False) -> None:
+        if image_format is not None and image_format.upper() not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}. Please use one of the following formats: {', '.join(IMAGE_FORMATS)}")
+        self.max_side = max_side
+        self.image_format = image_format.upper() if image_format is not None else None
+        self.quality = quality
+        self.grayscale = grayscale
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def __str__(self) -> str:
+        saved_ratio = self.bytes_saved / self.bytes_in * 100 if self.bytes_in else 0.0
+        return f"Image payload: {self.bytes_in} -> {self.bytes_out} bytes (saved {self.bytes_saved} bytes, {saved_ratio:.1f}%)"
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def reset_stats(self) -> None:
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def get_config(self) -> dict:
+        return {"max_side": self.max_side, "image_format": self.image_format, "quality": self.quality, "grayscale": self.grayscale}
+
+    def prepare(self, image_file_path: str, image_bytes: bytes = None) -> tuple[bytes, str]:
+        """Return the image bytes to upload and their MIME type (image_bytes: file content already read by the caller)."""
+        if image_bytes is None:
+            with open(image_file_path, "rb") as image_file:
+                image_bytes = image_file.read()
+        mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(image_file_path)[1].lower(), "image/jpeg")
+
+        prepared_bytes, prepared_mime_type = image_bytes, mime_type
+        if self._needs_conversion(image_bytes):
+            prepared_bytes, prepared_mime_type = self._convert(image_bytes)
+
+        with self._lock:
+            self.bytes_in += len(image_bytes)
+            self.bytes_out += len(prepared_bytes)
+        return prepared_bytes, prepared_mime_type
+
+    def _needs_conversion(self, image_bytes: bytes) -> bool:
+        if self.image_format is not None or self.grayscale:
+            return True
+        if self.max_side is None:
+            return False
+        with Image.open(io.BytesIO(image_bytes)) as img: # reads the header only
+            return max(img.size) > self.max_side
+
+    def _convert(self, image_bytes: bytes) -> tuple[bytes, str]:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            image_format = self.image_format or (img.format if img.format in IMAGE_FORMATS else "PNG")
+            if self.grayscale:
+                img = img.convert("L")
+            if self.max_side is not None and max(img.size) > self.max_side:
+                img.thumbnail((self.max_side, self.max_side), Image.Resampling.LANCZOS)
+            if image_format == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB") # JPEG has no alpha channel
+            output = io.BytesIO()
+            save_options = {"quality": self.quality} if image_format in ("JPEG", "WEBP") else {}
+            img.save(output, format=image_format, optimize=True, **save_options)
+        return output.getvalue(), IMAGE_FORMATS[image_format]
+
 class ImageProcessor(ABC):
-    @abstractmethod
-    def process_image(self, image_file_path: str) -> bytes:
-        pass
+    def __init__(self, preprocessor: ImagePreprocessor = None) -> None:
+        self.preprocessor = preprocessor or ImagePreprocessor()
 
-class ChatGPTImageProcessor(ImageProcessor):
-    def process_image(self, image_file_path: str) -> bytes:
+    def process_image(self, image_file_path: str, image_bytes: bytes = None) -> any:
         try:
-            with open(image_file_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            return self.encode_image(*self.preprocessor.prepare(image_file_path, image_bytes))
         except Exception as e:
             raise Exception(f"Image processing error: {e}")
 
+    @abstractmethod
+    def encode_image(self, image_bytes: bytes, mime_type: str) -> any:
+        """Return the image payload of the provider request."""
+        pass
+
+class ChatGPTImageProcessor(ImageProcessor):
+    def encode_image(self, image_bytes: bytes, mime_type: str) -> str:
+        return f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}" # data URL of the image_url content
+
 class GeminiImageProcessor(ImageProcessor):
-    def process_image(self, image_file_path: str) -> Image:
-        try:
-            with Image.open(image_file_path) as img:
-                return img
-        except Exception as e:
-            raise Exception(f"Image processing error: {e}")
+    def encode_image(self, image_bytes: bytes, mime_type: str) -> dict:
+        return {"mime_type": mime_type, "data": image_bytes} # inline blob of the generate_content request
     
 class ResponseHandler(ABC):
     @abstractmethod
@@ -44,6 +137,11 @@ class ResponseHandler(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_content(self, response: any) -> str | None:
+        """Return the raw text content of the response, or None if there is none."""
+        pass
+
     def add_file_name(self, response_dict, image_file_path: str): # Add file name to response dictionary due to permission issue
         file_name = os.path.basename(image_file_path)
         if isinstance(response_dict, list):
@@ -67,11 +165,15 @@ class ChatGPTResponseHandler(ResponseHandler):
         Returns:
             dict: A dictionary containing the processed response.
         """
-        if response.choices[0].message.content is not None:
-            response_json = json.loads(response.choices[0].message.content)
+        content = self.get_content(response)
+        if content is not None:
+            response_json = json.loads(content)
             self.add_file_name(response_json, image_file_path)
             return response_json
         return {}
+
+    def get_content(self, response: any) -> str | None:
+        return response.choices[0].message.content
     
     def save_response(self, response_dict, save_file_path: str, file_name: str, save_result: bool, save_format: str):
         self.save(response_dict, save_file_path, file_name, save_result, save_format)
@@ -87,11 +189,15 @@ class GeminiResponseHandler(ResponseHandler):
         Returns:
             dict: A dictionary containing the processed response.
         """
-        if response.candidates:
-            response_json = json.loads(response.text)
+        content = self.get_content(response)
+        if content is not None:
+            response_json = json.loads(content)
             self.add_file_name(response_json, image_file_path)
             return response_json
         return {}
+
+    def get_content(self, response: any) -> str | None:
+        return response.text if response.candidates else None
     
     def save_response(self, response_dict, save_file_path: str, file_name: str, save_result: bool, save_format: str):
         self.save(response_dict, save_file_path, file_name, save_result, save_format)
@@ -100,50 +206,68 @@ class GeminiResponseHandler(ResponseHandler):
 class EvalDataHandler(EvalDataLoader):
     """ Handle the evaluation data by inheriting from EvalDataLoader.
 
+    The label and output files are read and parsed on a worker pool, at most read_ahead pairs ahead of the consumer.
+    In stream mode iterating the handler yields the (label, output) pairs lazily in label order, so the memory
+    stays flat with the dataset size and the disk reads overlap the metric computation; calling the handler
+    still loads every pair into eval_data.
+
     Args:
         label_dir_path (str): The path to the label directory.
         output_dir_path (str): The path to the output directory.
+        stream (bool): Iterate the pairs lazily instead of from the loaded eval_data.
+        max_workers (int): Number of threads reading and parsing the files.
+        read_ahead (int): Maximum number of pairs read ahead of the consumer (default: 2 * max_workers).
     
     Returns:
         eval_data (dict): A dictionary containing the processed data.  
     """
-    def __init__(self, label_dir_path: str, output_dir_path: str):
+    def __init__(self, label_dir_path: str, output_dir_path: str, stream: bool = False, max_workers: int = 4, read_ahead: int = None):
         super().__init__(label_dir_path, output_dir_path)
+        self.stream = stream
+        self.max_workers = max(1, max_workers)
+        self.read_ahead = max(1, read_ahead or 2 * self.max_workers)
+        self.eval_data = None # loaded by __call__
 
     def __call__(self) -> dict:
-        label_file_paths = self.get_label_file_paths()
-        output_file_paths = self.get_output_file_paths()
         self._current_index = 0
-        
-        processed_data = []
-        self.eval_data = {}
-
-        for label, output in zip(label_file_paths, output_file_paths):
-            if label.endswith(".json") and output.endswith(".json"):
-                processed_item = {
-                    "label": read_json_file(label),
-                    "output": read_json_file(output),
-                }
-            elif label.endswith(".txt") and output.endswith(".txt"):
-                processed_item = {
-                    "label": read_txt_file(label),
-                    "output": read_txt_file(output),
-                }
-            else:
-                raise ValueError(f"Unsupported file extension: {label} or {output}")
-            
-            processed_data.append(processed_item)
-
-        self.eval_data["processed_data"] = processed_data
+        self.eval_data = {"processed_data": [{"label": label, "output": output} for label, output in self.iter_pairs()]}
         return self.eval_data
+
+    def iter_pairs(self):
+        """Yield the parsed (label, output) pairs in label order, reading at most read_ahead pairs ahead."""
+        pending = deque()
+        file_pairs = zip(self.get_label_file_paths(), self.get_output_file_paths())
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="eval") as executor:
+            try:
+                for label, output in file_pairs:
+                    pending.append(executor.submit(self._read_pair, label, output))
+                    if len(pending) >= self.read_ahead:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally: # the consumer stopped early or a file failed
+                for future in pending:
+                    future.cancel()
+
+    def _read_pair(self, label: str, output: str) -> tuple:
+        if label.endswith(".json") and output.endswith(".json"):
+            return read_json_file(label), read_json_file(output)
+        if label.endswith(".txt") and output.endswith(".txt"):
+            return read_txt_file(label), read_txt_file(output)
+        raise ValueError(f"Unsupported file extension: {label} or {output}")
     
     def __len__(self) -> int:
+        if self.eval_data is None: # not loaded, the number of pairs
+            return super().__len__()
         return len(self.eval_data["processed_data"])
     
     def __getitem__(self, index: int) -> dict:
         return self.eval_data["processed_data"][index]
     
     def __iter__(self):
+        if self.stream or self.eval_data is None:
+            yield from self.iter_pairs()
+            return
         for item in self.eval_data.get("processed_data", []):
             yield item["label"], item["output"]
     
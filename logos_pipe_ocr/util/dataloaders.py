@@ -3,10 +3,15 @@ This module contains the data loader classes for the Logos-pipe-ocr project.
 """
 
 import os
+import csv
+import json
+from pathlib import Path, PurePosixPath
 from .file import read_yaml_file, read_json_file, create_txt_file
 
 CONFIG_EXTENSIONS = [".yaml", ".json"]
 IMAGE_EXTENSIONS = [".png", ".jpeg"]
+MANIFEST_EXTENSIONS = [".txt", ".csv", ".jsonl"]
+MANIFEST_PATH_KEYS = ["image_path", "path"] # column (CSV) or key (JSONL) of the image path, the others are metadata
 LABEL_EXTENSIONS = [".json", ".txt"]
 PROMPT_EXTENSIONS = ".txt"
 ENCODING_FORMAT = "utf-8-sig"
@@ -14,38 +19,74 @@ ENCODING_FORMAT = "utf-8-sig"
 class ImageLoader:
     """ ImageLoader class for loading images from a directory. 
 
+    The directory is walked with os.scandir in os.walk order, reusing the stat data of each DirEntry.
+    In stream mode the image paths are yielded while they are discovered, so a run starts on the first image
+    of a huge (e.g., NFS-mounted) tree instead of waiting for the whole listing, and no path list is kept.
+
+    The path can also be a manifest listing the images, which are then loaded in the listed order without
+    scanning any directory (missing files fail in the pipeline rather than being skipped):
+        .txt: one path per line (blank lines and lines starting with # are skipped).
+        .csv: a header row, the path in the image_path (or path) column, or else in the first column.
+        .jsonl: one object per line with an image_path (or path) key, or one JSON string per line.
+    Relative paths are resolved against the directory of the manifest; the other CSV columns and JSONL keys
+    are kept as the metadata of the image (see get_metadata).
+
     Args:
-        image_path (str): Path to the directory containing images.
+        image_path (str): Path to the directory containing images, or to a manifest (.txt, .csv, .jsonl).
+        stream (bool): Yield the image paths while walking the directory instead of listing them up front.
+            len() then walks the directory separately (once) to count them.
+        include (list[str]): Glob patterns of the images to load, matched from the right against the path
+            relative to the directory (e.g., "*.png", "cat/*"). None = every image.
+        exclude (list[str]): Glob patterns of the images and directories to skip; excluded directories are not walked.
+            (Manifest paths are matched relative to the directory of the manifest.)
 
     Returns:
         image_file_paths (list[str]): List of image file paths.
     """
-    def __init__(self, image_dir_path: str) -> None:
+    def __init__(self, image_dir_path: str, stream: bool = False, include: list[str] = None, exclude: list[str] = None) -> None:
         self._image_dir_path = image_dir_path
+        self._stream = stream
+        self._include = list(include or [])
+        self._exclude = list(exclude or [])
         self._image_file_paths = []
         self._current_index = 0
+        self._iterator = None # stream mode
+        self._count = None # stream mode, see __len__
+        self._metadata = {} # image path -> metadata of its manifest entry
+        self._manifest = os.path.isfile(image_dir_path) and Path(image_dir_path).suffix.lower() in MANIFEST_EXTENSIONS
+        self._root = os.path.dirname(image_dir_path) if self._manifest else image_dir_path # include/exclude are relative to it
         
         if not os.path.exists(self._image_dir_path):
             raise FileNotFoundError(f"Directory not found, please check the file path. {self._image_dir_path}")
         
+        if self._manifest and os.path.getsize(self._image_dir_path) == 0:
+            raise FileNotFoundError(f"The manifest is empty. Please provide a valid manifest. {self._image_dir_path}")
+
         if os.path.getsize(self._image_dir_path) == 0:
             raise FileNotFoundError("The directory is empty. Please provide a valid image directory.")
         
-        for root, _, files in os.walk(self._image_dir_path): # walk through the directory
-            self._image_file_paths.extend(os.path.join(root, f) for f in files # get the file paths
-                if f.endswith(tuple(IMAGE_EXTENSIONS)) and os.path.getsize(os.path.join(root, f)) > 0) # check if the file is an image and is not empty
-            
+        if stream:
+            return # the directory is walked on iteration
+        self._image_file_paths = list(self._scan())
         if not self._image_file_paths:
             raise FileNotFoundError("No images found in the specified directory.")
 
 
     def __str__(self) -> str:
         """Return a string representation of the loaded images."""
+        if self._stream:
+            return f"Streaming images from {self._image_dir_path}"
+        if self._manifest:
+            return f"Loaded {len(self._image_file_paths)} images from the manifest {self._image_dir_path}"
         return f"Loaded images: {self._image_file_paths}"
     
     def __len__(self) -> int:
-        """Return the number of loaded images."""
-        return len(self._image_file_paths)
+        """Return the number of loaded images (in stream mode, walks the directory once to count them)."""
+        if not self._stream:
+            return len(self._image_file_paths)
+        if self._count is None:
+            self._count = sum(1 for _ in self._scan())
+        return self._count
     
     def __iter__(self) -> 'ImageLoader':
         """Return the iterator object."""
@@ -53,6 +94,11 @@ class ImageLoader:
 
     def __next__(self) -> str:
         """Return the next image file path."""
+        if self._stream:
+            if self._iterator is None:
+                self._iterator = self._stream_images()
+            return next(self._iterator)
+
         if self._current_index >= len(self._image_file_paths):
             raise StopIteration
         
@@ -60,8 +106,104 @@ class ImageLoader:
         self._current_index += 1
         return image_path
 
+    def _stream_images(self):
+        found = False
+        for image_file_path in self._scan():
+            found = True
+            yield image_file_path
+        if not found:
+            raise FileNotFoundError("No images found in the specified directory.")
+
+    def _scan(self):
+        """Yield the manifest entries, or the non-empty images of the directory tree (files before subdirectories, like os.walk)."""
+        if self._manifest:
+            yield from self._read_manifest()
+            return
+        stack = [self._image_dir_path]
+        while stack:
+            dir_path = stack.pop()
+            subdir_paths = []
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False): # symbolic links to directories are not walked, like os.walk
+                                if not self._is_excluded(entry.path):
+                                    subdir_paths.append(entry.path)
+                            elif (entry.name.endswith(tuple(IMAGE_EXTENSIONS)) and self._is_included(entry.path)
+                                  and entry.stat().st_size > 0): # check if the file is an image and is not empty
+                                yield entry.path
+                        except OSError: # e.g., a broken symbolic link
+                            continue
+            except OSError: # unreadable directories are skipped, like os.walk
+                continue
+            stack.extend(reversed(subdir_paths))
+
+    def _read_manifest(self):
+        """Yield the image paths of the manifest line by line, storing their metadata."""
+        suffix = Path(self._image_dir_path).suffix.lower()
+        with open(self._image_dir_path, "r", encoding=ENCODING_FORMAT, newline="") as manifest_file:
+            if suffix == ".csv":
+                reader = csv.DictReader(manifest_file)
+                path_key = next((key for key in MANIFEST_PATH_KEYS if key in (reader.fieldnames or [])), (reader.fieldnames or [None])[0])
+                entries = ((row.pop(path_key, None), row) for row in reader)
+            elif suffix == ".jsonl":
+                entries = (self._parse_jsonl_entry(line) for line in manifest_file if line.strip())
+            else:
+                entries = ((line.strip(), {}) for line in manifest_file if line.strip() and not line.lstrip().startswith("#"))
+
+            for image_file_path, metadata in entries:
+                if not image_file_path:
+                    continue
+                image_file_path = os.path.join(self._root, image_file_path) # absolute paths are kept as they are
+                if not self._is_included(image_file_path):
+                    continue
+                if metadata:
+                    self._metadata[image_file_path] = metadata
+                yield image_file_path
+
+    def _parse_jsonl_entry(self, line: str) -> tuple[str | None, dict]:
+        entry = json.loads(line)
+        if isinstance(entry, str):
+            return entry, {}
+        path_key = next((key for key in MANIFEST_PATH_KEYS if key in entry), None)
+        if path_key is None:
+            raise ValueError(f"Manifest entry without an image path, please use one of the following keys: {', '.join(MANIFEST_PATH_KEYS)}. {line.strip()}")
+        image_file_path = entry.pop(path_key)
+        return image_file_path, entry
+
+    def _is_included(self, path: str) -> bool:
+        if self._matches(path, self._exclude):
+            return False
+        return not self._include or self._matches(path, self._include)
+
+    def _is_excluded(self, dir_path: str) -> bool:
+        return self._matches(dir_path, self._exclude)
+
+    def _matches(self, path: str, patterns: list[str]) -> bool:
+        if not patterns: # no relative path to compute on the common path
+            return False
+        relative_path = PurePosixPath(Path(os.path.relpath(path, self._root)).as_posix())
+        return any(relative_path.match(pattern) for pattern in patterns)
+
+    def get_manifest_path(self, image_file_path: str) -> str | None:
+        """Return the path of a manifest entry relative to the directory of the manifest (None for a directory or an entry outside it)."""
+        if not self._manifest:
+            return None
+        try:
+            relative_path = os.path.relpath(image_file_path, self._root)
+        except ValueError: # on another drive
+            return None
+        return None if ".." in Path(relative_path).parts else relative_path
+
+    def get_metadata(self, image_file_path: str) -> dict:
+        """Return the metadata of the image in the manifest (empty for a directory or an image without metadata)."""
+        return self._metadata.get(image_file_path, {})
+
     def get_file_path(self) -> list[str]:
         """Return the list of image file paths."""
+        if self._stream:
+            return list(self._scan())
         return self._image_file_paths
 
 
@@ -123,6 +265,10 @@ class EvalDataLoader:
     def __init__(self, label_dir_path: str, output_dir_path: str) -> None:
         """ EvalDataLoader class for loading label and output files from directories.
 
+        Each label is paired with the output at the same path relative to its directory (e.g., cat/cat001.json),
+        or else with the only unpaired output of the same file name. The pairs follow the order of the labels;
+        the files left without a pair are reported by get_unmatched.
+
         Args:
             label_dir_path (str): Path to the label directory.
             output_dir_path (str): Path to the output directory.
@@ -135,25 +281,55 @@ class EvalDataLoader:
         self._output_dir_path = output_dir_path
         self._label_file_paths = []
         self._output_file_paths = []
+        self._unmatched = {"labels": [], "outputs": []}
         self._current_index = 0 
 
         if not os.path.exists(self._label_dir_path) or not os.path.exists(self._output_dir_path):
             raise FileNotFoundError(f"Directory not found, please check the file path. {self._label_dir_path} or {self._output_dir_path}")
 
+        label_file_paths = []
         for root, _, files in os.walk(self._label_dir_path):
-            self._label_file_paths.extend(os.path.join(root, f) for f in files if any(f.endswith(suffix) for suffix in LABEL_EXTENSIONS))
-        
-        for root, _, files in os.walk(self._output_dir_path):
-            for f in files:
-                output_path = os.path.join(root, f)
-                if os.path.basename(output_path) in [os.path.basename(lp) for lp in self._label_file_paths]:
-                    self._output_file_paths.append(output_path)
-                else:
-                    print(f"Warning: No corresponding label file for {f}")
-
-        # get only the files that have corresponding label files
-        self._label_file_paths = [label_path for label_path in self._label_file_paths if os.path.basename(label_path) in [os.path.basename(op) for op in self._output_file_paths]]
-        self._output_file_paths = [output_path for output_path in self._output_file_paths if os.path.basename(output_path) in [os.path.basename(lp) for lp in self._label_file_paths]]
+            label_file_paths.extend(os.path.join(root, f) for f in files if any(f.endswith(suffix) for suffix in LABEL_EXTENSIONS))
+        output_file_paths = [os.path.join(root, f) for root, _, files in os.walk(self._output_dir_path) for f in files]
+
+        pairs = self._pair_files(label_file_paths, output_file_paths)
+        self._label_file_paths = [label_path for label_path in label_file_paths if label_path in pairs]
+        self._output_file_paths = [pairs[label_path] for label_path in self._label_file_paths]
+        matched_outputs = set(self._output_file_paths)
+        self._unmatched = {
+            "labels": [label_path for label_path in label_file_paths if label_path not in pairs],
+            "outputs": [output_path for output_path in output_file_paths if output_path not in matched_outputs],
+        }
+        if self._unmatched["outputs"] or self._unmatched["labels"]:
+            print(f"Warning: {len(self._unmatched['outputs'])} output files without a corresponding label file and "
+                  f"{len(self._unmatched['labels'])} label files without an output file (see get_unmatched)")
+
+    def _pair_files(self, label_file_paths: list[str], output_file_paths: list[str]) -> dict[str, str]:
+        """Return label path -> output path, joined on the relative path, then on the file name if it is unambiguous."""
+        outputs_by_path = {self._get_relative_path(output_path, self._output_dir_path): output_path for output_path in output_file_paths}
+        pairs = {}
+        for label_path in label_file_paths:
+            output_path = outputs_by_path.get(self._get_relative_path(label_path, self._label_dir_path))
+            if output_path is not None:
+                pairs[label_path] = output_path
+
+        # fall back on the file name, e.g., labels in subdirectories and outputs in one directory
+        matched_outputs = set(pairs.values())
+        labels_by_name, outputs_by_name = {}, {}
+        for label_path in label_file_paths:
+            if label_path not in pairs:
+                labels_by_name.setdefault(os.path.basename(label_path), []).append(label_path)
+        for output_path in output_file_paths:
+            if output_path not in matched_outputs:
+                outputs_by_name.setdefault(os.path.basename(output_path), []).append(output_path)
+        for name, label_paths in labels_by_name.items():
+            output_paths = outputs_by_name.get(name, [])
+            if len(label_paths) == 1 and len(output_paths) == 1: # equal names in several directories stay unmatched
+                pairs[label_paths[0]] = output_paths[0]
+        return pairs
+
+    def _get_relative_path(self, file_path: str, dir_path: str) -> str:
+        return Path(os.path.relpath(file_path, dir_path)).as_posix()
 
     def __len__(self) -> int:
         """Return the number of label and output file paths."""
@@ -180,6 +356,10 @@ class EvalDataLoader:
     def get_output_file_paths(self) -> list[str]:
         """Return the list of output file paths."""
         return self._output_file_paths
+
+    def get_unmatched(self) -> dict[str, list[str]]:
+        """Return the label files without an output file and the output files without a label file."""
+        return self._unmatched
     
 class ModelConfigLoader:
     """ ModelConfigLoader class for loading model configuration files.
@@ -221,6 +401,38 @@ class ModelConfigLoader:
             "max_tokens",  # maximum number of tokens to generate
             "repeat_penalty",  # penalty for repeating tokens
             "seed",  # random seed
+            "rpm",  # requests per minute (rate limit)
+            "tpm",  # tokens per minute (rate limit)
+            "max_retries",  # maximum number of retries of a transient error
+            "retry_base_delay",  # delay of the first retry
+            "retry_max_delay",  # maximum backoff delay
+            "adaptive_concurrency",  # adapt the requests in flight to the provider
+            "concurrency_min",  # lowest adaptive concurrency
+            "concurrency_max",  # highest adaptive concurrency
+            "hedge_percentile",  # latency percentile after which a request is hedged
+            "hedge_budget",  # maximum ratio of hedged requests
+            "max_image_side",  # downscale images before upload
+            "image_format",  # re-encode images before upload
+            "image_quality",  # quality of the re-encoded images
+            "grayscale",  # convert images to grayscale before upload
+            "max_connections",  # connections shared by the models of a platform
+            "max_keepalive_connections",  # idle connections kept alive
+            "keepalive_expiry",  # seconds an idle connection is kept alive
+            "timeout",  # request timeout
+            "connect_timeout",  # connection timeout
+            "http2",  # use HTTP/2
+            "input_price",  # USD per 1M prompt tokens
+            "cached_input_price",  # USD per 1M cached prompt tokens
+            "output_price",  # USD per 1M completion tokens
+            "template",  # response of a local model
+            "latency",  # mean latency of a local model
+            "latency_std",  # latency standard deviation of a local model
+            "latency_distribution",  # latency distribution of a local model
+            "error_rate_429",  # 429 errors injected by a local model
+            "error_rate_500",  # 500 errors injected by a local model
+            "retry_after",  # Retry-After of the 429 errors of a local model
+            "max_concurrent_requests",  # concurrency limit of a local model
+            "max_rpm",  # requests per minute limit of a local model
         }
         self._config = {key: self._data[key] for key in COMMON_ALLOWED_PARAMETERS if key in self._data}
 
@@ -0,0 +1,128 @@
+﻿"""
+This module contains the duplicate image detection class for the Logos-pipe-ocr project.
+"""
+import io
+import hashlib
+import threading
+from PIL import Image
+
+DEDUP_MODES = ["exact", "perceptual"] # exact: same file content, perceptual: same file content or similar dHash
+HASH_SIZE = 8 # dHash of 8x8 = 64 bits
+
+class ImageDeduplicator:
+    """ ImageDeduplicator class for sending only one image of each group of duplicate images.
+
+    The images are grouped as they are added: the first image of a group is its representative and is sent,
+    the later ones are kept as its duplicates. add is thread-safe, so the hashes are computed by the workers that read the images. Perceptual mode also groups images whose 64-bit difference hashes
+    (dHash) differ in at most threshold bits, e.g., the same page scanned twice.
+
+    Args:
+        mode (str): "exact" or "perceptual".
+        threshold (int): Maximum Hamming distance between the dHashes of duplicates (perceptual mode only, 0-63).
+
+    Attributes:
+        image_count (int): Number of images loaded.
+        duplicates (dict): Representative image path -> paths of its duplicates.
+    """
+    def __init__(self, mode: str = "exact", threshold: int = 5) -> None:
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unsupported dedup mode: {mode}. Please use one of the following modes: {', '.join(DEDUP_MODES)}")
+        if not 0 <= threshold < HASH_SIZE * HASH_SIZE:
+            raise ValueError(f"threshold must be between 0 and {HASH_SIZE * HASH_SIZE - 1}. {threshold}")
+        self.mode = mode
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._content_hashes = {} # sha256 -> representative
+        self._segments = [{} for _ in range(threshold + 1)] # segment value -> [(dhash, representative)], see _find_similar
+        self.image_count = 0
+        self.duplicates = {}
+
+    def __str__(self) -> str:
+        return f"Dedup ({self.mode}): {self.duplicate_count} of {self.image_count} images were duplicates ({self.ratio * 100:.1f}%)"
+
+    @property
+    def duplicate_count(self) -> int:
+        return sum(len(duplicates) for duplicates in self.duplicates.values())
+
+    @property
+    def ratio(self) -> float:
+        return self.duplicate_count / self.image_count if self.image_count else 0.0
+
+    def filter(self, image_file_paths):
+        """Yield the representative of each group, in loading order."""
+        for image_file_path in image_file_paths:
+            if self.add(image_file_path) is None:
+                yield image_file_path
+
+    def add(self, image_file_path: str, image_bytes: bytes = None) -> str | None:
+        """Add the image and return its representative, or None if the image is the representative of a new group.
+
+        Args:
+            image_file_path (str): Path of the image.
+            image_bytes (bytes): Content of the image if already read, so the image is not read again.
+        """
+        try:
+            if image_bytes is None:
+                with open(image_file_path, "rb") as image_file:
+                    image_bytes = image_file.read()
+            content_hash = hashlib.sha256(image_bytes).hexdigest()
+            dhash = get_dhash(io.BytesIO(image_bytes)) if self.mode == "perceptual" else None
+        except Exception: # unreadable images are sent alone and fail in the pipeline
+            with self._lock:
+                self.image_count += 1
+            return None
+
+        with self._lock:
+            self.image_count += 1
+            representative = self._content_hashes.get(content_hash)
+            if representative is None and dhash is not None:
+                representative = self._find_similar(dhash)
+            if representative is not None:
+                self.duplicates.setdefault(representative, []).append(image_file_path)
+                return representative
+
+            self._content_hashes[content_hash] = image_file_path
+            if dhash is not None:
+                for segment, segment_value in enumerate(self._split(dhash)):
+                    self._segments[segment].setdefault(segment_value, []).append((dhash, image_file_path))
+            return None
+
+    def get_duplicates(self, image_file_path: str) -> list[str]:
+        """Return the duplicates of the representative image found so far."""
+        with self._lock:
+            return list(self.duplicates.get(image_file_path, []))
+
+    def _find_similar(self, dhash: int) -> str | None:
+        # two hashes within threshold bits share at least one of the threshold + 1 segments exactly (pigeonhole),
+        # so only the representatives with a common segment are compared
+        for segment, segment_value in enumerate(self._split(dhash)):
+            for candidate_hash, representative in self._segments[segment].get(segment_value, []):
+                if bin(dhash ^ candidate_hash).count("1") <= self.threshold:
+                    return representative
+        return None
+
+    def _split(self, dhash: int) -> list[int]:
+        bits = HASH_SIZE * HASH_SIZE
+        segment_count = self.threshold + 1
+        bounds = [bits * index // segment_count for index in range(segment_count + 1)]
+        return [(dhash >> start) & ((1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+
+"""
+Helper functions
+"""
+
+def get_dhash(image_file_path) -> int:
+    """Return the 64-bit difference hash of the image (brightness gradients of a 9x8 grayscale thumbnail).
+
+    image_file_path may also be a file object, e.g., io.BytesIO of the image bytes.
+    """
+    with Image.open(image_file_path) as img:
+        img.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4)) # decode JPEGs at a reduced size
+        pixels = list(img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).getdata())
+    dhash = 0
+    for row in range(HASH_SIZE):
+        for column in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + column]
+            right = pixels[row * (HASH_SIZE + 1) + column + 1]
+            dhash = (dhash << 1) | (left > right)
+    return dhash
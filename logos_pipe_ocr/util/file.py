@@ -1,9 +1,70 @@
 ﻿import os
 import yaml
+import threading
 import json
+import codecs
+import importlib
 from pathlib import Path
 
 ENCODING_FORMAT = 'utf-8-sig'
+JSON_BACKENDS = ["orjson", "ujson", "json"] # in order of preference, json (stdlib) is always available
+
+_json_backend = None # name of the backend module, see configure_json
+_json_compact = False # default of create_json_file
+_json_lock = threading.Lock()
+
+def configure_json(backend: str = None, compact: bool = None) -> str: # Function to choose the JSON backend and the default JSON file layout
+    """
+    Selects the module that parses JSON and writes compact JSON, and whether create_json_file writes compact files by
+    default; args: backend=None (the first installed of JSON_BACKENDS), compact=None (unchanged). Returns the backend.
+
+    Indented files are always written by the stdlib, so they stay byte-for-byte identical whatever the backend.
+    Example: configure_json("json") --> stdlib only, configure_json(compact=True) --> one-line prediction files
+    """
+    global _json_backend, _json_compact
+    if backend is not None and backend not in JSON_BACKENDS:
+        raise ValueError(f"Unsupported JSON backend: {backend}. Please use one of the following backends: {', '.join(JSON_BACKENDS)}")
+    with _json_lock:
+        for name in [backend] if backend is not None else JSON_BACKENDS:
+            try:
+                importlib.import_module(name)
+                _json_backend = name
+                break
+            except ImportError:
+                if backend is not None:
+                    raise ImportError(f"The {backend} JSON backend is not installed, please install it with `pip install {backend}`.")
+        if compact is not None:
+            _json_compact = compact
+        return _json_backend
+
+def get_json_backend() -> str: # Function to return the name of the JSON backend
+    return _json_backend or configure_json()
+
+def json_dumps(data: any, compact: bool = False) -> str: # Function to serialize JSON like json.dumps(ensure_ascii=False)
+    if not compact:
+        return json.dumps(data, ensure_ascii=False, indent=4)  # the layout of every existing file
+    backend = get_json_backend()
+    try:
+        if backend == "orjson":
+            return importlib.import_module("orjson").dumps(data).decode("utf-8")
+        if backend == "ujson":
+            return importlib.import_module("ujson").dumps(data, ensure_ascii=False, escape_forward_slashes=False)
+    except (TypeError, OverflowError): # e.g., non-string keys or big integers, which only the stdlib supports
+        pass
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+def json_loads(text: str | bytes) -> any: # Function to parse JSON text or UTF-8 bytes (with or without a BOM)
+    if isinstance(text, bytes):
+        text = text.removeprefix(codecs.BOM_UTF8)
+    else:
+        text = text.removeprefix("\ufeff")
+    backend = get_json_backend()
+    if backend != "json":
+        try:
+            return importlib.import_module(backend).loads(text)
+        except (ValueError, OverflowError): # NaN, Infinity and big integers are only accepted by the stdlib
+            pass
+    return json.loads(text)
 
 def create_txt_file(text: str|dict, file_path: str, file_name: str) -> None: # Function to save a text file
     try:
@@ -11,18 +72,26 @@ def create_txt_file(text: str|dict, file_path: str, file_name: str) -> None: # F
             text = "\n".join(str(item) for item in text)  
         else:
             text = str(text)
-        with open(str(file_path) + '/' + file_name + '.txt', 'w', encoding=ENCODING_FORMAT) as file:
-            file.write(text)    
+        write_file_atomic(str(file_path) + '/' + file_name + '.txt', text)
     except Exception as e:
         raise Exception(f"An error occurred while creating a TXT file: {str(e)}")   
 
-def create_json_file(data: dict, file_path: str, file_name: str) -> None: # Function to save a JSON file
+def create_json_file(data: dict, file_path: str, file_name: str, compact: bool = None) -> None: # Function to save a JSON file (compact: no indent, default: see configure_json)
     try:
-        with open(str(file_path) + '/' + file_name + '.json', 'w', encoding=ENCODING_FORMAT) as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+        write_file_atomic(str(file_path) + '/' + file_name + '.json', json_dumps(data, compact=_json_compact if compact is None else compact))
     except Exception as e:
         raise Exception(f"An error occurred while creating a JSON file: {str(e)}")
 
+def write_file_atomic(file_path: str, text: str) -> None: # Function to write a file without leaving a partial file on a crash
+    temp_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_file_path, 'w', encoding=ENCODING_FORMAT) as file:
+            file.write(text)
+        os.replace(temp_file_path, file_path)  # the target file is either the old or the new file, never a partial one
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
 def read_yaml_file(file_path: str) -> dict: # Function to read a YAML file
     try:
         with open(file_path, 'r', encoding=ENCODING_FORMAT) as file:
@@ -32,8 +101,8 @@ def read_yaml_file(file_path: str) -> dict: # Function to read a YAML file
 
 def read_json_file(file_path: str) -> dict: # Function to read a JSON file
     try:
-        with open(file_path, 'r', encoding=ENCODING_FORMAT) as file:
-            return json.load(file)
+        with open(file_path, 'rb') as file:
+            return json_loads(file.read())  # the BOM of the files written with ENCODING_FORMAT is skipped
     except FileNotFoundError:
         print(f"File not found, please check the file path. {file_path}")
         return None
@@ -43,6 +112,36 @@ def read_json_file(file_path: str) -> dict: # Function to read a JSON file
     except Exception as e:
         raise Exception(f"Error occurred: {e}")
 
+def append_jsonl_file(data: dict, file_path: str) -> None: # Function to append a line to a JSONL file
+    try:
+        with open(file_path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(data, ensure_ascii=False) + "\n")
+    except Exception as e:
+        raise Exception(f"An error occurred while appending to a JSONL file: {str(e)}")
+
+def write_jsonl_file(data: list[dict], file_path: str) -> None: # Function to replace a JSONL file atomically
+    write_file_atomic(file_path, "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in data))
+
+def read_jsonl_file(file_path: str, invalid_lines: list = None) -> list[dict]: # Function to read a JSONL file, skipping the invalid lines (e.g., torn by a crash)
+    try:
+        entries = []
+        with open(file_path, 'r', encoding=ENCODING_FORMAT) as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json_loads(line))
+                except json.JSONDecodeError:
+                    print(f"Invalid JSONL line {line_number} skipped. Please check the file content. {file_path}")
+                    if invalid_lines is not None: # (line number, line) of the skipped lines
+                        invalid_lines.append((line_number, line))
+        return entries
+    except FileNotFoundError:
+        print(f"File not found, please check the file path. {file_path}")
+        return []
+    except Exception as e:
+        raise Exception(f"Error occurred: {e}")
+
 def read_txt_file(file_path: str) -> list | str: # Function to read a TXT file and return a list or a single string
     try:
         with open(file_path, 'r', encoding=ENCODING_FORMAT) as file:
@@ -82,6 +181,26 @@ def increment_path(path, exist_ok=False, sep="", mkdir=False): # Function to inc
 
     return path
 
+def latest_path(path, sep=""): # Function to find the latest path created by increment_path
+    """
+    Returns the most recent existing path of the increment_path sequence, or None if the path does not exist; args: path,
+    sep="".
+
+    Example: runs/exp, runs/exp2, runs/exp3 exist --> runs/exp3
+    """
+    path = Path(path)  # os-agnostic
+    if not path.exists():
+        return None
+
+    latest = path
+    for n in range(2, 9999):
+        p = Path(f"{path}{sep}{n}")  # increment path
+        if not p.exists():  # increment_path uses the first missing number
+            break
+        latest = p
+
+    return latest
+
 def save(data: any, save_file_path: str, file_name: str, save_result: bool = True, save_format: str = "json"):
     try:
         if save_result:  # save_result가 True일 때만 저장
@@ -0,0 +1,172 @@
+﻿"""
+This module contains the request hedging class for the Logos-pipe-ocr project.
+"""
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logos_pipe_ocr.util.metrics import get_percentile
+
+LATENCY_WINDOW = 200 # recent call latencies the hedge delay is computed from
+
+class RequestHedger:
+    """ RequestHedger class for cutting the tail latency of stalled provider calls with a duplicate request.
+
+    A call that has not returned after the given percentile of the recent latencies is sent a second time and the
+    first successful answer wins. The extra calls are capped by the budget (e.g., 0.05 = at most 5% more calls).
+    The delay counts from the start of the call, not from its submission, and a duplicate is only sent if a hedging
+    thread is free to run it at once and on_hedge accepts it (e.g., the rate limit has room for one more request).
+    A synchronous SDK call cannot be interrupted, so the losing call is cancelled if it has not started yet
+    (on_cancelled), otherwise it runs to completion and its response is handed to on_discarded.
+
+    Args:
+        percentile (float): Percentile of the recent latencies after which a call is hedged (e.g., 95).
+        budget (float): Maximum ratio of hedged calls to calls.
+        min_samples (int): Number of latencies needed before the first hedge.
+        max_workers (int): Maximum number of calls running at once on the hedging threads.
+
+    Attributes:
+        calls (int): Number of calls.
+        hedges (int): Number of duplicate calls sent.
+        hedge_wins (int): Number of calls answered by the duplicate.
+        budget_skips (int): Number of slow calls not hedged because the budget was spent, no hedging thread was free
+            or on_hedge refused the duplicate.
+    """
+    def __init__(self, percentile: float = 95, budget: float = 0.05, min_samples: int = 20, max_workers: int = 128) -> None:
+        if not 0 < percentile < 100:
+            raise ValueError(f"percentile must be between 0 and 100. {percentile}")
+        if budget < 0:
+            raise ValueError(f"budget must not be negative. {budget}")
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._executor = None
+        self._active = 0 # calls submitted to the hedging threads and not done, running or queued
+        self.reset_stats()
+
+    def __str__(self) -> str:
+        return (f"Hedging (p{self.percentile:g}, budget {self.budget * 100:g}%): {self.hedges} of {self.calls} calls hedged, "
+                f"{self.hedge_wins} answered by the hedge, {self.budget_skips} skipped by the budget")
+
+    def reset_stats(self) -> None:
+        """Reset the counters of a run; the recent latencies are kept."""
+        with self._lock:
+            self.calls = 0
+            self.hedges = 0
+            self.hedge_wins = 0
+            self.budget_skips = 0
+
+    def get_delay(self) -> float | None:
+        """Return the seconds after which a call is hedged, or None until min_samples latencies are known."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            return get_percentile(sorted(self._latencies), self.percentile)
+
+    def call(self, func, *args, on_hedge=None, on_discarded=None, on_cancelled=None) -> any:
+        """Call func, send it a second time if it is slow and return the first successful result.
+
+        Args:
+            func: Function to call with args.
+            on_hedge: Called before the duplicate is sent; the duplicate is not sent if it returns False.
+            on_discarded: Called with the result of the losing call once it is done.
+            on_cancelled: Called if the losing call was cancelled before it started.
+        """
+        with self._lock:
+            self.calls += 1
+        delay = self.get_delay()
+        if delay is None: # warming up, nothing to hedge against
+            start_time = time.monotonic()
+            result = func(*args)
+            self._add_latency(time.monotonic() - start_time)
+            return result
+
+        started = threading.Event()
+        primary = self._submit(func, args, started)
+        started.wait() # the time spent queued for a hedging thread is not latency
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_budget():
+            return primary.result()
+        if on_hedge is not None and not on_hedge():
+            self._return_budget()
+            return primary.result()
+
+        hedge = self._submit(func, args)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                for loser in pending: # drop the other call, see on_discarded
+                    if loser.cancel():
+                        if on_cancelled is not None:
+                            on_cancelled()
+                    elif on_discarded is not None:
+                        loser.add_done_callback(lambda loser: loser.exception() is None and on_discarded(loser.result()))
+                return future.result()
+        raise error # both calls failed
+
+    def close(self) -> None:
+        """Shut down the hedging threads once the running calls are done; the next call starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False) # the discarded calls still run to completion
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"percentile": self.percentile, "budget": self.budget, "calls": self.calls, "hedges": self.hedges,
+                    "hedge_wins": self.hedge_wins, "budget_skips": self.budget_skips}
+
+    def _submit(self, func, args: tuple, started: threading.Event = None):
+        executor = self._get_executor()
+        with self._lock:
+            self._active += 1
+        future = executor.submit(self._timed_call, func, args, started)
+        future.add_done_callback(self._release_thread) # also called if the call is cancelled
+        return future
+
+    def _release_thread(self, future) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def _timed_call(self, func, args: tuple, started: threading.Event = None) -> any:
+        if started is not None:
+            started.set()
+        start_time = time.monotonic()
+        result = func(*args)
+        self._add_latency(time.monotonic() - start_time) # failed calls say nothing about the latency
+        return result
+
+    def _add_latency(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _take_budget(self) -> bool:
+        # a duplicate waiting behind the other calls for a hedging thread would not answer any sooner
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.calls or self._active >= self.max_workers:
+                self.budget_skips += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def _return_budget(self) -> None:
+        with self._lock:
+            self.hedges -= 1
+            self.budget_skips += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hedge")
+            return self._executor
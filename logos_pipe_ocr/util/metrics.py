@@ -0,0 +1,163 @@
+﻿"""
+This module contains the run metrics class for the Logos-pipe-ocr project.
+"""
+import math
+import threading
+from array import array
+from pathlib import Path
+from logos_pipe_ocr.util.file import create_json_file, append_jsonl_file
+
+METRICS_FILE_NAME = "metrics" # metrics.json (summary) and metrics.jsonl (one record per image) in the run directory
+TIMING_STAGES = ["read", "dedup", "encode", "request", "save", "total"]
+TOKEN_KEYS = ["prompt_tokens", "cached_tokens", "completion_tokens", "total_tokens"]
+PERCENTILES = [50, 95, 99]
+PRICE_TABLE = { # USD per 1M tokens: input, cached input, output (matched by the longest model name prefix)
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4-turbo": {"input": 10.00, "cached_input": 10.00, "output": 30.00},
+    "gemini-1.5-flash-8b": {"input": 0.0375, "cached_input": 0.01, "output": 0.15},
+    "gemini-1.5-flash": {"input": 0.075, "cached_input": 0.01875, "output": 0.30},
+    "gemini-1.5-pro": {"input": 1.25, "cached_input": 0.3125, "output": 5.00},
+}
+
+class RunMetrics:
+    """ RunMetrics class for collecting the timings, token usage and cost of each image of a run.
+
+    An image is done once its timing is recorded: its record is appended to metrics.jsonl of the run directory and
+    folded into the summary, so only the images in flight and the stage timings (for the percentiles) stay in memory.
+    Each run in the same directory (resume, retry_failed) writes its own metrics.<n>.json and metrics.<n>.jsonl.
+
+    Attributes:
+        stats (dict): Run-level stats of the components (e.g., "concurrency" -> limits of the concurrency limiter).
+        records_path (Path): JSONL file of the per-image records, or None if the run is not saved (see open).
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __str__(self) -> str:
+        summary = self.get_summary()
+        lines = [f"Metrics of {summary['images']} images"]
+        for stage, stats in summary["timing"].items():
+            percentiles = ", ".join(f"p{percentile}={stats[f'p{percentile}']:.3f}s" for percentile in PERCENTILES)
+            lines.append(f"  {stage:<8} {percentiles}, total={stats['total']:.3f}s")
+        tokens = summary["tokens"]
+        lines.append(f"  tokens   prompt={tokens['prompt_tokens']}, cached={tokens['cached_tokens']}, completion={tokens['completion_tokens']}")
+        cost = summary["cost"]
+        lines.append(f"  cost     {'unknown (no price of the model)' if cost is None else f'${cost:.4f}'}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = {}
+            self.records_path = None
+            self._pending = {} # image_path -> record of the images in flight
+            self._timings = {stage: array("d") for stage in TIMING_STAGES}
+            self._tokens = dict.fromkeys(TOKEN_KEYS, 0)
+            self._cost = 0.0
+            self._priced = True
+            self._images = 0 # images done
+
+    def open(self, save_dir: str) -> Path:
+        """Start writing the per-image records to the first unused metrics[.<n>].jsonl of the run directory."""
+        Path(save_dir).mkdir(parents=True, exist_ok=True)
+        for attempt in range(1, 10000):
+            file_name = METRICS_FILE_NAME if attempt == 1 else f"{METRICS_FILE_NAME}.{attempt}"
+            records_path = Path(save_dir) / f"{file_name}.jsonl"
+            if not records_path.exists() and not records_path.with_suffix(".json").exists():
+                break
+        records_path.touch()
+        with self._lock:
+            self.records_path = records_path
+        return records_path
+
+    def record_timing(self, image_file_path: str, timing: dict) -> None:
+        """Add the seconds spent on each stage of the image; the image is done."""
+        with self._lock:
+            record = self._pending.pop(str(image_file_path), None) or self._new_record()
+            for stage, seconds in timing.items():
+                record["timing"][stage] = record["timing"].get(stage, 0.0) + seconds
+            self._add_record(str(image_file_path), record)
+
+    def record_usage(self, image_file_path: str, usage: dict, cost: float | None) -> None:
+        """Add the token usage and the cost of a request of the image (a cascade may send several)."""
+        with self._lock:
+            record = self._pending.setdefault(str(image_file_path), self._new_record())
+            for key, tokens in usage.items():
+                record["usage"][key] = record["usage"].get(key, 0) + (tokens or 0)
+            if cost is None:
+                record["priced"] = False
+            else:
+                record["cost"] += cost
+
+    def record_stats(self, name: str, stats: dict) -> None:
+        """Store the run-level stats of a component, saved with the summary."""
+        with self._lock:
+            self.stats[name] = stats
+
+    def get_summary(self) -> dict:
+        """Return the p50/p95/p99 of each stage, the total tokens and the total cost (None if a request had no price)."""
+        with self._lock:
+            pending = list(self._pending.values()) # usage of the images in flight, or of late discarded responses
+            timing = {}
+            for stage, values in self._timings.items():
+                if values:
+                    values = sorted(values)
+                    timing[stage] = {**{f"p{percentile}": get_percentile(values, percentile) for percentile in PERCENTILES},
+                                     "mean": sum(values) / len(values), "total": sum(values)}
+            tokens = {key: self._tokens[key] + sum(record["usage"].get(key, 0) for record in pending) for key in TOKEN_KEYS}
+            priced = self._priced and all(record["priced"] for record in pending)
+            cost = self._cost + sum(record["cost"] for record in pending) if priced else None
+            return {"images": self._images, "timing": timing, "tokens": tokens, "cost": cost, **self.stats}
+
+    def save(self, save_dir: str) -> Path:
+        """Write the records of the images still in flight and the summary to metrics[.<n>].json of the run directory."""
+        if self.records_path is None or self.records_path.parent != Path(save_dir):
+            self.open(save_dir)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for image_file_path, record in pending.items():
+                self._add_record(image_file_path, record)
+            summary_path = self.records_path.with_suffix(".json")
+        create_json_file({"summary": self.get_summary(), "records": self.records_path.name}, summary_path.parent, summary_path.stem)
+        return summary_path
+
+    def _new_record(self) -> dict:
+        return {"timing": {}, "usage": {}, "cost": 0.0, "priced": True}
+
+    def _add_record(self, image_file_path: str, record: dict) -> None:
+        # called with the lock held; a record without timing holds the usage of a response discarded after its image was done
+        self._images += bool(record["timing"])
+        for stage, seconds in record["timing"].items():
+            if stage in self._timings:
+                self._timings[stage].append(seconds)
+        for key in TOKEN_KEYS:
+            self._tokens[key] += record["usage"].get(key, 0)
+        self._cost += record["cost"]
+        self._priced = self._priced and record["priced"]
+        if self.records_path is not None:
+            append_jsonl_file({"image_path": image_file_path, **record}, self.records_path)
+
+"""
+Helper functions
+"""
+
+def get_percentile(sorted_values: list[float], percentile: float) -> float:
+    """Return the percentile of sorted values with linear interpolation."""
+    position = (len(sorted_values) - 1) * percentile / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def get_prices(model_name: str) -> dict | None:
+    """Return the prices of the model from PRICE_TABLE (longest matching prefix), or None if it is unknown."""
+    matches = [name for name in PRICE_TABLE if model_name.startswith(name)]
+    return PRICE_TABLE[max(matches, key=len)] if matches else None
+
+def estimate_cost(usage: dict, prices: dict | None) -> float | None:
+    """Return the USD cost of the usage; cached prompt tokens are billed at the cached input price."""
+    if prices is None or not usage:
+        return None
+    cached_tokens = usage.get("cached_tokens") or 0
+    uncached_tokens = (usage.get("prompt_tokens") or 0) - cached_tokens
+    return (uncached_tokens * prices["input"] + cached_tokens * prices["cached_input"]
+            + (usage.get("completion_tokens") or 0) * prices["output"]) / 1_000_000
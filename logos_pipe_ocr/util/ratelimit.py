@@ -0,0 +1,124 @@
+﻿"""
+This module contains the rate limiter classes for the Logos-pipe-ocr project.
+"""
+import time
+import threading
+
+class TokenBucket:
+    """ TokenBucket class refilling a per-minute budget continuously.
+
+    Args:
+        rate_per_minute (float): Number of units refilled per minute.
+        capacity (float): Maximum number of units (default: rate_per_minute).
+    """
+    def __init__(self, rate_per_minute: float, capacity: float = None) -> None:
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute must be positive. {rate_per_minute}")
+        self.rate = rate_per_minute / 60.0 # units per second
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount units and return the seconds to wait until they are actually available."""
+        self._refill(now)
+        self._tokens -= min(amount, self.capacity) # a single request larger than the bucket would wait forever
+        return max(0.0, -self._tokens / self.rate)
+
+    def has(self, amount: float, now: float) -> bool:
+        """Return True if amount units are available without waiting."""
+        self._refill(now)
+        return self._tokens >= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        """Give back (or, if negative, take) units after the real cost is known."""
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+class RateLimiter:
+    """ RateLimiter class for keeping requests under requests-per-minute and tokens-per-minute quotas.
+
+    Args:
+        rpm (int): Requests per minute (None = unlimited).
+        tpm (int): Tokens per minute (None = unlimited).
+    """
+    def __init__(self, rpm: int = None, tpm: int = None) -> None:
+        self._lock = threading.Lock()
+        self.rpm = rpm
+        self.tpm = tpm
+        self._request_bucket = TokenBucket(rpm) if rpm else None
+        self._token_bucket = TokenBucket(tpm) if tpm else None
+
+    def __str__(self) -> str:
+        return f"RateLimiter(rpm={self.rpm}, tpm={self.tpm})"
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserve one request and the estimated tokens, and return the seconds to wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            wait_time = 0.0
+            if self._request_bucket is not None:
+                wait_time = max(wait_time, self._request_bucket.reserve(1, now))
+            if self._token_bucket is not None:
+                wait_time = max(wait_time, self._token_bucket.reserve(tokens, now))
+            return wait_time
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """Reserve one request and the estimated tokens if they are available now, without waiting."""
+        with self._lock:
+            now = time.monotonic()
+            buckets = [(self._request_bucket, 1), (self._token_bucket, tokens)]
+            if not all(bucket.has(amount, now) for bucket, amount in buckets if bucket is not None):
+                return False
+            for bucket, amount in buckets:
+                if bucket is not None:
+                    bucket.reserve(amount, now)
+            return True
+
+    def release(self, tokens: int = 0) -> None:
+        """Give back the reservation of a request that was not sent."""
+        with self._lock:
+            if self._request_bucket is not None:
+                self._request_bucket.refund(1)
+            if self._token_bucket is not None:
+                self._token_bucket.refund(min(tokens, self._token_bucket.capacity))
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until one request with the estimated tokens fits in the budget."""
+        wait_time = self.reserve(tokens)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int | None) -> None:
+        """Correct the token budget with the token count reported by the provider."""
+        if self._token_bucket is None or actual_tokens is None:
+            return
+        with self._lock:
+            self._token_bucket.refund(estimated_tokens - actual_tokens)
+
+"""
+Helper functions
+"""
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(key: str, rpm: int = None, tpm: int = None) -> RateLimiter | None:
+    """Return the rate limiter shared by every model with the same key (e.g., 'openai::gpt-4o-mini').
+
+    The limiter is created on the first call with a quota; later calls with a different quota replace it.
+    Returns None if no quota has been configured for the key.
+    """
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get(key)
+        if (rpm or tpm) and (rate_limiter is None or (rate_limiter.rpm, rate_limiter.tpm) != (rpm, tpm)):
+            rate_limiter = RateLimiter(rpm=rpm, tpm=tpm)
+            _rate_limiters[key] = rate_limiter
+        return rate_limiter
+
+def estimate_text_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens of a text (about 4 UTF-8 bytes per token)."""
+    return len(text.encode("utf-8")) // 4 + 1
@@ -0,0 +1,49 @@
+﻿"""
+This module contains the response recording class for the Logos-pipe-ocr project.
+"""
+import threading
+from pathlib import Path
+from logos_pipe_ocr.util.file import append_jsonl_file, read_jsonl_file
+
+RECORDING_FILE = "responses.jsonl" # recording of a run in the run directory
+
+class ResponseRecording:
+    """ ResponseRecording class for storing the raw provider responses of a run and replaying them offline.
+
+    Each line holds the key of an image (its path relative to the image directory) and the serialized response,
+    so a recording can be replayed on another machine or from another checkout. The last response of a key wins.
+
+    Args:
+        file_path (str): Path to the JSONL file, or to a run directory containing responses.jsonl.
+    """
+    def __init__(self, file_path: str) -> None:
+        file_path = Path(file_path)
+        self.file_path = file_path / RECORDING_FILE if file_path.is_dir() else file_path
+        self._lock = threading.Lock()
+        self._responses = None
+
+    def __str__(self) -> str:
+        return f"ResponseRecording({self.file_path})"
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def record(self, key: str, response: dict, model_name: str = None) -> None:
+        """Append the serialized response of the image key."""
+        with self._lock: # one writer at a time, so long lines of concurrent requests do not interleave
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            append_jsonl_file({"key": key, "model": model_name, "response": response}, self.file_path)
+            if self._responses is not None:
+                self._responses[key] = response
+
+    def get(self, key: str) -> dict | None:
+        """Return the recorded response of the image key, or None if it was not recorded."""
+        return self._load().get(key)
+
+    def _load(self) -> dict:
+        with self._lock:
+            if self._responses is None:
+                if not self.file_path.exists():
+                    raise FileNotFoundError(f"Recording not found, please check the file path. {self.file_path}")
+                self._responses = {entry["key"]: entry["response"] for entry in read_jsonl_file(self.file_path)}
+            return self._responses
@@ -0,0 +1,124 @@
+﻿"""
+This module contains the retry policy class for the Logos-pipe-ocr project.
+"""
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUS_CODES = {408, 409, 429} # and every 5xx
+RETRYABLE_ERROR_NAMES = { # transient errors without a status code (openai, httpx, google-api-core)
+    "APITimeoutError",
+    "APIConnectionError",
+    "TimeoutException",
+    "ConnectError",
+    "ReadError",
+    "RemoteProtocolError",
+    "DeadlineExceeded",
+    "ServiceUnavailable",
+}
+
+class RetryPolicy:
+    """ RetryPolicy class for retrying transient provider errors with capped exponential backoff and jitter.
+
+    Args:
+        max_retries (int): Maximum number of retries per call.
+        base_delay (float): Delay of the first retry in seconds.
+        max_delay (float): Maximum backoff delay in seconds.
+        jitter (bool): Whether to randomize the delay (full jitter).
+
+    Attributes:
+        retries (int): Number of retries made.
+        give_ups (int): Number of calls that still failed after max_retries.
+        fatal_errors (int): Number of calls that failed with a non-retryable error.
+    """
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0, jitter: bool = True) -> None:
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.give_ups = 0
+        self.fatal_errors = 0
+
+    def __str__(self) -> str:
+        return f"Retries: {self.retries}, give-ups: {self.give_ups}, fatal errors: {self.fatal_errors}"
+
+    def call(self, func, *args, **kwargs) -> any:
+        """Call func and retry it while it raises a retryable error."""
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    self._count("fatal_errors")
+                    raise
+                if attempt >= self.max_retries:
+                    self._count("give_ups")
+                    raise
+                self._count("retries")
+                time.sleep(self.get_delay(attempt, e))
+                attempt += 1
+
+    def get_delay(self, attempt: int, error: Exception = None) -> float:
+        """Return the delay before the next attempt, honoring the Retry-After header (capped by max_delay) if there is one."""
+        retry_after = get_retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay) # a huge header must not stall the worker
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def get_stats(self) -> dict:
+        return {"retries": self.retries, "give_ups": self.give_ups, "fatal_errors": self.fatal_errors}
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+"""
+Helper functions
+"""
+
+def get_status_code(error: Exception) -> int | None:
+    """Return the HTTP status code of a provider error (openai: status_code, google-api-core: code)."""
+    for attribute in ("status_code", "code"):
+        status_code = getattr(error, attribute, None)
+        if isinstance(status_code, int):
+            return status_code
+    return None
+
+def is_retryable(error: Exception) -> bool:
+    """Return True for rate limits (429), server errors (5xx), timeouts and connection resets."""
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+def get_retry_after(error: Exception) -> float | None:
+    """Return the Retry-After delay in seconds from the error response headers, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError: # HTTP-date format
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,73 @@
+﻿"""
+This script benchmarks the JSON backends of util.file for the Logos-pipe-ocr project.
+
+Example: python scripts/benchmark_json.py --documents 2000 --repeat 5
+"""
+import argparse
+import importlib
+import json
+import os
+import tempfile
+import time
+
+from logos_pipe_ocr.util.file import JSON_BACKENDS, configure_json, create_json_file, read_json_file, json_dumps, json_loads
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--documents", type=int, required=False, help="Number of prediction files written and read (default: 1000)", default=1000)
+    parser.add_argument("--fields", type=int, required=False, help="Number of text fields of a prediction (default: 50)", default=50)
+    parser.add_argument("--repeat", type=int, required=False, help="Number of runs of each benchmark, the best one is reported (default: 3)", default=3)
+
+def make_document(index: int, fields: int) -> dict: # a prediction with Korean and ASCII text, numbers and nesting
+    return {
+        "file_name": f"page{index:06d}.jpeg",
+        "fields": [{"key": f"항목_{field}", "value": f"서울특별시 강남구 테헤란로 {field}길 / Unit {index}-{field}", "score": field / fields}
+                   for field in range(fields)],
+        "meta": {"page": index, "valid": index % 2 == 0, "note": None},
+    }
+
+def measure(func, repeat: int) -> float: # best seconds of repeat runs
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+def main(documents: int, fields: int, repeat: int):
+    data = [make_document(index, fields) for index in range(documents)]
+    reference = [json.dumps(document, ensure_ascii=False, indent=4) for document in data]
+    print(f"{documents} documents of {fields} fields, best of {repeat} runs")
+    print(f"{'backend':<8} {'dumps':>10} {'dumps -c':>10} {'loads':>10} {'write':>10} {'write -c':>10} {'read':>10}  identical")
+
+    for backend in JSON_BACKENDS:
+        try:
+            importlib.import_module(backend)
+        except ImportError:
+            print(f"{backend:<8} not installed")
+            continue
+        configure_json(backend)
+        texts = [json_dumps(document, compact=True) for document in data]
+        identical = [json_dumps(document) for document in data] == reference # the indented files must not change
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            def write(compact: bool):
+                for index, document in enumerate(data):
+                    create_json_file(document, tmp_dir, f"page{index:06d}", compact=compact)
+            def read():
+                for index in range(documents):
+                    read_json_file(os.path.join(tmp_dir, f"page{index:06d}.json"))
+            timings = [
+                measure(lambda: [json_dumps(document) for document in data], repeat),
+                measure(lambda: [json_dumps(document, compact=True) for document in data], repeat),
+                measure(lambda: [json_loads(text) for text in texts], repeat),
+                measure(lambda: write(False), repeat),
+                measure(lambda: write(True), repeat),
+                measure(read, repeat), # compact files, written last
+            ]
+        print(f"{backend:<8} " + " ".join(f"{seconds * 1000:>8.1f}ms" for seconds in timings) + f"  {identical}")
+    configure_json()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="logos-pipe-ocr: JSON backend benchmark")
+    add_arguments(parser)
+    args = parser.parse_args()
+    main(args.documents, args.fields, args.repeat)